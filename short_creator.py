@@ -1,14 +1,22 @@
 import sys
 import os
 import json
+import asyncio
+import hashlib
 import time
 import subprocess
 import threading
 import logging
+import concurrent.futures
 import re
+import random
+import shutil
+from contextlib import contextmanager
 from functools import partial
-from datetime import datetime
-from urllib.parse import quote as url_quote
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import quote as url_quote, urlsplit
 
 # #############################################################################
 # # ЗАЛЕЖНОСТІ / DEPENDENCIES
@@ -18,6 +26,7 @@ from urllib.parse import quote as url_quote
 # pip install requests
 # pip install openai-whisper
 # pip install openai
+# pip install pysubs2
 #
 # Також переконайтесь, що у вашій системі встановлено FFmpeg і FFprobe,
 # і вони доступні через системний PATH.
@@ -37,9 +46,10 @@ try:
     )
     from PySide6.QtGui import QColor, QPalette, QFont, QDesktopServices
     import requests
-    import whisper
+    from requests.adapters import HTTPAdapter
     from openai import OpenAI
-    import pysubs2
+    from subtitle_builder import compile_style
+    from transcription import whisper_models, transcribe_words, use_transcription_engine, shutdown_transcription_engine
 except ImportError as e:
     print(f"Помилка імпорту. Будь ласка, встановіть необхідні бібліотеки: pip install PySide6 requests openai-whisper openai. Деталі: {e}")
     sys.exit(1)
@@ -102,6 +112,186 @@ def parse_ass_styles(file_path):
         return {}
     return styles
 
+def get_video_filename(scenario_path):
+    """
+    Повертає назву фінального відео для сценарію: очищена назва з title.txt
+    або video_<номер>.mp4, якщо назви немає.
+    """
+    scenario_name = os.path.basename(scenario_path)
+    title_path = os.path.join(scenario_path, 'title.txt')
+    video_filename = f"video_{scenario_name.split('_')[-1]}.mp4" # Назва за замовчуванням
+    if os.path.exists(title_path):
+        try:
+            with open(title_path, 'r', encoding='utf-8') as f:
+                title = f.read().strip()
+            if title:
+                # Очищуємо назву від символів, неприпустимих у назвах файлів
+                sanitized_title = re.sub(r'[\\/*?:"<>|]', "", title)
+                video_filename = f"{sanitized_title}.mp4"
+        except Exception as e:
+            logging.warning(f"Could not read title from {title_path}, using default name. Error: {e}")
+    return video_filename
+
+def build_ass_filter(ass_path):
+    """Формує фільтр FFmpeg 'ass=' з екрануванням шляху для Windows."""
+    safe_ass = ass_path.replace('\\', '/').replace(':', '\\:')
+    font_dir = 'C:/Windows/Fonts'.replace(':', '\\:')
+    return f"ass=filename='{safe_ass}':fontsdir='{font_dir}'"
+
+def get_codec_args(ffmpeg_cfg):
+    """Повертає аргументи відеокодека FFmpeg для вибраного в налаштуваннях кодека."""
+    codec_key = ffmpeg_cfg.get('selected_codec', 'CPU (libx264)')
+    codec_config = ffmpeg_cfg.get('codecs', {}).get(codec_key, {})
+    args = ['-c:v', codec_config.get('codec', 'libx264')]
+    if 'bitrate' in codec_config: args.extend(['-b:v', codec_config['bitrate']])
+    elif 'preset' in codec_config and 'crf' in codec_config: args.extend(['-preset', codec_config['preset'], '-crf', str(codec_config['crf'])])
+    return args
+
+def probe_duration(path):
+    """Тривалість медіафайлу в секундах (через ffprobe)."""
+    ffprobe_cmd = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', path]
+    return float(subprocess.check_output(ffprobe_cmd).decode('utf-8').strip())
+
+def format_progress(progress):
+    """Короткий опис прогресу FFmpeg для статусу: відсоток (або вже оброблений час), швидкість і залишок."""
+    parts = [f"{progress['percent']:.0f}%" if progress['percent'] is not None else f"{progress['out_time']:.0f} с"]
+    if progress['speed']: parts.append(f"{progress['speed']:.2f}x")
+    if progress['eta'] is not None: parts.append(f"~{progress['eta']:.0f} с")
+    return " · ".join(parts)
+
+# Фільтри попередньої нормалізації картинок: результат має рівно ту роздільність, з якою працює монтаж
+# ('motion' - вхід для zoompan, 'static' - готовий кадр без ефектів руху)
+NORMALIZE_FILTERS = {
+    'motion': "scale=2160:3840,setsar=1",
+    'static': "scale=2160:3840,setsar=1,scale=1080:1920:force_original_aspect_ratio=decrease,pad=1080:1920:(ow-iw)/2:(oh-ih)/2",
+}
+
+def normalize_images(images, motion, cancel_event=None, priority=0):
+    """
+    Один раз перетворює кожну картинку до робочої роздільності монтажу (паралельно, окремий процес
+    FFmpeg на картинку) і кешує результат у папці normalized поруч з оригіналами. Ключ кешу - вміст
+    оригіналу і фільтр, тож перегенерована картинка нормалізується заново.
+    Повертає шляхи до нормалізованих PNG у тому ж порядку.
+    """
+    vf = NORMALIZE_FILTERS['motion' if motion else 'static']
+
+    def normalize(src):
+        if cancel_event is not None and cancel_event.is_set(): raise InterruptedError("Image normalization was cancelled.")
+        out_dir = os.path.join(os.path.dirname(src), 'normalized')
+        name = os.path.splitext(os.path.basename(src))[0]
+        key = StageManifest.hash_inputs(source=StageManifest.file_checksum(src), filter=vf)[:16]
+        out_path = os.path.join(out_dir, f"{name}.{key}.png")
+        if os.path.isfile(out_path): return out_path
+
+        os.makedirs(out_dir, exist_ok=True)
+        temp_path = os.path.join(out_dir, f"{name}.{key}.{threading.get_ident()}.part.png")
+        cmd = ['ffmpeg', '-y', '-v', 'error', '-i', src, '-vf', vf, '-frames:v', '1', '-pix_fmt', 'rgb24', temp_path]
+        proc = ffmpeg_scheduler.run(cmd, priority, cores=1, memory_mb=256, cancel_event=cancel_event, label=f"normalize {name}")
+        if proc.returncode != 0:
+            if os.path.exists(temp_path): os.remove(temp_path)
+            raise RuntimeError(f"FFmpeg failed to normalize {src}:\n{proc.stderr}")
+        os.replace(temp_path, out_path)
+        # Попередні версії цієї картинки більше не знадобляться
+        for filename in os.listdir(out_dir):
+            if filename.startswith(f"{name}.") and filename != os.path.basename(out_path) and '.part.' not in filename:
+                try: os.remove(os.path.join(out_dir, filename))
+                except OSError: pass
+        return out_path
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(images), os.cpu_count() or 1), thread_name_prefix="normalize") as executor:
+        return list(executor.map(normalize, images))
+
+# #############################################################################
+# # ПОБУДОВА МОНТАЖУ
+# #############################################################################
+
+# Робоча роздільність картинки для zoompan і розмір кадру відео (при scale=1)
+MONTAGE_WORK_SIZE = (2160, 3840)
+MONTAGE_FRAME_SIZE = (1080, 1920)
+MONTAGE_FPS = 30
+
+def scaled_size(size, scale):
+    # Кодеки з yuv420p вимагають парних розмірів кадру
+    return tuple(max(2, int(round(v * scale / 2)) * 2) for v in size)
+
+def montage_timing(total_duration, image_count, transition_duration):
+    """Повертає (тривалість показу картинки, тривалість переходу); якщо переходи не вміщаються, вони вимикаються."""
+    num_transitions = max(0, image_count - 1)
+    img_duration = (total_duration - num_transitions * transition_duration) / image_count if image_count > 0 else 0
+    if img_duration <= 0: img_duration, transition_duration = total_duration / image_count if image_count > 0 else 0, 0
+    return img_duration, transition_duration
+
+def has_motion(effects, img_duration):
+    return (effects.get('zoom_effect', True) or effects.get('pan_effect', True)) and img_duration > 0
+
+def build_clip_filter(effects, img_duration, prenormalized=False, scale=1.0, fps=MONTAGE_FPS):
+    """
+    Ланцюжок фільтрів одного кліпу: картинка -> кадри відео з ефектами руху.
+    effects - налаштування у форматі settings['ffmpeg'] (zoom_effect, pan_effect, pan_direction...);
+    scale і fps зменшують роздільність і частоту кадрів (чорнове прев'ю).
+    """
+    work_w, work_h = scaled_size(MONTAGE_WORK_SIZE, scale)
+    frame_w, frame_h = scaled_size(MONTAGE_FRAME_SIZE, scale)
+    is_ready = prenormalized and scale == 1.0 # Картинка вже має робочу роздільність (див. normalize_images)
+    stream = "format=yuv420p" if is_ready else f"scale={work_w}:{work_h},setsar=1,format=yuv420p"
+    if has_motion(effects, img_duration):
+        total_frames = int(img_duration * fps)
+        px, py = "0", "0"
+        if effects.get('pan_effect', True):
+            m_type = effects.get('pan_direction', 'random')
+            if m_type == "random": m_type = random.choice(["horizontal", "vertical", "infinity"])
+            amp = effects.get('pan_amount', 0.05) * 100 * scale
+            m_period = 20.0 * fps
+            if m_type == "horizontal": px = f"sin(2*PI*on/{m_period})*{amp}"
+            elif m_type == "vertical": py = f"sin(2*PI*on/{m_period})*{amp}"
+            elif m_type == "infinity": px, py = f"sin(2*PI*on/{m_period})*{amp}", f"sin(4*PI*on/{m_period})*{amp/2}"
+        z_expr = "1.1"
+        if effects.get('zoom_effect', True):
+            z_start, z_end = effects.get('zoom_start', 1.0), effects.get('zoom_end', 1.2)
+            if z_end < z_start: z_end = z_start
+            base_z, amp_z = (z_start + z_end) / 2.0, (z_end - z_start) / 2.0
+            z_expr = f"{base_z}+{amp_z}*cos(2*PI*on/{(10.0*fps)})"
+        x_final, y_final = f"(iw-iw/({z_expr}))/2+{px}", f"(ih-ih/({z_expr}))/2+{py}"
+        stream += f",zoompan=z='{z_expr}':d={total_frames}:s={frame_w}x{frame_h}:x='{x_final}':y='{y_final}':fps={fps}"
+    elif not is_ready: stream += f",scale={frame_w}:{frame_h}:force_original_aspect_ratio=decrease,pad={frame_w}:{frame_h}:(ow-iw)/2:(oh-ih)/2"
+    return stream
+
+def cache_transcript(key, future):
+    """Done-колбек Future транскрипції: зберігає список слів в asset_cache під ключем key."""
+    if future.cancelled() or future.exception() is not None: return
+    asset_cache.put_text('transcript', key, json.dumps(future.result(), ensure_ascii=False))
+
+def build_montage_command(images, audio_path, output_path, effects, img_duration, transition_duration, codec_args,
+                          ass_path=None, prenormalized=False, scale=1.0, fps=MONTAGE_FPS):
+    """
+    Команда FFmpeg для монтажу одним графом: N кліпів, ланцюжок xfade і, якщо задано ass_path,
+    впалені субтитри. Спільна для рендеру сценаріїв і прев'ю в налаштуваннях.
+    """
+    num_transitions = len(images) - 1
+    cmd, f_complex = ['ffmpeg', '-y'], []
+    for i, img in enumerate(images): cmd.extend(['-loop', '1', '-t', str(img_duration + (transition_duration if i < num_transitions else 0)), '-i', img])
+    cmd.extend(['-i', audio_path])
+
+    for i in range(len(images)):
+        f_complex.append(f"[{i}:v]{build_clip_filter(effects, img_duration, prenormalized, scale, fps)}[v{i}]")
+
+    last_stream = "[v0]"
+    for i in range(num_transitions):
+        offset = (i + 1) * img_duration + i * transition_duration
+        f_complex.append(f"{last_stream}[v{i+1}]xfade=transition=fade:duration={transition_duration}:offset={offset}[vt{i}]")
+        last_stream = f"[vt{i}]"
+
+    # Субтитри накладаються в кінці того ж ланцюжка фільтрів
+    if ass_path:
+        f_complex.append(f"{last_stream}format=yuv420p,{build_ass_filter(ass_path)}[outv]")
+    else:
+        f_complex.append(f"{last_stream}format=yuv420p[outv]")
+    cmd.extend(['-filter_complex', ";".join(f_complex), '-map', '[outv]', '-map', f'{len(images)}:a'])
+    cmd.extend(codec_args)
+    if fps != MONTAGE_FPS: cmd.extend(['-r', str(fps)])
+    cmd.extend(['-c:a', 'aac', '-b:a', '192k', '-shortest', output_path])
+    return cmd
+
 # #############################################################################
 # # НАЛАШТУВАННЯ ЛОГЕРА
 # #############################################################################
@@ -151,16 +341,780 @@ def setup_file_logging(level=logging.INFO):
     
     logging.info(f"Logging initialized. Log file: {log_filepath}")
 
+# #############################################################################
+# # ГЛОБАЛЬНІ ЛІМІТИ РЕСУРСІВ
+# #############################################################################
+
+class ResourceLimiter:
+    """
+    Спільні для всіх завдань ліміти одночасних операцій за типами ресурсів.
+    Дозволяє виконувати кілька завдань черги разом, не перевантажуючи API та процесор.
+    """
+    DEFAULT_LIMITS = {'llm': 4, 'image': 4, 'tts': 6, 'transcription': 1}
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.limits = dict(self.DEFAULT_LIMITS)
+        self.in_use = {name: 0 for name in self.limits}
+
+    def configure(self, limits):
+        """Оновлює ліміти; операції, що вже виконуються, не перериваються."""
+        with self.condition:
+            for name, value in limits.items():
+                self.limits[name] = max(1, int(value))
+                self.in_use.setdefault(name, 0)
+            self.condition.notify_all()
+
+    def acquire(self, name, cancel_event=None):
+        """Чекає на вільне місце для ресурсу 'name'. Скасування під час очікування дає InterruptedError."""
+        with self.condition:
+            while self.in_use[name] >= self.limits[name]:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise InterruptedError(f"Cancelled while waiting for a free '{name}' slot.")
+                self.condition.wait(0.2)
+            self.in_use[name] += 1
+
+    def release(self, name):
+        with self.condition:
+            self.in_use[name] -= 1
+            self.condition.notify_all()
+
+    @contextmanager
+    def slot(self, name, cancel_event=None):
+        """Займає місце ресурсу на час блоку with (див. acquire)."""
+        self.acquire(name, cancel_event)
+        try:
+            yield
+        finally:
+            self.release(name)
+
+resource_limiter = ResourceLimiter()
+
+def available_memory_mb():
+    """Доступна пам'ять у МБ: через psutil, якщо він встановлений, інакше з /proc/meminfo; None, якщо невідомо."""
+    try:
+        import psutil
+        return psutil.virtual_memory().available / (1024 * 1024)
+    except ImportError:
+        pass
+    try:
+        with open('/proc/meminfo', 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'): return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+class FFmpegScheduler:
+    """
+    Один на процес планувальник усіх запусків FFmpeg (монтаж, фіналізація, прев'ю) з пріоритетами
+    і допуском за ресурсами машини. Задача запускається, коли на неї вистачає вільних ядер (cores -
+    оцінка навантаження задачі), доступної пам'яті і, для апаратних кодеків, сесій кодера.
+    З задач, що чекають, першими допускаються задачі з вищим пріоритетом (при рівному - раніші).
+    Перша задача черги, на яку ресурсів поки не вистачає, резервує їх: менші задачі можуть пройти
+    повз неї лише в межах того, що лишається після резерву, тож вона не чекає без кінця.
+    """
+    PRIORITY_MONTAGE = 0
+    PRIORITY_FINALIZE = 1
+    PRIORITY_PREVIEW = 2
+    STDERR_TAIL = 200 # Скільки останніх рядків stderr зберігати для повідомлення про помилку
+    # Частина назви кодека -> сімейство апаратного кодера з обмеженою кількістю сесій
+    HARDWARE_ENCODERS = ('nvenc', 'qsv', 'amf', 'videotoolbox', 'vaapi')
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.waiting = []
+        self.running = []
+        self.sequence = 0
+        self.configure({})
+
+    def configure(self, scheduler_cfg):
+        with self.condition:
+            self.max_cores = int(scheduler_cfg.get('cores', 0)) or os.cpu_count() or 1
+            self.memory_reserve_mb = int(scheduler_cfg.get('memory_reserve_mb', 1024))
+            self.encoder_sessions = int(scheduler_cfg.get('encoder_sessions', 3))
+            self.condition.notify_all()
+
+    @classmethod
+    def encoder_family(cls, cmd):
+        codecs = [cmd[i + 1] for i, arg in enumerate(cmd[:-1]) if arg in ('-c:v', '-vcodec')]
+        return next((family for codec in codecs for family in cls.HARDWARE_ENCODERS if family in codec), None)
+
+    def _fits(self, job, running, free_memory, reserved=None):
+        if not running: return True # Задача, більша за всю машину, все одно має колись виконатись
+        claimed = running + [reserved] if reserved else running
+        if sum(j['cores'] for j in claimed) + job['cores'] > self.max_cores: return False
+        if job['encoder'] and sum(1 for j in claimed if j['encoder'] == job['encoder']) >= self.encoder_sessions: return False
+        if free_memory is not None:
+            # Щойно запущені процеси ще не встигли зайняти пам'ять, тому їхня оцінка віднімається
+            recent = sum(j['memory_mb'] for j in running if time.monotonic() - j['started'] < 10)
+            if reserved: recent += reserved['memory_mb']
+            if free_memory - recent - job['memory_mb'] < self.memory_reserve_mb: return False
+        return True
+
+    def _admitted(self, job):
+        """
+        Імітує допуск задач у порядку черги; True, якщо ця задача проходить зараз.
+        Ресурси першої задачі, що не проходить, вважаються зайнятими для всіх задач після неї.
+        """
+        free_memory = available_memory_mb()
+        running, reserved = list(self.running), None
+        for candidate in sorted(self.waiting, key=lambda j: (-j['priority'], j['sequence'])):
+            if self._fits(candidate, running, free_memory, reserved):
+                if candidate is job: return True
+                running.append(candidate)
+            elif reserved is None:
+                reserved = candidate
+        return False
+
+    @contextmanager
+    def job(self, cmd, priority=PRIORITY_MONTAGE, cores=1, memory_mb=512, cancel_event=None):
+        """Займає ресурси під одну задачу FFmpeg на час блоку with. Скасування під час очікування дає InterruptedError."""
+        with self.condition:
+            self.sequence += 1
+            job = {'priority': priority, 'sequence': self.sequence, 'cores': min(cores, self.max_cores),
+                   'memory_mb': memory_mb, 'encoder': self.encoder_family(cmd), 'started': 0.0}
+            self.waiting.append(job)
+            try:
+                while not self._admitted(job):
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise InterruptedError("Cancelled while waiting for the FFmpeg scheduler.")
+                    self.condition.wait(0.5)
+            finally:
+                self.waiting.remove(job)
+            job['started'] = time.monotonic()
+            self.running.append(job)
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.running.remove(job)
+                self.condition.notify_all()
+
+    def run(self, cmd, priority=PRIORITY_MONTAGE, cores=1, memory_mb=512, cancel_event=None, label="ffmpeg", duration=None, on_progress=None):
+        """
+        Виконує команду FFmpeg, щойно планувальник її допустить; повертає subprocess.CompletedProcess,
+        де stderr - лише останні STDERR_TAIL рядків. Прогрес (-progress pipe:1) читається построково:
+        on_progress(progress) отримує frame/fps/speed/out_time, а якщо відома тривалість результату
+        duration - ще percent і eta. Після завершення задача записується в ffmpeg_metrics.
+        При скасуванні процес зупиняється і піднімається InterruptedError.
+        """
+        queued = time.monotonic()
+        with self.job(cmd, priority, cores, memory_mb, cancel_event):
+            started = time.monotonic()
+            proc = subprocess.Popen([cmd[0], '-progress', 'pipe:1', '-nostats', *cmd[1:]], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                    text=True, encoding='utf-8', errors='replace')
+            stderr_tail = deque(maxlen=self.STDERR_TAIL)
+            stderr_reader = threading.Thread(target=stderr_tail.extend, args=(proc.stderr,), daemon=True)
+            stderr_reader.start()
+            is_cancelled = threading.Event()
+            if cancel_event is not None:
+                def watch_cancel():
+                    while proc.poll() is None:
+                        if cancel_event.wait(0.5):
+                            is_cancelled.set()
+                            proc.kill()
+                            return
+                threading.Thread(target=watch_cancel, daemon=True).start()
+
+            progress, fields = {}, {}
+            for line in proc.stdout:
+                key, _, value = line.strip().partition('=')
+                if key != 'progress':
+                    fields[key] = value
+                    continue
+                # Рядок progress=continue|end завершує черговий блок звіту; незмінні поля лишаються з попереднього
+                progress = self.parse_progress(fields, duration, time.monotonic() - started)
+                if on_progress is not None: on_progress(progress)
+            proc.wait()
+            stderr_reader.join()
+            if is_cancelled.is_set(): raise InterruptedError("FFmpeg job was cancelled.")
+        ffmpeg_metrics.record(label, proc.returncode, started - queued, time.monotonic() - started, progress, duration)
+        return subprocess.CompletedProcess(cmd, proc.returncode, "", "".join(stderr_tail))
+
+    @staticmethod
+    def parse_progress(fields, duration, elapsed):
+        def number(key):
+            try: return float(fields.get(key, '').rstrip('x'))
+            except ValueError: return None # "N/A" на початку обробки
+        # out_time_ms історично теж у мікросекундах
+        out_time = (number('out_time_us') or number('out_time_ms') or 0.0) / 1e6
+        progress = {'frame': int(number('frame') or 0), 'fps': number('fps'), 'speed': number('speed'), 'out_time': out_time, 'percent': None, 'eta': None}
+        if duration:
+            progress['percent'] = min(100.0, out_time / duration * 100)
+            if out_time > 0: progress['eta'] = max(0.0, (duration - out_time) * elapsed / out_time)
+        return progress
+
+class FFmpegMetrics:
+    """
+    Журнал завершених задач FFmpeg: час у черзі, тривалість, кадри, fps і швидкість відносно
+    реального часу. Останні записи тримаються в пам'яті, усі дописуються в log/ffmpeg_metrics.jsonl,
+    тож видно, які графи фільтрів працюють повільніше за реальний час.
+    """
+    # Коротші задачі (кадр нормалізації, шматки сегментів, переходи) завжди повільніші за реальний час
+    # через запуск процесу, тож попередження дається лише для задач з відомою тривалістю від цього порогу
+    REALTIME_MIN_DURATION = 5.0
+
+    def __init__(self, path=os.path.join('log', 'ffmpeg_metrics.jsonl'), size=500):
+        self.lock = threading.Lock()
+        self.path = path
+        self.records = deque(maxlen=size)
+
+    def record(self, label, returncode, queued, wall, progress, duration=None):
+        entry = {
+            'time': datetime.now().isoformat(timespec='seconds'), 'label': label, 'returncode': returncode,
+            'queued_s': round(queued, 2), 'wall_s': round(wall, 2), 'media_s': round(progress.get('out_time', 0.0), 2),
+            'duration_s': duration, 'frames': progress.get('frame'), 'fps': progress.get('fps'), 'speed': progress.get('speed')
+        }
+        with self.lock:
+            self.records.append(entry)
+            try:
+                with open(self.path, 'a', encoding='utf-8') as f: f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            except OSError as e:
+                logging.debug(f"Failed to write FFmpeg metrics: {e}")
+        message = (f"FFmpeg job '{label}' finished in {wall:.1f}s (queued {queued:.1f}s): "
+                   f"{entry['frames']} frames, {entry['fps']} fps, speed {entry['speed']}x")
+        if returncode == 0 and entry['speed'] is not None and entry['speed'] < 1.0 and (duration or 0.0) >= self.REALTIME_MIN_DURATION:
+            logging.warning(f"{message} - slower than realtime")
+        elif max(duration or 0.0, entry['media_s']) >= self.REALTIME_MIN_DURATION:
+            logging.info(message)
+        else:
+            logging.debug(message)
+
+ffmpeg_metrics = FFmpegMetrics()
+
+ffmpeg_scheduler = FFmpegScheduler()
+
+class TokenBucket:
+    """Обмежувач частоти запитів: rate запитів на секунду з накопиченням до burst."""
+    def __init__(self, rate=1.0, burst=1):
+        self.lock = threading.Lock()
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.configure(rate, burst)
+
+    def configure(self, rate, burst):
+        with self.lock:
+            self.rate = max(rate, 1e-3)
+            self.burst = max(1, burst)
+            self.tokens = min(self.tokens, self.burst)
+
+    def acquire(self, cancel_event=None):
+        """Чекає на вільний токен. Скасування під час очікування дає InterruptedError."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens) / self.rate
+            if cancel_event is not None and cancel_event.wait(min(wait_time, 0.2)):
+                raise InterruptedError("Cancelled while waiting for the request rate limit.")
+            elif cancel_event is None:
+                time.sleep(min(wait_time, 0.2))
+
+DEFAULT_IMAGE_SERVICES = {
+    "Recraft": {"max_concurrent": 4, "requests_per_minute": 60},
+    "Pollinations": {"max_concurrent": 2, "requests_per_minute": 20}
+}
+# Обмежувачі частоти запитів до сервісів зображень, спільні для всіх завдань (ліміти API - на акаунт)
+image_rate_limiters = {name: TokenBucket() for name in DEFAULT_IMAGE_SERVICES}
+
+def image_service_slot(service):
+    """Назва ресурсу в resource_limiter для одночасних запитів до сервісу зображень."""
+    return f"image_{service.lower()}"
+
+def configure_image_services(services_cfg):
+    """Застосовує ліміти одночасності та частоти запитів для кожного сервісу зображень."""
+    limits = {}
+    for name, defaults in DEFAULT_IMAGE_SERVICES.items():
+        cfg = {**defaults, **services_cfg.get(name, {})}
+        limits[image_service_slot(name)] = cfg['max_concurrent']
+        image_rate_limiters[name].configure(cfg['requests_per_minute'] / 60.0, cfg['max_concurrent'])
+    resource_limiter.configure(limits)
+
+configure_image_services({})
+
+class LatencyTracker:
+    """Ковзне вікно тривалостей успішних запитів для кожного сервісу (для хеджування)."""
+    def __init__(self, window=100, min_samples=5):
+        self.lock = threading.Lock()
+        self.window = window
+        self.min_samples = min_samples
+        self.samples = {}
+
+    def record(self, service, seconds):
+        with self.lock:
+            self.samples.setdefault(service, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, service, percent):
+        """Перцентиль затримки сервісу або None, якщо замірів ще замало."""
+        with self.lock:
+            samples = sorted(self.samples.get(service, ()))
+        if len(samples) < self.min_samples: return None
+        return samples[min(len(samples) - 1, int(len(samples) * percent / 100))]
+
+image_latencies = LatencyTracker()
+
+# #############################################################################
+# # КЕШ РЕЗУЛЬТАТІВ API
+# #############################################################################
+
+class AssetCache:
+    """
+    Дисковий кеш результатів платних API (тексти LLM, картинки, озвучка) і транскрипцій Whisper.
+    Ключ - sha256 від усіх вхідних параметрів запиту, тож повторний запуск завдання
+    з тими самими даними не витрачає кредити і час на розпізнавання. Розмір обмежений, найдавніше
+    використані записи видаляються першими (LRU за часом останнього звернення).
+    """
+    KINDS = ('llm', 'image', 'tts', 'transcript')
+
+    def __init__(self, root="cache", max_size_mb=2048):
+        self.lock = threading.Lock()
+        self.root = root
+        self.max_size = max_size_mb * 1024 * 1024
+        self.enabled_kinds = set(self.KINDS)
+        self.total_size = None # Рахується при першому записі
+
+    def configure(self, cache_cfg):
+        with self.lock:
+            self.root = cache_cfg.get('dir', 'cache')
+            self.max_size = int(cache_cfg.get('max_size_mb', 2048)) * 1024 * 1024
+            self.enabled_kinds = {kind for kind in self.KINDS if cache_cfg.get('enabled', True) and cache_cfg.get(kind, True)}
+            self.total_size = None
+
+    @staticmethod
+    def key(kind, **inputs):
+        payload = json.dumps({'kind': kind, **inputs}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, kind, key):
+        return os.path.join(self.root, kind, key[:2], key)
+
+    def get(self, kind, key):
+        """Повертає збережені байти або None."""
+        if kind not in self.enabled_kinds: return None
+        path = self._path(kind, key)
+        try:
+            with open(path, 'rb') as f: data = f.read()
+            os.utime(path) # Позначаємо запис як щойно використаний
+        except OSError:
+            return None
+        logging.debug(f"Asset cache hit ({kind}): {key}")
+        return data
+
+    def put(self, kind, key, data):
+        if kind not in self.enabled_kinds or not data: return
+        path = self._path(kind, key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f: f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logging.warning(f"Failed to write asset cache entry {path}: {e}")
+            return
+        self._account(len(data))
+
+    def get_file(self, kind, key, dest_path):
+        """Копіює збережений запис у dest_path (через тимчасовий файл); повертає True, якщо запис знайдено."""
+        if kind not in self.enabled_kinds: return False
+        path = self._path(kind, key)
+        temp_path = f"{dest_path}.{threading.get_ident()}.tmp"
+        try:
+            shutil.copyfile(path, temp_path)
+            os.replace(temp_path, dest_path)
+            os.utime(path)
+        except OSError:
+            if os.path.exists(temp_path): os.remove(temp_path)
+            return False
+        logging.debug(f"Asset cache hit ({kind}): {key}")
+        return True
+
+    def put_file(self, kind, key, src_path):
+        """Як put, але копіює вже записаний файл, не читаючи його в пам'ять."""
+        if kind not in self.enabled_kinds: return
+        path = self._path(kind, key)
+        try:
+            size = os.path.getsize(src_path)
+            if not size: return
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            shutil.copyfile(src_path, temp_path)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logging.warning(f"Failed to write asset cache entry {path}: {e}")
+            return
+        self._account(size)
+
+    def _account(self, size):
+        with self.lock:
+            if self.total_size is not None: self.total_size += size
+            if self.total_size is None or self.total_size > self.max_size:
+                self._evict()
+
+    def get_text(self, kind, key):
+        data = self.get(kind, key)
+        return data.decode('utf-8') if data is not None else None
+
+    def put_text(self, kind, key, text):
+        if text: self.put(kind, key, text.encode('utf-8'))
+
+    def _evict(self):
+        """Видаляє найдавніше використані записи, доки кеш не стане меншим за 90% ліміту."""
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith('.tmp'): continue
+                path = os.path.join(dirpath, filename)
+                try: stat = os.stat(path)
+                except OSError: continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        self.total_size = sum(size for _, size, _ in entries)
+        if self.total_size <= self.max_size: return
+
+        target_size = self.max_size * 0.9
+        for _, size, path in sorted(entries):
+            if self.total_size <= target_size: break
+            try:
+                os.remove(path)
+                self.total_size -= size
+            except OSError: pass
+        logging.info(f"Asset cache trimmed to {self.total_size / (1024 * 1024):.1f} MB.")
+
+asset_cache = AssetCache()
+
+# #############################################################################
+# # МАНІФЕСТ ЕТАПІВ
+# #############################################################################
+
+class StageManifest:
+    """
+    Файл manifest.json у папці сценарію (або мови): які етапи вже завершено,
+    з якими вхідними даними (хеш) і з якими контрольними сумами результатів.
+    Перезапущене завдання пропускає етапи, для яких усе це збігається.
+    """
+    FILENAME = 'manifest.json'
+    lock = threading.Lock() # Один на всі маніфести: записи короткі, а етапи сценарію пишуть з різних потоків
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, self.FILENAME)
+
+    @staticmethod
+    def hash_inputs(**inputs):
+        payload = json.dumps(inputs, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def file_checksum(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''): digest.update(chunk)
+        return digest.hexdigest()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f: return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def stage_outputs(self, stage):
+        """Повертає {відносний шлях: контрольна сума} результатів етапу (порожньо, якщо етап не записаний)."""
+        with self.lock:
+            return self._load().get('stages', {}).get(stage, {}).get('outputs', {})
+
+    def is_complete(self, stage, inputs_hash):
+        """Етап завершено з тими самими вхідними даними, а всі його файли на місці і не змінені."""
+        with self.lock:
+            entry = self._load().get('stages', {}).get(stage)
+        if not entry or entry.get('inputs') != inputs_hash: return False
+        for rel_path, checksum in entry.get('outputs', {}).items():
+            path = os.path.join(self.directory, rel_path)
+            if not os.path.isfile(path) or self.file_checksum(path) != checksum: return False
+        return True
+
+    def complete(self, stage, inputs_hash, output_paths, checksums=None):
+        """checksums - вже відомі контрольні суми {шлях: sha256} (наприклад, пораховані під час завантаження)."""
+        checksums = checksums or {}
+        outputs = {os.path.relpath(p, self.directory).replace('\\', '/'): checksums.get(p) or self.file_checksum(p) for p in output_paths}
+        with self.lock:
+            data = self._load()
+            data.setdefault('stages', {})[stage] = {
+                'inputs': inputs_hash, 'outputs': outputs, 'completed_at': datetime.now().isoformat(timespec='seconds')
+            }
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f: json.dump(data, f, indent=2, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+
 # #############################################################################
 # # КЛАСИ ДЛЯ РОБОТИ З API
 # #############################################################################
 
+class HttpSessionPool:
+    """
+    Спільні HTTP-сесії з keep-alive: одна requests.Session на хост, з пулом з'єднань
+    розміру pool_size. Запити з різних потоків перевикористовують вже відкриті
+    TCP/TLS з'єднання замість нового рукостискання на кожен виклик.
+    """
+    CHUNK_SIZE = 256 * 1024 # Розмір частини при потоковому завантаженні файлів
+
+    def __init__(self, pool_size=16, connect_timeout=10, read_timeout=120):
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+
+    def configure(self, http_cfg):
+        with self.lock:
+            self.pool_size = int(http_cfg.get('pool_size', 16))
+            self.timeout = (http_cfg.get('connect_timeout', 10), http_cfg.get('read_timeout', 120))
+            # Нові сесії створяться з новим розміром пулу; запити в старих спокійно завершаться
+            self.sessions = {}
+
+    def session(self, url):
+        host = urlsplit(url).netloc
+        with self.lock:
+            session = self.sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self.sessions[host] = session
+            return session
+
+    def request(self, method, url, **kwargs):
+        """Як requests.request, але через спільну сесію хоста; без явного timeout береться типовий."""
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session(url).request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    @classmethod
+    def save_response(cls, response, dest_path, cancel_event=None):
+        """
+        Записує тіло відповіді (запит з stream=True) частинами у тимчасовий файл поруч з dest_path,
+        по ходу рахуючи sha256, і атомарно перейменовує його в dest_path. Повертає контрольну суму.
+        Файл ніколи не буває записаним наполовину: при помилці чи скасуванні dest_path не змінюється.
+        """
+        temp_path = f"{dest_path}.{threading.get_ident()}.part"
+        digest = hashlib.sha256()
+        try:
+            with response, open(temp_path, 'wb') as f:
+                for chunk in response.iter_content(cls.CHUNK_SIZE):
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise InterruptedError(f"Download to {dest_path} was cancelled.")
+                    digest.update(chunk)
+                    f.write(chunk)
+            os.replace(temp_path, dest_path)
+        except BaseException:
+            if os.path.exists(temp_path): os.remove(temp_path)
+            raise
+        return digest.hexdigest()
+
+    def download(self, url, dest_path, cancel_event=None, **kwargs):
+        """Потоково завантажує url у dest_path (див. save_response); повертає sha256 файлу."""
+        response = self.get(url, stream=True, **kwargs)
+        if not response.ok: response.close()
+        response.raise_for_status()
+        return self.save_response(response, dest_path, cancel_event)
+
+http_pool = HttpSessionPool()
+
+class ServiceError(Exception):
+    """Помилка, про яку сервіс повідомив у тілі відповіді (запит варто повторити)."""
+
+class CircuitOpenError(ConnectionError):
+    """Запобіжник сервісу розімкнений: сервіс недоступний, запити не надсилаються."""
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after # Через скільки секунд варто спробувати знову
+
+class CircuitBreaker:
+    """
+    Запобіжник сервісу: після failure_threshold невдач поспіль запити одразу
+    завершуються помилкою протягом reset_timeout секунд. Потім запобіжник напіввідкритий:
+    пропускається один пробний запит, і лише його успіх знову пускає всі запити,
+    а невдача розмикає запобіжник ще на reset_timeout.
+    """
+    def __init__(self, failure_threshold=5, reset_timeout=60):
+        self.lock = threading.Lock()
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_until = 0.0
+        self.is_probing = False # Пробний запит напіввідкритого запобіжника вже виконується
+
+    def is_open(self):
+        with self.lock:
+            return self.failures >= self.failure_threshold and (time.monotonic() < self.opened_until or self.is_probing)
+
+    def before_call(self, service):
+        """Пропускає запит або піднімає CircuitOpenError. Повертає True, якщо цей запит - пробний."""
+        with self.lock:
+            if self.failures < self.failure_threshold: return False
+            now = time.monotonic()
+            if now < self.opened_until:
+                raise CircuitOpenError(f"{service} is unavailable (circuit open for {self.opened_until - now:.0f}s more).", self.opened_until - now)
+            if self.is_probing:
+                raise CircuitOpenError(f"{service} is unavailable (waiting for the probe request).", 1.0)
+            self.is_probing = True
+        logging.info(f"{service}: circuit half-open, sending a probe request.")
+        return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.is_probing = False
+
+    def record_neutral(self, is_probe):
+        """Запит завершився без висновку про стан сервісу (скасування, помилка запиту, 429)."""
+        if not is_probe: return
+        with self.lock: self.is_probing = False
+
+    def record_failure(self, service, is_probe=False):
+        with self.lock:
+            if is_probe: self.is_probing = False
+            self.failures += 1
+            # Невдачі запитів, надісланих ще до розмикання, не подовжують паузу
+            if is_probe or self.failures == self.failure_threshold:
+                self.opened_until = time.monotonic() + self.reset_timeout
+                logging.error(f"{service}: {self.failures} failures in a row, pausing requests for {self.reset_timeout}s.")
+
+class RetryPolicy:
+    """
+    Спільна політика повторних запитів до API: експоненційна затримка з випадковим
+    розкидом, повага до Retry-After, без повторів для помилок клієнта (4xx, крім 408/425/429),
+    запобіжник на кожен сервіс і скасування через cancel_event. Відповідь 429 означає, що сервіс
+    працює, тож вона повторюється, але не розмикає запобіжник.
+    """
+    RETRYABLE_STATUSES = {408, 425, 429}
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.breakers = {}
+        self.configure({})
+
+    def configure(self, retry_cfg):
+        with self.lock:
+            self.max_attempts = max(1, int(retry_cfg.get('max_attempts', 6)))
+            self.base_delay = float(retry_cfg.get('base_delay', 2.0))
+            self.max_delay = float(retry_cfg.get('max_delay', 60.0))
+            self.failure_threshold = int(retry_cfg.get('breaker_threshold', 5))
+            self.reset_timeout = float(retry_cfg.get('breaker_reset', 60))
+            for breaker in self.breakers.values():
+                breaker.failure_threshold, breaker.reset_timeout = self.failure_threshold, self.reset_timeout
+
+    def breaker(self, service):
+        with self.lock:
+            if service not in self.breakers:
+                self.breakers[service] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return self.breakers[service]
+
+    @staticmethod
+    def _status_and_retry_after(error):
+        response = getattr(error, 'response', None)
+        status = getattr(response, 'status_code', None) or getattr(error, 'status_code', None)
+        retry_after = None
+        header = getattr(response, 'headers', {}).get('Retry-After') if response is not None else None
+        if header:
+            try:
+                retry_after = float(header)
+            except ValueError:
+                try: retry_after = (parsedate_to_datetime(header) - datetime.now(timezone.utc)).total_seconds()
+                except (TypeError, ValueError): pass
+        return status, retry_after
+
+    @classmethod
+    def is_retryable(cls, error):
+        """Чи має сенс повторити запит: мережеві помилки, 5xx, 408/425/429 і помилки в тілі відповіді."""
+        status, _ = cls._status_and_retry_after(error)
+        return status is None or not 400 <= status < 500 or status in cls.RETRYABLE_STATUSES
+
+    def call(self, service, func, cancel_event=None, max_attempts=None):
+        """
+        Викликає func() з повторами; повертає її результат або піднімає останню помилку.
+        Новий запит до розімкненого сервісу одразу отримує CircuitOpenError, а запит, що вже
+        повторюється, чекає на відновлення сервісу в межах своїх max_attempts спроб.
+        """
+        breaker = self.breaker(service)
+        max_attempts = max_attempts or self.max_attempts
+        attempt = 0
+        while True:
+            if cancel_event is not None and cancel_event.is_set():
+                raise InterruptedError(f"{service} request was cancelled.")
+            try:
+                is_probe = breaker.before_call(service)
+            except CircuitOpenError as e:
+                if attempt == 0 or attempt + 1 >= max_attempts: raise
+                attempt += 1
+                self._wait(service, e, e.retry_after, attempt, max_attempts, cancel_event)
+                continue
+            try:
+                result = func()
+            except InterruptedError:
+                breaker.record_neutral(is_probe)
+                raise
+            except Exception as e:
+                status, retry_after = self._status_and_retry_after(e)
+                if not self.is_retryable(e):
+                    # Помилка запиту, а не сервісу: повтор нічого не змінить
+                    breaker.record_neutral(is_probe)
+                    raise
+                if status == 429: breaker.record_neutral(is_probe)
+                else: breaker.record_failure(service, is_probe)
+                attempt += 1
+                if attempt >= max_attempts: raise
+                self._wait(service, e, retry_after, attempt, max_attempts, cancel_event)
+            else:
+                breaker.record_success()
+                return result
+
+    def _wait(self, service, error, retry_after, attempt, max_attempts, cancel_event):
+        if retry_after is not None:
+            delay = min(max(retry_after, 0.0), 300.0)
+        else:
+            delay = random.uniform(self.base_delay / 2, min(self.max_delay, self.base_delay * 2 ** attempt))
+        logging.warning(f"{service} error: {error}. Retry {attempt}/{max_attempts - 1} in {delay:.1f}s...")
+        if cancel_event is not None:
+            if cancel_event.wait(delay): raise InterruptedError(f"{service} request was cancelled.")
+        else:
+            time.sleep(delay)
+
+retry_policy = RetryPolicy()
+
+def describe_request_error(error):
+    """Текст помилки запиту з тілом відповіді сервера, якщо воно є."""
+    response = getattr(error, 'response', None)
+    text = getattr(response, 'text', None) if response is not None else None
+    return f"{error} | {text[:500]}" if text else str(error)
+
 class ApiClient:
     """Базовий клас для клієнтів API."""
+    _shared_instances = {}
+    _shared_lock = threading.Lock()
+
     def __init__(self, api_key):
         self.api_key = api_key
         self.headers = {}
 
+    @classmethod
+    def shared(cls, *args, **kwargs):
+        """Повертає спільний екземпляр клієнта з такими параметрами (клієнти потокобезпечні)."""
+        key = (cls, args, tuple(sorted(kwargs.items())))
+        with ApiClient._shared_lock:
+            client = ApiClient._shared_instances.get(key)
+            if client is None:
+                client = ApiClient._shared_instances[key] = cls(*args, **kwargs)
+            return client
+
     def test_connection(self):
         return False, "Not Implemented"
 
@@ -207,34 +1161,44 @@ class OpenRouterClient(ApiClient):
         logging.debug(log_message)
 
 
-    def generate_text(self, model, messages, temperature, max_tokens):
+    def generate_text(self, model, messages, temperature, max_tokens, cancel_event=None):
         payload = {"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens}
-        while True: # Безкінечний цикл для перепідключення
+        cache_key = asset_cache.key('llm', **payload)
+        cached_text = asset_cache.get_text('llm', cache_key)
+        if cached_text is not None:
+            logging.info(f"OpenRouter response for model {model} taken from cache.")
+            return cached_text, None
+
+        def request():
             try:
-                response = requests.post(f"{self.base_url}/chat/completions", headers=self.headers, json=payload, timeout=180)
+                response = http_pool.post(f"{self.base_url}/chat/completions", headers=self.headers, json=payload, timeout=180)
                 response.raise_for_status()
-                response_json = response.json()
-                self._log_api_call(payload, response_json)
-                return response_json['choices'][0]['message']['content'], None
             except requests.exceptions.RequestException as e:
-                error_message = f"OpenRouter Error: {e}. Retrying in 15 seconds..."
-                logging.error(error_message) # Логуємо помилку
                 response_json_for_log = {}
                 try:
-                    if e.response:
-                        response_json_for_log = e.response.json()
-                        error_details = response_json_for_log
-                        error_message += f" | Details: {error_details.get('error', {}).get('message', 'N/A')}"
-                except (ValueError, AttributeError): pass
-                self._log_api_call(payload, response_json_for_log, error=error_message)
-                
-                # Замість того, щоб повертати помилку, чекаємо і пробуємо знову
-                time.sleep(15)
+                    if e.response is not None: response_json_for_log = e.response.json()
+                except ValueError: pass
+                self._log_api_call(payload, response_json_for_log, error=describe_request_error(e))
+                raise
+            response_json = response.json()
+            self._log_api_call(payload, response_json)
+            if not response_json.get('choices'):
+                raise ServiceError(response_json.get('error', {}).get('message', 'Response has no choices'))
+            return response_json['choices'][0]['message']['content']
+
+        try:
+            content = retry_policy.call('OpenRouter', request, cancel_event)
+        except (requests.exceptions.RequestException, ServiceError, CircuitOpenError, ValueError) as e:
+            error_message = f"OpenRouter Error: {describe_request_error(e)}"
+            logging.error(error_message)
+            return None, error_message
+        asset_cache.put_text('llm', cache_key, content)
+        return content, None
 
     def test_connection(self):
         if not self.api_key: return False, "API Key is missing."
         try:
-            response = requests.get(f"{self.base_url}/key", headers={"Authorization": f"Bearer {self.api_key}"})
+            response = http_pool.get(f"{self.base_url}/key", headers={"Authorization": f"Bearer {self.api_key}"})
             if response.status_code == 200:
                 return True, "Success"
             else:
@@ -245,7 +1209,7 @@ class OpenRouterClient(ApiClient):
     def get_balance(self):
         if not self.api_key: return "N/A"
         try:
-            response = requests.get(f"{self.base_url}/key", headers={"Authorization": f"Bearer {self.api_key}"})
+            response = http_pool.get(f"{self.base_url}/key", headers={"Authorization": f"Bearer {self.api_key}"})
             if response.status_code == 200:
                 data = response.json().get('data', {})
                 limit = data.get('limit')
@@ -269,37 +1233,37 @@ class RecraftClient(ApiClient):
             except Exception as e:
                 logging.error(f"Failed to initialize Recraft client: {e}")
 
-    def generate_images(self, prompts, style, model, size="1024x1024", negative_prompt=None):
+    def generate_images(self, prompts, style, model, size="1024x1024", negative_prompt=None, cancel_event=None):
         if not self.client: return [], ["Recraft client not initialized."]
         urls, errors = [], []
+        extra_params = {}
+        if negative_prompt:
+            extra_params['negative_prompt'] = negative_prompt
         for prompt in prompts:
-            while True: # Безкінечний цикл для поточного промпту
-                try:
-                    extra_params = {}
-                    if negative_prompt:
-                        extra_params['negative_prompt'] = negative_prompt
-                    
-                    response = self.client.images.generate(
-                        prompt=prompt, 
-                        style=style, 
-                        model=model, 
-                        n=1, 
-                        size=size,
-                        extra_body=extra_params if extra_params else None
-                    )
-                    urls.append(response.data[0].url)
-                    break # Виходимо з циклу while, якщо запит успішний
-                except Exception as e:
-                    # Логуємо помилку і чекаємо перед повторною спробою
-                    error_message = f"Recraft Error for prompt '{prompt}': {e}. Retrying in 15 seconds..."
-                    logging.error(error_message)
-                    time.sleep(15)
+            request = partial(
+                self.client.images.generate,
+                prompt=prompt, 
+                style=style, 
+                model=model, 
+                n=1, 
+                size=size,
+                extra_body=extra_params if extra_params else None
+            )
+            try:
+                response = retry_policy.call('Recraft', request, cancel_event)
+                urls.append(response.data[0].url)
+            except InterruptedError:
+                raise
+            except Exception as e:
+                error_message = f"Recraft Error for prompt '{prompt}': {e}"
+                logging.error(error_message)
+                errors.append(error_message)
         return urls, errors
         
     def test_connection(self):
         if not self.api_key: return False, "API Key is missing."
         try:
-            response = requests.get(
+            response = http_pool.get(
                 'https://external.api.recraft.ai/v1/users/me',
                 headers={"Authorization": f"Bearer {self.api_key}"}
             )
@@ -316,7 +1280,7 @@ class RecraftClient(ApiClient):
     def get_balance(self):
         if not self.api_key: return "N/A"
         try:
-            response = requests.get(
+            response = http_pool.get(
                 'https://external.api.recraft.ai/v1/users/me',
                 headers={"Authorization": f"Bearer {self.api_key}"}
             )
@@ -331,7 +1295,8 @@ class PollinationsClient(ApiClient):
         super().__init__(api_key)
         self.base_url = "https://image.pollinations.ai/prompt/"
 
-    def generate_image(self, prompt, width=1024, height=1024, model='flux', seed=None, nologo=False):
+    def generate_image(self, prompt, dest_path, width=1024, height=1024, model='flux', seed=None, nologo=False, cancel_event=None):
+        """Потоково записує картинку в dest_path; повертає (sha256 файлу, None)."""
         encoded_prompt = url_quote(prompt)
         url = f"{self.base_url}{encoded_prompt}"
         params = {"width": width, "height": height, "model": model}
@@ -340,17 +1305,15 @@ class PollinationsClient(ApiClient):
         if self.api_key: params["token"] = self.api_key
 
         try:
-            response = requests.get(url, params=params, timeout=300)
-            response.raise_for_status()
-            return response.content, None
+            return http_pool.download(url, dest_path, cancel_event, params=params, timeout=300), None
         except requests.exceptions.RequestException as e:
-            error_text = e.response.text if e.response else str(e)
+            error_text = e.response.text if e.response is not None else str(e)
             error_message = f"Pollinations Error: {error_text}"
             raise RuntimeError(error_message)
 
     def test_connection(self):
         try:
-            response = requests.get("https://image.pollinations.ai/models", timeout=10)
+            response = http_pool.get("https://image.pollinations.ai/models", timeout=10)
             return response.status_code == 200, "Service is reachable"
         except requests.exceptions.RequestException as e:
             return False, str(e)
@@ -362,46 +1325,46 @@ class ElevenLabsBotClient(ApiClient):
         self.post_headers = {"X-API-Key": self.api_key, "Content-Type": "application/json"}
         self.get_headers = {"X-API-Key": self.api_key}
 
-    def create_task(self, text, template_uuid=None):
+    def _call(self, operation, request, cancel_event):
+        """Виконує запит через retry_policy; повертає (результат, None) або (None, текст помилки)."""
+        try:
+            return retry_policy.call('ElevenLabsBot', request, cancel_event), None
+        except (requests.exceptions.RequestException, CircuitOpenError, ValueError) as e:
+            error_message = f"ElevenLabsBot Error ({operation}): {describe_request_error(e)}"
+            logging.error(error_message)
+            return None, error_message
+
+    def create_task(self, text, template_uuid=None, cancel_event=None):
         payload = {"text": text}
         if template_uuid: payload["template_uuid"] = template_uuid
-        while True:
-            try:
-                response = requests.post(f"{self.base_url}/tasks", headers=self.post_headers, json=payload)
-                response.raise_for_status()
-                return response.json(), None
-            except requests.exceptions.RequestException as e:
-                error_message = f"ElevenLabsBot Error (create_task): {e.response.text if e.response else e}. Retrying in 15 seconds..."
-                logging.error(error_message)
-                time.sleep(15)
-
-    def get_task_status(self, task_id):
-        while True:
-            try:
-                response = requests.get(f"{self.base_url}/tasks/{task_id}/status", headers=self.get_headers)
-                response.raise_for_status()
-                return response.json(), None
-            except requests.exceptions.RequestException as e:
-                error_message = f"ElevenLabsBot Error (get_task_status): {e.response.text if e.response else e}. Retrying in 15 seconds..."
-                logging.error(error_message)
-                time.sleep(15)
+        def request():
+            response = http_pool.post(f"{self.base_url}/tasks", headers=self.post_headers, json=payload)
+            response.raise_for_status()
+            return response.json()
+        return self._call('create_task', request, cancel_event)
 
-    def get_result(self, task_id):
-        while True:
-            try:
-                response = requests.get(f"{self.base_url}/tasks/{task_id}/result", headers=self.get_headers, timeout=120)
-                if response.status_code == 200: return response.content, None
-                elif response.status_code == 202: return "pending", None
-                else: response.raise_for_status()
-            except requests.exceptions.RequestException as e:
-                error_message = f"ElevenLabsBot Error (get_result): {e.response.text if e.response else e}. Retrying in 15 seconds..."
-                logging.error(error_message)
-                time.sleep(15)
+    def get_task_status(self, task_id, cancel_event=None):
+        """Один запит статусу без повторів: повтори і терміни задачі веде ElevenLabsPoller. Помилки піднімаються."""
+        def request():
+            response = http_pool.get(f"{self.base_url}/tasks/{task_id}/status", headers=self.get_headers)
+            response.raise_for_status()
+            return response.json()
+        return retry_policy.call('ElevenLabsBot', request, cancel_event, max_attempts=1)
+
+    def get_result(self, task_id, dest_path, cancel_event=None):
+        """Потоково записує готове аудіо в dest_path; результат - sha256 файлу або "pending". Як get_task_status, без повторів."""
+        def request():
+            response = http_pool.get(f"{self.base_url}/tasks/{task_id}/result", headers=self.get_headers, timeout=120, stream=True)
+            if not response.ok or response.status_code == 202: response.close()
+            if response.status_code == 202: return "pending"
+            response.raise_for_status()
+            return http_pool.save_response(response, dest_path, cancel_event)
+        return retry_policy.call('ElevenLabsBot', request, cancel_event, max_attempts=1)
 
     def test_connection(self):
         if not self.api_key: return False, "API Key is missing."
         try:
-            response = requests.get(f"{self.base_url}/balance", headers=self.get_headers)
+            response = http_pool.get(f"{self.base_url}/balance", headers=self.get_headers)
             if response.status_code == 200:
                 return True, f"Success! Balance: {response.json().get('balance_text', 'N/A')}"
             else:
@@ -412,7 +1375,7 @@ class ElevenLabsBotClient(ApiClient):
     def get_balance(self):
         if not self.api_key: return "N/A"
         try:
-            response = requests.get(f"{self.base_url}/balance", headers=self.get_headers)
+            response = http_pool.get(f"{self.base_url}/balance", headers=self.get_headers)
             if response.status_code == 200:
                 return response.json().get('balance_text', 'Error')
             return "Error"
@@ -422,54 +1385,176 @@ class ElevenLabsBotClient(ApiClient):
     def get_templates(self):
         if not self.api_key: return [], "API Key is missing."
         try:
-            response = requests.get(f"{self.base_url}/templates", headers=self.get_headers)
+            response = http_pool.get(f"{self.base_url}/templates", headers=self.get_headers)
             if response.status_code == 200:
                 return response.json(), None
             return [], f"Error {response.status_code}: {response.text}"
         except requests.exceptions.RequestException as e:
             return [], str(e)
 
+class ElevenLabsPoller:
+    """
+    Один на процес asyncio-цикл, що стежить за всіма задачами ElevenLabsBot усіх сценаріїв
+    і завдань. Статуси задач, яким настав час перевірки, запитуються разом за один такт;
+    інтервал перевірки росте, поки статус не змінюється, і скидається при зміні.
+    Тимчасові помилки (мережа, 5xx, 429, розімкнений запобіжник) лише відкладають наступну
+    перевірку: вже оплачена задача втрачається тільки через помилку API або JOB_TIMEOUT.
+    Воркери не тримають потік пулу на час очікування, а отримують Future, що завершується,
+    коли аудіо вже записане на диск.
+    """
+    MIN_INTERVAL = 1.0
+    MAX_INTERVAL = 15.0
+    BACKOFF = 1.5
+    JOB_TIMEOUT = 3600.0 # Скільки секунд задача може не завершуватись, перш ніж її визнають невдалою
+
+    def __init__(self, http_workers=8):
+        self.lock = threading.Lock()
+        self.loop = None
+        self.jobs = {}
+        self.wakeup = None
+        # HTTP-клієнт синхронний, тож самі запити виконуються в невеликому пулі потоків
+        self.http_executor = concurrent.futures.ThreadPoolExecutor(max_workers=http_workers, thread_name_prefix="elevenlabs-poll")
+        # Future задач завершуються тут, тож їхні done-колбеки (кеш, маніфест, транскрипція) не зупиняють цикл опитування
+        self.completion_executor = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix="elevenlabs-done")
+
+    def _ensure_loop(self):
+        with self.lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                threading.Thread(target=self.loop.run_forever, name="elevenlabs-poller", daemon=True).start()
+                asyncio.run_coroutine_threadsafe(self._run(), self.loop)
+            return self.loop
+
+    def watch(self, client, task_id, dest_path, cancel_event=None, on_status=None):
+        """
+        Додає задачу до спостереження; готове аудіо записується в dest_path.
+        Повертає concurrent.futures.Future з sha256 записаного файлу; його done-колбеки виконуються
+        в потоках completion_executor, а не в потоці поллера.
+        on_status(status, status_label) викликається з потоку поллера при кожній зміні статусу.
+        """
+        future = concurrent.futures.Future()
+        job = {'client': client, 'task_id': task_id, 'dest_path': dest_path, 'cancel_event': cancel_event, 'on_status': on_status, 'future': future,
+               'phase': 'status', 'status': None, 'interval': self.MIN_INTERVAL, 'next_check': 0.0, 'checking': False, 'finished': False}
+        loop = self._ensure_loop()
+        loop.call_soon_threadsafe(self._add_job, job)
+        return future
+
+    def _add_job(self, job):
+        job['deadline'] = self.loop.time() + self.JOB_TIMEOUT
+        self.jobs[job['task_id']] = job
+        if self.wakeup is not None: self.wakeup.set()
+
+    async def _run(self):
+        self.wakeup = asyncio.Event()
+        while True:
+            # Скасовані задачі завершуються на найближчому такті, навіть якщо до їх перевірки ще далеко
+            for job in list(self.jobs.values()):
+                if job['cancel_event'] is not None and job['cancel_event'].is_set():
+                    self._finish(job, error=InterruptedError(f"ElevenLabs task {job['task_id']} was cancelled."))
+            # Перевірки не блокують цикл: скасування помічається і поки запит ще виконується
+            now = self.loop.time()
+            for job in self.jobs.values():
+                if not job['checking'] and job['next_check'] <= now:
+                    job['checking'] = True
+                    self.loop.create_task(self._check(job))
+            next_check = min((job['next_check'] for job in self.jobs.values() if not job['checking']), default=now + self.MAX_INTERVAL)
+            # Прокидаємось не рідше ніж раз на 0.5 с, щоб швидко помічати скасування
+            delay = min(max(next_check - self.loop.time(), 0.05), 0.5)
+            self.wakeup.clear()
+            try: await asyncio.wait_for(self.wakeup.wait(), delay)
+            except asyncio.TimeoutError: pass
+
+    def _finish(self, job, result=None, error=None):
+        self.jobs.pop(job['task_id'], None)
+        if job['finished']: return # Задачу вже завершено скасуванням, поки йшов запит
+        job['finished'] = True
+        if error is not None: self.completion_executor.submit(job['future'].set_exception, error)
+        else: self.completion_executor.submit(job['future'].set_result, result)
+
+    def _backoff(self, job, reset=False):
+        job['interval'] = self.MIN_INTERVAL if reset else min(job['interval'] * self.BACKOFF, self.MAX_INTERVAL)
+        job['next_check'] = self.loop.time() + job['interval']
+
+    async def _check(self, job):
+        try:
+            await self._poll(job)
+        finally:
+            job['checking'] = False
+            self.wakeup.set()
+
+    async def _poll(self, job):
+        client, task_id = job['client'], job['task_id']
+        if self.loop.time() >= job['deadline']:
+            self._finish(job, error=TimeoutError(f"ElevenLabsBot task {task_id} did not finish in {self.JOB_TIMEOUT:.0f}s."))
+            return
+        try:
+            if job['phase'] == 'status':
+                status_info = await self.loop.run_in_executor(self.http_executor, client.get_task_status, task_id, job['cancel_event'])
+                status = status_info.get('status', 'unknown')
+                if status == 'error':
+                    self._finish(job, error=ConnectionError(f"ElevenLabsBot task {task_id} failed: {status_info.get('detail', 'API error')}"))
+                    return
+                is_changed = status != job['status']
+                if is_changed:
+                    job['status'] = status
+                    if job['on_status']: job['on_status'](status, status_info.get('status_label', status))
+                if status in ['ending', 'ending_processed']:
+                    # Результат забираємо одразу, без очікування наступного такту
+                    job['phase'] = 'result'
+                    job['interval'] = self.MIN_INTERVAL
+                    job['next_check'] = 0.0
+                else:
+                    self._backoff(job, reset=is_changed)
+            else:
+                checksum = await self.loop.run_in_executor(self.http_executor, client.get_result, task_id, job['dest_path'], job['cancel_event'])
+                if checksum == "pending": self._backoff(job)
+                else: self._finish(job, result=checksum)
+        except InterruptedError as e:
+            self._finish(job, error=e)
+        except Exception as e:
+            # Мережа, 5xx, 429 або розімкнений запобіжник - перевіримо пізніше; решта помилок остаточні
+            if not isinstance(e, (requests.exceptions.RequestException, ConnectionError, ValueError)) or not RetryPolicy.is_retryable(e):
+                logging.error(f"ElevenLabsBot Error (task {task_id}): {describe_request_error(e)}")
+                self._finish(job, error=e)
+                return
+            logging.warning(f"ElevenLabsBot task {task_id}: {describe_request_error(e)}. Will check again later.")
+            self._backoff(job)
+            if getattr(e, 'retry_after', None): job['next_check'] = max(job['next_check'], self.loop.time() + e.retry_after)
+
+elevenlabs_poller = ElevenLabsPoller()
+
 class VoicemakerClient(ApiClient):
     def __init__(self, api_key):
         super().__init__(api_key)
         self.base_url = "https://developer.voicemaker.in/voice/api"
         self.headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
 
-    def generate_audio(self, text, voice_id, lang_code='en-US', engine='neural'):
+    def generate_audio(self, text, voice_id, dest_path, lang_code='en-US', engine='neural', cancel_event=None):
+        """Генерує аудіо і потоково записує його в dest_path; повертає (sha256 файлу, None) або (None, помилка)."""
         payload = {"Engine": engine, "VoiceId": voice_id, "LanguageCode": lang_code, "Text": text, "OutputFormat": "mp3", "SampleRate": "48000"}
-        while True:
-            try:
-                response = requests.post(self.base_url, headers=self.headers, json=payload, timeout=120)
-                response.raise_for_status()
-                data = response.json()
-                if data.get("success"):
-                    audio_url = data.get("path")
-                    # Вкладений цикл для завантаження аудіофайлу
-                    while True:
-                        try:
-                            audio_response = requests.get(audio_url, timeout=120)
-                            audio_response.raise_for_status()
-                            return audio_response.content, None
-                        except requests.exceptions.RequestException as e:
-                            error_message = f"Voicemaker Error (downloading audio): {e.response.text if e.response else e}. Retrying in 15 seconds..."
-                            logging.error(error_message)
-                            time.sleep(15)
-                else:
-                    # Це помилка API, а не з'єднання. Але для надійності додамо повторну спробу.
-                    error_message = f"Voicemaker API Error: {data.get('message', 'Unknown error')}. Retrying in 15 seconds..."
-                    logging.error(error_message)
-                    time.sleep(15)
+        def request_audio_url():
+            response = http_pool.post(self.base_url, headers=self.headers, json=payload, timeout=120)
+            response.raise_for_status()
+            data = response.json()
+            # Це помилка API, а не з'єднання. Але для надійності повторюємо і її.
+            if not data.get("success"): raise ServiceError(data.get('message', 'Unknown error'))
+            return data.get("path")
+        def download_audio(audio_url):
+            return http_pool.download(audio_url, dest_path, cancel_event, timeout=120)
 
-            except requests.exceptions.RequestException as e:
-                error_message = f"Voicemaker Error (API call): {e.response.text if e.response else e}. Retrying in 15 seconds..."
-                logging.error(error_message)
-                time.sleep(15)
+        try:
+            audio_url = retry_policy.call('Voicemaker', request_audio_url, cancel_event)
+            return retry_policy.call('Voicemaker', partial(download_audio, audio_url), cancel_event), None
+        except (requests.exceptions.RequestException, ServiceError, CircuitOpenError, ValueError) as e:
+            error_message = f"Voicemaker Error: {describe_request_error(e)}"
+            logging.error(error_message)
+            return None, error_message
 
     def test_connection(self):
         if not self.api_key: return False, "API Key is missing."
         try:
             list_url = "https://developer.voicemaker.in/voice/list"
-            response = requests.post(list_url, headers=self.headers, json={"language": "en-US"})
+            response = http_pool.post(list_url, headers=self.headers, json={"language": "en-US"})
             if response.status_code == 200 and response.json().get("success"):
                 return True, "Success"
             else:
@@ -484,7 +1569,7 @@ class VoicemakerClient(ApiClient):
             "Engine": "neural", "VoiceId": "ai3-Jony", "LanguageCode": "en-US",
             "Text": ".", "OutputFormat": "mp3"
         }
-        response = requests.post(self.base_url, headers=self.headers, json=payload, timeout=60)
+        response = http_pool.post(self.base_url, headers=self.headers, json=payload, timeout=60)
         response.raise_for_status()
         data = response.json()
         if data.get("success"):
@@ -500,6 +1585,7 @@ class VoicemakerClient(ApiClient):
 class WorkerSignals(QObject):
     """Визначає сигнали, доступні для всіх воркерів."""
     finished = Signal(bool, object)
+    asset_ready = Signal(str, str)
     templates_updated = Signal(list, str)
     balances_updated = Signal(dict)
     status_update = Signal(int, int, str)
@@ -520,6 +1606,20 @@ class BaseWorker(QRunnable):
     def kill(self): self.is_killed.set()
     def check_killed(self):
         if self.is_killed.is_set(): raise InterruptedError("Worker was cancelled.")
+
+    def progress_reporter(self, prefix, interval=1.0):
+        """
+        Колбек прогресу FFmpeg (див. FFmpegScheduler.run), що не частіше ніж раз на interval секунд
+        надсилає status_update з відсотком, швидкістю і ETA. Потребує task_row і lang_idx воркера.
+        """
+        last_emit = 0.0
+        def on_progress(progress):
+            nonlocal last_emit
+            now = time.monotonic()
+            if now - last_emit < interval: return
+            last_emit = now
+            self.signals.status_update.emit(self.task_row, self.lang_idx, f"{prefix}: {format_progress(progress)}")
+        return on_progress
         
     def log_api(self, service, request_details, response_details):
         if self.settings.get('detailed_logging', False):
@@ -534,38 +1634,46 @@ class BaseWorker(QRunnable):
             logging.debug(f"[API Call - {service}]\n>>> REQUEST:\n{req_str}\n\n<<< RESPONSE:\n{res_str}\n" + "="*40)
 
 class AudioAndTranscriptionMasterWorker(BaseWorker):
-    """Керує послідовним виконанням генерації аудіо та транскрипції."""
+    """Керує потоковою генерацією аудіо та транскрипцією (кожен сценарій - щойно готове його аудіо)."""
     def __init__(self, parent_worker):
         super().__init__(settings=parent_worker.settings)
         self.parent = parent_worker
+        self.is_killed = parent_worker.is_killed
 
     @Slot()
     def run(self):
         success = False
         try:
-            self.parent.generate_all_audio()
-            self.check_killed()
-            self.parent._run_sequential_transcription()
+            self.parent.generate_audio_and_subtitles()
             success = True
         except InterruptedError:
             logging.warning("AudioAndTranscriptionMasterWorker was cancelled.")
         except Exception as e:
             logging.error(f"AudioAndTranscriptionMasterWorker failed: {e}", exc_info=True)
         finally:
-            self.signals.finished.emit(success, None)
+            self.signals.finished.emit(success, "audio")
             
 class ImageGenerationWorker(BaseWorker):
-    """Генерує всі картинки для всіх сценаріїв."""
+    """
+    Генерує всі картинки для всіх сценаріїв. Запити виконуються паралельно
+    в межах лімітів одночасності та частоти кожного сервісу (див. configure_image_services).
+    """
     def __init__(self, parent_worker):
         super().__init__(settings=parent_worker.settings)
         self.parent = parent_worker
+        self.is_killed = parent_worker.is_killed
+        self.fetch_executor = None
 
     @Slot()
     def run(self):
         logging.info("--- Sub-step: Image Generation (running in parallel) ---")
+        executor = None
         try:
-            for task_row, lang_idx, lang_config, settings, path in self.parent.scenario_paths:
+            scenarios = {}
+            jobs = []
+            for args in self.parent.scenario_paths:
                 self.check_killed()
+                task_row, lang_idx, lang_config, settings, path = args
                 scenario_name = os.path.basename(path)
                 
                 prompts = []
@@ -575,64 +1683,39 @@ class ImageGenerationWorker(BaseWorker):
                         if cleaned_line:
                             prompts.append(cleaned_line)
                 
-                image_dir = os.path.join(path, 'images'); os.makedirs(image_dir, exist_ok=True)
-
-                # --- ОНОВЛЕНА ЛОГІКА ПЕРЕМИКАННЯ З ЛІЧИЛЬНИКОМ СПРОБ ---
-                
-                for i, prompt in enumerate(prompts):
-                    self.check_killed()
-                    is_prompt_generated = False
-                    error_attempts = 0 # Лічильник спроб для поточного промпту
-                    
-                    while not is_prompt_generated:
-                        service = self.parent.current_image_service  # Читаємо актуальний сервіс щоразу
-                        
-                        try:
-                            status_prompt = (prompt[:75] + '...') if len(prompt) > 75 else prompt
-                            self.parent.status_update.emit(task_row, lang_idx, f"🖼️ {service} [{i+1}/{len(prompts)}]: {status_prompt} (Спроба {error_attempts + 1})")
-                            logging.info(f"[{service}] Generating image {i+1}/{len(prompts)} (Attempt {error_attempts + 1}) for {scenario_name} with prompt: {prompt}")
-
-                            if service == 'Recraft':
-                                cfg = self.settings['api']['recraft']
-                                client = RecraftClient(cfg['api_key'])
-                                urls, errors = client.generate_images([prompt], style=cfg['style'], model=cfg['model'], size=cfg['size'], negative_prompt=cfg.get('negative_prompt'))
-                                if errors: raise RuntimeError("\n".join(errors))
-                                
-                                self.parent.status_update.emit(task_row, lang_idx, f"🖼️ Recraft: завантажую картинку {i+1}/{len(prompts)}")
-                                img_data = requests.get(urls[0]).content
-                                with open(os.path.join(image_dir, f'img_{i+1}.png'), 'wb') as f: f.write(img_data)
-
-                            elif service == 'Pollinations':
-                                cfg = self.settings['api']['pollinations']
-                                client = PollinationsClient(api_key=cfg.get('token'))
-                                img_data, error = client.generate_image(prompt, width=cfg.get('width', 1024), height=cfg.get('height', 1024), model=cfg.get('model', 'flux'), nologo=cfg.get('nologo', False))
-                                if error: raise RuntimeError(error)
-                                
-                                with open(os.path.join(image_dir, f'img_{i+1}.jpg'), 'wb') as f: f.write(img_data)
-                            
-                            is_prompt_generated = True
-                            time.sleep(5)
+                images_inputs = StageManifest.hash_inputs(prompts=prompts)
+                if StageManifest(path).is_complete('images', images_inputs):
+                    logging.info(f"Images for {scenario_name} are already generated, skipping.")
+                    self.signals.asset_ready.emit(path, "images")
+                    continue
 
-                        except Exception as e:
-                            logging.error(f"Image generation failed for prompt {i+1} using {service} (Attempt {error_attempts + 1}): {e}")
-                            error_attempts += 1
-
-                            if error_attempts < 5:
-                                # Якщо спроби ще не вичерпано, просто чекаємо і пробуємо знову ЦЕЙ Ж СЕРВІС
-                                self.parent.status_update.emit(task_row, lang_idx, f"🖼️ Помилка {service}, повторна спроба через 10с...")
-                                time.sleep(10)
-                            else:
-                                # Якщо всі 5 спроб були невдалими, перемикаємо сервіс
-                                if self.settings.get('auto_fallback_image_service', True):
-                                    new_service = 'Pollinations' if service == 'Recraft' else 'Recraft'
-                                    logging.warning(f"Failed after 5 attempts. Fallback enabled. Switching from {service} to {new_service}.")
-                                    self.parent.status_update.emit(task_row, lang_idx, f"🖼️ Помилка! Перемикаюсь на {new_service}...")
-                                    self.parent.current_image_service = new_service
-                                    error_attempts = 0 # Скидаємо лічильник для нового сервісу
-                                else:
-                                    # Якщо перемикання вимкнено, продовжуємо нескінченні спроби
-                                    self.parent.status_update.emit(task_row, lang_idx, f"🖼️ Помилка, повторна спроба через 10с...")
-                                    time.sleep(10)
+                image_dir = os.path.join(path, 'images'); os.makedirs(image_dir, exist_ok=True)
+                scenarios[path] = {'inputs': images_inputs, 'remaining': len(prompts), 'image_paths': [None] * len(prompts)}
+                jobs.extend((args, i, prompt, len(prompts), image_dir) for i, prompt in enumerate(prompts))
+
+            # Потоків вистачає, щоб заповнити ліміти обох сервісів; решту стримують слоти та частота запитів.
+            # Ліміти беруться з resource_limiter, куди configure_image_services вже злив їх зі значеннями за замовчуванням
+            max_workers = max(1, sum(resource_limiter.limits[image_service_slot(name)] for name in DEFAULT_IMAGE_SERVICES))
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image")
+            # Окремий пул для самих запитів у режимі хеджування (основний і дублюючий запит на кожен промпт)
+            self.fetch_executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers * 2, thread_name_prefix="image-fetch")
+            # Завдання подаються в порядку сценаріїв, тож перші сценарії раніше підуть на монтаж
+            futures = {executor.submit(self.generate_image, *job): job for job in jobs}
+
+            pending = set(futures)
+            while pending:
+                self.check_killed()
+                done, pending = concurrent.futures.wait(pending, timeout=0.2, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    args, i, prompt, prompts_count, image_dir = futures[future]
+                    path = args[4]
+                    scenario = scenarios[path]
+                    scenario['image_paths'][i] = future.result()
+                    scenario['remaining'] -= 1
+                    if scenario['remaining'] == 0:
+                        # Картинки сценарію готові - він може йти на монтаж, не чекаючи інших
+                        StageManifest(path).complete('images', scenario['inputs'], scenario['image_paths'])
+                        self.signals.asset_ready.emit(path, "images")
 
             self.signals.finished.emit(True, "images")
             
@@ -642,18 +1725,168 @@ class ImageGenerationWorker(BaseWorker):
         except Exception as e:
             logging.error(f"Critical error in ImageGenerationWorker: {e}", exc_info=True)
             self.signals.finished.emit(False, "images")
+        finally:
+            if executor is not None: executor.shutdown(wait=False, cancel_futures=True)
+            if self.fetch_executor is not None: self.fetch_executor.shutdown(wait=False, cancel_futures=True)
+
+    def generate_image(self, args, i, prompt, prompts_count, image_dir):
+        """Генерує одну картинку з повторними спробами і перемиканням сервісу; повертає шлях до файлу."""
+        task_row, lang_idx, lang_config, settings, path = args
+        scenario_name = os.path.basename(path)
+        status = partial(self.parent.status_update.emit, task_row, lang_idx)
+        error_attempts = 0 # Лічильник спроб для поточного промпту
+
+        while True:
+            self.check_killed()
+            service = self.parent.current_image_service  # Читаємо актуальний сервіс щоразу
+            download_path = self.download_path(image_dir, i, service)
+            if asset_cache.get_file('image', self.image_cache_key(service, prompt), download_path):
+                logging.info(f"Image {i+1}/{prompts_count} for {scenario_name} taken from cache.")
+                return self.save_image(image_dir, i, service, download_path)
+            
+            try:
+                status_prompt = (prompt[:75] + '...') if len(prompt) > 75 else prompt
+                status(f"🖼️ {service} [{i+1}/{prompts_count}]: {status_prompt} (Спроба {error_attempts + 1})")
+                logging.info(f"[{service}] Generating image {i+1}/{prompts_count} (Attempt {error_attempts + 1}) for {scenario_name} with prompt: {prompt}")
+                winner_service, download_path = self.fetch_image_hedged(service, prompt, status, image_dir, i)
+                return self.save_image(image_dir, i, winner_service, download_path)
+
+            except InterruptedError:
+                raise
+            except Exception as e:
+                logging.error(f"Image generation failed for prompt {i+1} of {scenario_name} using {service} (Attempt {error_attempts + 1}): {e}")
+                error_attempts += 1
+
+                if error_attempts < 5:
+                    # Якщо спроби ще не вичерпано, просто чекаємо і пробуємо знову ЦЕЙ Ж СЕРВІС
+                    self.parent.status_update.emit(task_row, lang_idx, f"🖼️ Помилка {service}, повторна спроба через 10с...")
+                elif self.settings.get('auto_fallback_image_service', True):
+                    # Якщо всі 5 спроб були невдалими, перемикаємо сервіс (лише якщо інший запит ще не перемкнув його)
+                    new_service = 'Pollinations' if service == 'Recraft' else 'Recraft'
+                    with self.parent.lock:
+                        if self.parent.current_image_service == service:
+                            self.parent.current_image_service = new_service
+                            logging.warning(f"Failed after 5 attempts. Fallback enabled. Switching from {service} to {new_service}.")
+                            self.parent.status_update.emit(task_row, lang_idx, f"🖼️ Помилка! Перемикаюсь на {new_service}...")
+                    error_attempts = 0 # Скидаємо лічильник для нового сервісу
+                    continue
+                else:
+                    # Якщо перемикання вимкнено, продовжуємо нескінченні спроби
+                    self.parent.status_update.emit(task_row, lang_idx, f"🖼️ Помилка, повторна спроба через 10с...")
+                if self.is_killed.wait(10): self.check_killed()
+
+    @staticmethod
+    def download_path(image_dir, i, service):
+        """Окремий файл завантаження для кожного сервісу, щоб паралельні (хеджовані) запити не заважали один одному."""
+        return os.path.join(image_dir, f"img_{i+1}.{service}.download")
+
+    def save_image(self, image_dir, i, service, download_path):
+        """Атомарно перейменовує завантажену картинку; файл з тим самим номером від іншого сервісу видаляється, щоб не потрапив у монтаж."""
+        image_path = os.path.join(image_dir, f"img_{i+1}.{'png' if service == 'Recraft' else 'jpg'}")
+        os.replace(download_path, image_path)
+        for ext in ('png', 'jpg'):
+            stale_path = os.path.join(image_dir, f"img_{i+1}.{ext}")
+            if stale_path != image_path and os.path.exists(stale_path): os.remove(stale_path)
+        return image_path
+
+    def fetch_image(self, service, prompt, status, cancel_event, image_dir, i, dispatched=None):
+        """
+        Отримує картинку від сервісу в межах його лімітів і потоково записує її у файл завантаження;
+        кешує її, записує тривалість запиту і повертає шлях до файлу.
+        dispatched (threading.Event) встановлюється, коли слоти і токен отримано і запит справді надсилається.
+        """
+        download_path = self.download_path(image_dir, i, service)
+        with resource_limiter.slot('image', cancel_event), resource_limiter.slot(image_service_slot(service), cancel_event):
+            image_rate_limiters[service].acquire(cancel_event)
+            started = time.monotonic()
+            if dispatched is not None: dispatched.set()
+            if service == 'Recraft':
+                cfg = self.settings['api']['recraft']
+                client = RecraftClient.shared(cfg['api_key'])
+                urls, errors = client.generate_images([prompt], style=cfg['style'], model=cfg['model'], size=cfg['size'], negative_prompt=cfg.get('negative_prompt'), cancel_event=cancel_event)
+                if errors: raise RuntimeError("\n".join(errors))
+                
+                status(f"🖼️ Recraft: завантажую картинку")
+                http_pool.download(urls[0], download_path, cancel_event)
+
+            elif service == 'Pollinations':
+                cfg = self.settings['api']['pollinations']
+                client = PollinationsClient.shared(api_key=cfg.get('token'))
+                _, error = client.generate_image(prompt, download_path, width=cfg.get('width', 1024), height=cfg.get('height', 1024), model=cfg.get('model', 'flux'), nologo=cfg.get('nologo', False), cancel_event=cancel_event)
+                if error: raise RuntimeError(error)
+        image_latencies.record(service, time.monotonic() - started)
+        asset_cache.put_file('image', self.image_cache_key(service, prompt), download_path)
+        return download_path
+
+    def fetch_image_hedged(self, service, prompt, status, image_dir, i):
+        """
+        Запит до основного сервісу; якщо він не відповів за заданий перцентиль своєї звичайної
+        затримки, той самий промпт паралельно йде до іншого сервісу. Повертає (сервіс, шлях до файлу)
+        першої успішної відповіді; інший запит скасовується, а його файл, якщо вже завантажений, видаляється.
+        """
+        hedge_cfg = self.settings.get('image_hedging', {})
+        if not hedge_cfg.get('enabled', False):
+            return service, self.fetch_image(service, prompt, status, self.is_killed, image_dir, i)
+
+        hedge_delay = image_latencies.percentile(service, hedge_cfg.get('percentile', 90)) or hedge_cfg.get('default_delay', 60)
+        other_service = 'Pollinations' if service == 'Recraft' else 'Recraft'
+        loser_cancel, dispatched = threading.Event(), threading.Event()
+        futures = {self.fetch_executor.submit(self.fetch_image, service, prompt, status, loser_cancel, image_dir, i, dispatched): service}
+        # Поріг - перцентиль часу обслуговування (без черги за слотами і токенами), тож і відлік іде з моменту надсилання
+        started, is_hedged, first_error = None, False, None
+        try:
+            while futures:
+                self.check_killed()
+                done, _ = concurrent.futures.wait(futures, timeout=0.2, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    future_service = futures.pop(future)
+                    try:
+                        download_path = future.result()
+                    except InterruptedError:
+                        raise
+                    except Exception as e:
+                        logging.warning(f"[{future_service}] Hedged image request failed: {e}")
+                        first_error = first_error or e
+                        continue
+                    if is_hedged: logging.info(f"Hedged image request won by {future_service}.")
+                    return future_service, download_path
+                if started is None and dispatched.is_set(): started = time.monotonic()
+                if futures and not is_hedged and started is not None and time.monotonic() - started >= hedge_delay:
+                    is_hedged = True
+                    logging.info(f"[{service}] No image after {hedge_delay:.1f}s, also requesting it from {other_service}.")
+                    status(f"🖼️ {service} повільно відповідає, паралельно запитую {other_service}...")
+                    futures[self.fetch_executor.submit(self.fetch_image, other_service, prompt, status, loser_cancel, image_dir, i)] = other_service
+            raise first_error
+        finally:
+            loser_cancel.set()
+            for future in futures: future.add_done_callback(self.discard_download)
+
+    @staticmethod
+    def discard_download(future):
+        """Видаляє файл запиту, що програв хеджування, але все ж встиг завантажитись."""
+        if future.cancelled() or future.exception() is not None: return
+        if os.path.exists(future.result()): os.remove(future.result())
+
+    def image_cache_key(self, service, prompt):
+        """Ключ кешу для картинки: промпт і всі параметри сервісу, що впливають на результат."""
+        if service == 'Recraft':
+            cfg = self.settings['api']['recraft']
+            return asset_cache.key('image', service=service, prompt=prompt, style=cfg['style'], model=cfg['model'], size=cfg['size'], negative_prompt=cfg.get('negative_prompt'))
+        cfg = self.settings['api']['pollinations']
+        return asset_cache.key('image', service=service, prompt=prompt, width=cfg.get('width', 1024), height=cfg.get('height', 1024), model=cfg.get('model', 'flux'), nologo=cfg.get('nologo', False))
 
 class TitleGenerationWorker(BaseWorker):
     """Генерує назву для кожного сценарію."""
     def __init__(self, parent_worker):
         super().__init__(settings=parent_worker.settings)
         self.parent = parent_worker
+        self.is_killed = parent_worker.is_killed
 
     @Slot()
     def run(self):
         logging.info("--- Sub-step: Title Generation (running in parallel) ---")
         try:
-            client = OpenRouterClient(
+            client = OpenRouterClient.shared(
                 self.settings['api']['openrouter']['api_key'],
                 detailed_logging=self.settings.get('detailed_logging', False)
             )
@@ -669,13 +1902,22 @@ class TitleGenerationWorker(BaseWorker):
                 title_prompt = lang_config.get('title_prompt')
                 if not title_prompt:
                     logging.warning(f"Title prompt is not defined for language {lang_config['id']}. Skipping title generation for {scenario_name}.")
+                    self.signals.asset_ready.emit(path, "title")
                     continue
                 
+                manifest = StageManifest(path)
+                title_inputs = StageManifest.hash_inputs(text=scenario_text, prompt=title_prompt, model=model)
+                if manifest.is_complete('title', title_inputs):
+                    logging.info(f"Title for {scenario_name} is already generated, skipping.")
+                    self.signals.asset_ready.emit(path, "title")
+                    continue
+
                 self.parent.status_update.emit(task_row, lang_idx, f"✍️ Генерую назву для {scenario_name}...")
                 logging.info(f"Generating title for {scenario_name}...")
                 
                 messages = [{"role": "system", "content": title_prompt}, {"role": "user", "content": scenario_text}]
-                title_text, error = client.generate_text(model['id'], messages, model['temperature'], model['max_tokens'])
+                with resource_limiter.slot('llm', self.is_killed):
+                    title_text, error = client.generate_text(model['id'], messages, model['temperature'], model['max_tokens'], cancel_event=self.is_killed)
 
                 if error:
                     logging.error(f"Title generation failed for {scenario_name}: {error}")
@@ -683,7 +1925,10 @@ class TitleGenerationWorker(BaseWorker):
                 else:
                     with open(os.path.join(path, 'title.txt'), 'w', encoding='utf-8') as f:
                         f.write(title_text.strip())
+                    manifest.complete('title', title_inputs, [os.path.join(path, 'title.txt')])
                     logging.info(f"Title for {scenario_name} generated successfully.")
+                # Назва не обов'язкова: без неї відео отримає назву за замовчуванням
+                self.signals.asset_ready.emit(path, "title")
             
             self.signals.finished.emit(True, "titles")
         except InterruptedError:
@@ -698,6 +1943,9 @@ class MainTaskWorker(QObject):
     finished = Signal(bool, object)
     status_update = Signal(int, int, str)
 
+    # Ресурси сценарію, які мають бути готові перед його монтажем
+    REQUIRED_SCENARIO_ASSETS = frozenset({'images', 'title', 'subtitles'})
+
     def __init__(self, task_id, task_row, work_dir, lang_configs, settings):
         super().__init__()
         self.task_id = task_id
@@ -706,11 +1954,23 @@ class MainTaskWorker(QObject):
         self.lang_configs = lang_configs
         self.settings = settings
         self.is_killed = threading.Event()
-        self.threadpool = QThreadPool.globalInstance()
+        # Власний пул завдання: воркери, що чекають на дочірні, не займають потоки інших завдань
+        self.threadpool = QThreadPool()
+        self.threadpool.setMaxThreadCount(32)
         self.scenario_paths = []
         self.lock = threading.Lock()
         self.asset_phase_tasks_remaining = 0
         self.asset_phase_has_errors = False
+        # --- Стан потокового конвеєра: готові ресурси та монтаж кожного сценарію ---
+        self.scenario_assets = {}
+        self.scheduled_renders = set()
+        self.video_inputs = {} # Хеш вхідних даних монтажу кожного сценарію (для маніфесту)
+        self.renders_in_flight = 0
+        self.completed_renders = 0
+        self.render_has_errors = False
+        self.is_task_finished = False
+        # Потоки рендеру лише чекають на ffmpeg_scheduler, тож пул не обмежує одночасність (див. _start_render_step)
+        self.render_pool = QThreadPool()
         # --- Цей рядок зчитує сервіс для поточного завдання з налаштувань ---
         self.current_image_service = self.settings['tasks'][self.task_row]['image_service']
 
@@ -726,8 +1986,8 @@ class MainTaskWorker(QObject):
                 self.status_update.emit(self.task_row, lang_idx, f"⚙️ Сервіс змінено на {new_service}!")
 
     def kill(self):
+        # Дочірні воркери ділять цю подію і завершуються самі, тому спільний пул не очищуємо
         self.is_killed.set()
-        self.threadpool.clear()
 
     def check_killed(self):
         if self.is_killed.is_set():
@@ -747,27 +2007,59 @@ class MainTaskWorker(QObject):
             self.finished.emit(False, self.task_id)
 
     def generate_scenarios_and_prompts(self):
+        """
+        Генерує сценарії для всіх мов одночасно, а промпти для картинок кожного сценарію -
+        щойно готові сценарії його мови. Кількість одночасних запитів обмежена лімітом 'llm'.
+        """
         logging.info("--- Step: Scenario & Prompt Generation ---")
-        for lang_idx, lang_config in enumerate(self.lang_configs):
-            self.check_killed()
-            lang_id = lang_config['id']
-            lang_name = lang_config['name']
-            self.status_update.emit(self.task_row, lang_idx, f"📝 Сценарії для '{lang_name}'")
-            logging.info(f"Generating scenarios for language: {lang_name} ({lang_id})")
-
-            lang_dir = os.path.join(self.work_dir, lang_id)
-            source_file = next((os.path.join(lang_dir, f) for f in ["rewritten_text.txt", "translation.txt"] if os.path.exists(os.path.join(lang_dir, f))), None)
-            if not source_file: raise FileNotFoundError(f"Source text file not found for {lang_id}")
-            
-            with open(source_file, 'r', encoding='utf-8') as f: text = f.read()
-            
+        client = OpenRouterClient.shared(
+            self.settings['api']['openrouter']['api_key'],
+            detailed_logging=self.settings.get('detailed_logging', False)
+        )
+        model = self.settings['api']['openrouter']['models'][0]
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=resource_limiter.limits['llm'], thread_name_prefix="llm")
+        try:
+            pending = {executor.submit(self._generate_language_scenarios, client, model, lang_idx, lang_config)
+                       for lang_idx, lang_config in enumerate(self.lang_configs)}
+            while pending:
+                self.check_killed()
+                done, pending = concurrent.futures.wait(pending, timeout=0.2, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    prompt_jobs = future.result() # Для сценаріїв - список промптів, які треба згенерувати; для промптів - None
+                    for job in prompt_jobs or []:
+                        pending.add(executor.submit(self._generate_image_prompts, client, model, *job))
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        self.scenario_paths = self.get_all_scenario_paths()
+
+    def _generate_language_scenarios(self, client, model, lang_idx, lang_config):
+        """Генерує (або бере з маніфесту) сценарії однієї мови; повертає завдання на генерацію промптів."""
+        self.check_killed()
+        lang_id = lang_config['id']
+        lang_name = lang_config['name']
+        self.status_update.emit(self.task_row, lang_idx, f"📝 Сценарії для '{lang_name}'")
+        logging.info(f"Generating scenarios for language: {lang_name} ({lang_id})")
+
+        lang_dir = os.path.join(self.work_dir, lang_id)
+        source_file = next((os.path.join(lang_dir, f) for f in ["rewritten_text.txt", "translation.txt"] if os.path.exists(os.path.join(lang_dir, f))), None)
+        if not source_file: raise FileNotFoundError(f"Source text file not found for {lang_id}")
+        
+        with open(source_file, 'r', encoding='utf-8') as f: text = f.read()
+        shorts_dir = os.path.join(lang_dir, 'shorts')
+
+        lang_manifest = StageManifest(lang_dir)
+        scenarios_inputs = StageManifest.hash_inputs(text=text, prompt=lang_config['scenario_prompt'], model=model)
+        if lang_manifest.is_complete('scenarios', scenarios_inputs):
+            parsed_scenarios = []
+            for rel_path in lang_manifest.stage_outputs('scenarios'):
+                with open(os.path.join(lang_dir, rel_path), 'r', encoding='utf-8') as f: parsed_scenarios.append(f.read())
+            logging.info(f"Scenarios for {lang_name} are already generated ({len(parsed_scenarios)}), skipping.")
+        else:
             messages_scenario = [{"role": "system", "content": lang_config['scenario_prompt']}, {"role": "user", "content": text}]
-            client = OpenRouterClient(
-                self.settings['api']['openrouter']['api_key'],
-                detailed_logging=self.settings.get('detailed_logging', False)
-            )
-            model = self.settings['api']['openrouter']['models'][0]
-            scenarios_text, error = client.generate_text(model['id'], messages_scenario, model['temperature'], model['max_tokens'])
+            with resource_limiter.slot('llm', self.is_killed):
+                scenarios_text, error = client.generate_text(model['id'], messages_scenario, model['temperature'], model['max_tokens'], cancel_event=self.is_killed)
             if error: raise ConnectionError(f"Scenario generation failed: {error}")
             
             # Оновлена логіка для розрізання сценаріїв по нумерації
@@ -783,235 +2075,249 @@ class MainTaskWorker(QObject):
                 raise ValueError(f"Could not parse any scenarios from LLM response for {lang_id}")
             logging.info(f"Generated {len(parsed_scenarios)} scenarios for {lang_name}.")
 
-            shorts_dir = os.path.join(lang_dir, 'shorts')
-            
+            scenario_files = []
             for i, scenario_text in enumerate(parsed_scenarios):
-                self.check_killed()
                 scenario_dir = os.path.join(shorts_dir, f'scenario_{i+1}')
                 os.makedirs(scenario_dir, exist_ok=True)
-                with open(os.path.join(scenario_dir, 'scenario.txt'), 'w', encoding='utf-8') as f: f.write(scenario_text)
-
-                self.status_update.emit(self.task_row, lang_idx, f"🖼️ Промти для сценарію {i+1}")
-                logging.info(f"Generating image prompts for scenario {i+1} ({lang_name})...")
-                messages_prompt = [{"role": "system", "content": lang_config['image_prompt_prompt']}, {"role": "user", "content": scenario_text}]
-                prompts_text, error = client.generate_text(model['id'], messages_prompt, model['temperature'], model['max_tokens'])
-                if error: raise ConnectionError(f"Prompt generation failed: {error}")
-                
-                # Промпти зберігаються в файл в оригінальному вигляді з нумерацією
-                with open(os.path.join(scenario_dir, 'image_prompts.txt'), 'w', encoding='utf-8') as f: f.write(prompts_text)
+                scenario_files.append(os.path.join(scenario_dir, 'scenario.txt'))
+                with open(scenario_files[-1], 'w', encoding='utf-8') as f: f.write(scenario_text)
+            lang_manifest.complete('scenarios', scenarios_inputs, scenario_files)
+
+        return [(lang_idx, lang_config, i, os.path.join(shorts_dir, f'scenario_{i+1}'), scenario_text)
+                for i, scenario_text in enumerate(parsed_scenarios)]
+
+    def _generate_image_prompts(self, client, model, lang_idx, lang_config, i, scenario_dir, scenario_text):
+        """Генерує (або пропускає за маніфестом) промпти для картинок одного сценарію."""
+        self.check_killed()
+        lang_name = lang_config['name']
+        manifest = StageManifest(scenario_dir)
+        prompts_inputs = StageManifest.hash_inputs(text=scenario_text, prompt=lang_config['image_prompt_prompt'], model=model)
+        if manifest.is_complete('prompts', prompts_inputs):
+            logging.info(f"Image prompts for scenario {i+1} ({lang_name}) are already generated, skipping.")
+            return
 
-        self.scenario_paths = self.get_all_scenario_paths()
+        self.status_update.emit(self.task_row, lang_idx, f"🖼️ Промти для сценарію {i+1}")
+        logging.info(f"Generating image prompts for scenario {i+1} ({lang_name})...")
+        messages_prompt = [{"role": "system", "content": lang_config['image_prompt_prompt']}, {"role": "user", "content": scenario_text}]
+        with resource_limiter.slot('llm', self.is_killed):
+            prompts_text, error = client.generate_text(model['id'], messages_prompt, model['temperature'], model['max_tokens'], cancel_event=self.is_killed)
+        if error: raise ConnectionError(f"Prompt generation failed: {error}")
+        
+        # Промпти зберігаються в файл в оригінальному вигляді з нумерацією
+        prompts_path = os.path.join(scenario_dir, 'image_prompts.txt')
+        with open(prompts_path, 'w', encoding='utf-8') as f: f.write(prompts_text)
+        manifest.complete('prompts', prompts_inputs, [prompts_path])
 
     def run_asset_generation_phase(self):
-        """Запускає генерацію картинок, назв і (аудіо + транскрипція) паралельно."""
-        logging.info("--- Step: Parallel Asset Generation ---")
-        self.asset_phase_tasks_remaining = 3 # Змінено на 3
-        self.asset_phase_has_errors = False
+        """
+        Запускає генерацію картинок, назв і (аудіо + транскрипція) паралельно.
+        Кожен сценарій іде на монтаж, щойно готові саме його ресурси (див. on_scenario_asset_ready).
+        """
+        logging.info("--- Step: Parallel Asset Generation & Streaming Video Assembly ---")
+        with self.lock:
+            self.asset_phase_tasks_remaining = 3
+            self.asset_phase_has_errors = False
+            self.scenario_assets = {args[4]: set() for args in self.scenario_paths}
         
         image_worker = ImageGenerationWorker(self)
-        image_worker.signals.finished.connect(self.on_asset_phase_finished)
+        image_worker.signals.asset_ready.connect(self.on_scenario_asset_ready, Qt.DirectConnection)
+        image_worker.signals.finished.connect(self.on_asset_phase_finished, Qt.DirectConnection)
         self.threadpool.start(image_worker)
         
-        title_worker = TitleGenerationWorker(self) # Новий воркер
-        title_worker.signals.finished.connect(self.on_asset_phase_finished)
+        title_worker = TitleGenerationWorker(self)
+        title_worker.signals.asset_ready.connect(self.on_scenario_asset_ready, Qt.DirectConnection)
+        title_worker.signals.finished.connect(self.on_asset_phase_finished, Qt.DirectConnection)
         self.threadpool.start(title_worker)
         
         audio_transcribe_worker = AudioAndTranscriptionMasterWorker(self)
-        audio_transcribe_worker.signals.finished.connect(self.on_asset_phase_finished)
+        audio_transcribe_worker.signals.finished.connect(self.on_asset_phase_finished, Qt.DirectConnection)
         self.threadpool.start(audio_transcribe_worker)
 
     @Slot(bool, object)
     def on_asset_phase_finished(self, success, result):
-        """Чекає, доки і картинки, і субтитри будуть готові."""
+        """Фіксує завершення одного з воркерів генерації ресурсів."""
         with self.lock:
             if not success:
                 self.asset_phase_has_errors = True
+                logging.error(f"Asset generation step '{result}' failed for task #{self.task_id}.")
             self.asset_phase_tasks_remaining -= 1
+            if self.asset_phase_tasks_remaining == 0 and not self.asset_phase_has_errors:
+                logging.info("--- Step Finished: All Assets (Images, Audio, Subtitles) are Ready ---")
+        self._check_task_completion()
 
-            if self.asset_phase_tasks_remaining == 0:
-                if self.asset_phase_has_errors:
-                    logging.error("Asset generation (images or audio/subs) failed.")
-                    self.finished.emit(False, self.task_id)
-                else:
-                    logging.info("--- Step Finished: All Assets (Images, Audio, Subtitles) are Ready ---")
-                    QTimer.singleShot(0, self.run_video_assembly_pipeline)
-
-    def generate_all_audio(self):
-        """Генерує всі аудіофайли (метод з AudioMasterWorker)."""
-        from collections import defaultdict
-        scenarios_by_lang = defaultdict(list)
-        for path_tuple in self.scenario_paths:
-            lang_id = path_tuple[2]['id'] 
-            scenarios_by_lang[lang_id].append(path_tuple)
-
-        for lang_id, scenarios_for_this_lang in scenarios_by_lang.items():
-            logging.info(f"--- Starting audio generation for language: {lang_id} ---")
-            pool = self.threadpool
-            completion_event = threading.Event()
-            active_workers = len(scenarios_for_this_lang)
-            lock = threading.Lock()
-            has_errors = threading.Event()
-
-            if active_workers == 0: continue
-
-            def on_finished(success, result):
-                nonlocal active_workers
-                if not success: has_errors.set()
-                with lock:
-                    active_workers -= 1
-                    if active_workers == 0: completion_event.set()
-
-            for args in scenarios_for_this_lang:
-                worker = AudioGenerationWorker(*args)
-                worker.signals.status_update.connect(self.status_update)
-                worker.signals.finished.connect(on_finished, Qt.DirectConnection)
-                pool.start(worker)
-            
-            while not completion_event.wait(0.2): self.check_killed()
-            
-            if has_errors.is_set():
-                raise RuntimeError(f"One or more audio generation tasks failed for language {lang_id}.")
-            logging.info(f"--- Finished audio generation for language: {lang_id} ---")
-
-    def _run_sequential_transcription(self):
-        """Послідовно транскрибує всі готові аудіофайли."""
-        logging.info("--- Sub-step: Sequential Transcription from AUDIO files ---")
-        
-        model = whisper.load_model("base")
-        sub_settings = self.settings.get('ffmpeg', {}).get('subtitle', {})
-        max_words = sub_settings.get('max_words_per_segment', 8)
-
-        # Словник для перетворення вирівнювання з налаштувань у формат pysubs2
-        alignment_map_pysubs2 = {
-            '1': 1, '2': 2, '3': 3,       # Bottom
-            '4': 5, '5': 6, '6': 7,       # Middle (pysubs2 uses different numbers)
-            '7': 9, '8': 10, '9': 11      # Top
-        }
+    @Slot(str, str)
+    def on_scenario_asset_ready(self, scenario_path, asset):
+        """Запускає монтаж сценарію, щойно всі його ресурси готові (викликається з робочих потоків)."""
+        with self.lock:
+            if self.is_killed.is_set() or scenario_path not in self.scenario_assets: return
+            ready_assets = self.scenario_assets[scenario_path]
+            ready_assets.add(asset)
+            if not self.REQUIRED_SCENARIO_ASSETS.issubset(ready_assets) or scenario_path in self.scheduled_renders: return
+            self.scheduled_renders.add(scenario_path)
+            self.renders_in_flight += 1
+
+        manifest = StageManifest(scenario_path)
+        video_inputs = StageManifest.hash_inputs(
+            assets={stage: manifest.stage_outputs(stage) for stage in ('images', 'title', 'audio', 'subtitles')},
+            ffmpeg=self.settings.get('ffmpeg', {}))
+        with self.lock: self.video_inputs[scenario_path] = video_inputs
+        if manifest.is_complete('video', video_inputs):
+            logging.info(f"Video for {os.path.basename(scenario_path)} is already rendered, skipping.")
+            with self.lock:
+                self.renders_in_flight -= 1
+                self.completed_renders += 1
+            self._check_task_completion()
+            return
 
-        for task_row, lang_idx, lang_config, settings, path in self.scenario_paths:
-            self.check_killed()
-            scenario_name = os.path.basename(path)
-            
-            audio_path = os.path.join(path, 'audio.mp3')
-            ass_path = os.path.join(path, 'subtitles.ass')
+        args = next(a for a in self.scenario_paths if a[4] == scenario_path)
+        logging.info(f"All assets are ready for {os.path.basename(scenario_path)}. Starting video assembly.")
+        self._start_render_step(SilentMontageWorker, args)
+
+    def _start_render_step(self, worker_class, args, priority=0):
+        worker = worker_class(*args)
+        worker.is_killed = self.is_killed
+        worker.signals.status_update.connect(self.status_update)
+        worker.signals.finished.connect(partial(self.on_render_step_finished, worker_class, args), Qt.DirectConnection)
+        # Кожен крок отримує власний потік: допуск до FFmpeg за пріоритетом і ресурсами вирішує лише ffmpeg_scheduler
+        if self.render_pool.activeThreadCount() >= self.render_pool.maxThreadCount():
+            self.render_pool.setMaxThreadCount(self.render_pool.activeThreadCount() + 1)
+        self.render_pool.start(worker, priority)
+
+    def on_render_step_finished(self, worker_class, args, success, result):
+        scenario_name = os.path.basename(args[4])
+        two_pass = not self.settings.get('ffmpeg', {}).get('single_pass_render', True)
+        if success and worker_class is SilentMontageWorker and two_pass and not self.is_killed.is_set():
+            # Фіналізація має пріоритет над новими монтажами, щоб не накопичувати тимчасові файли
+            self._start_render_step(FinalizeVideoWorker, args, priority=1)
+            return
 
-            if not os.path.exists(audio_path): 
-                logging.warning(f"Audio file not found for {scenario_name}, skipping transcription.")
-                continue
+        if success and not self.is_killed.is_set():
+            video_path = os.path.join(os.path.dirname(args[4]), get_video_filename(args[4]))
+            if os.path.exists(video_path): StageManifest(args[4]).complete('video', self.video_inputs[args[4]], [video_path])
 
-            # --- НОВИЙ РЯДОК ЛОГУВАННЯ ---
-            self.status_update.emit(task_row, lang_idx, f"✒️ Транскрипція для {scenario_name}...")
-            logging.info(f"Starting transcription for {scenario_name}...")
-            
-            try:
-                result = model.transcribe(audio_path, verbose=False, word_timestamps=True)
-                
-                subs = pysubs2.SSAFile()
-                
-                def _ass_to_pysubs2_color(ass_color):
-                    try:
-                        if not ass_color.startswith('&H'): return pysubs2.Color(255, 255, 255)
-                        hex_color = ass_color.lstrip('&H').rstrip('&')
-                        if len(hex_color) == 8:
-                            aa, bb, gg, rr = int(hex_color[0:2], 16), int(hex_color[2:4], 16), int(hex_color[4:6], 16), int(hex_color[6:8], 16)
-                            return pysubs2.Color(r=rr, g=gg, b=bb, a=aa)
-                        else:
-                            bb, gg, rr = int(hex_color[0:2], 16), int(hex_color[2:4], 16), int(hex_color[4:6], 16)
-                            return pysubs2.Color(r=rr, g=gg, b=bb)
-                    except Exception: return pysubs2.Color(255, 255, 255)
-
-                style = subs.styles["Default"].copy()
-                style.fontname = sub_settings.get('fontname', 'Arial')
-                style.fontsize = float(sub_settings.get('fontsize', 60))
-                style.primarycolor = _ass_to_pysubs2_color(sub_settings.get('primary_color', '&H00FFFFFF'))
-                style.secondarycolor = _ass_to_pysubs2_color(sub_settings.get('secondary_color', '&H000000FF'))
-                style.outlinecolor = _ass_to_pysubs2_color(sub_settings.get('outline_color', '&H00000000'))
-                style.backcolor = _ass_to_pysubs2_color(sub_settings.get('shadow_color', '&H96000000'))
-                style.bold = sub_settings.get('bold', True)
-                style.italic = sub_settings.get('italic', False)
-                style.outline = float(sub_settings.get('outline', 3.0))
-                style.shadow = float(sub_settings.get('shadow', 3.0))
-                
-                alignment_key = sub_settings.get('alignment', '2')
-                style.alignment = alignment_map_pysubs2.get(alignment_key, 2)
-
-                style.marginl = int(sub_settings.get('marginl', 20))
-                style.marginr = int(sub_settings.get('marginr', 20))
-                style.marginv = int(sub_settings.get('marginv', 60))
-                
-                subs.styles["Default"] = style
-
-                all_words = [word for s in result['segments'] if 'words' in s for word in s['words']]
-
-                animation = sub_settings.get('animation', 'None')
-                anim_tag = ""
-                if animation == "Fade": anim_tag = "{\\fad(250,250)}"
-                elif animation == "Karaoke": anim_tag = "{\\fad(150,150)}"
-
-                current_pos = 0
-                while current_pos < len(all_words):
-                    segment_words = all_words[current_pos : current_pos + max_words]
-                    if not segment_words: break
-                    start_time = segment_words[0]['start'] * 1000
-                    end_time = segment_words[-1]['end'] * 1000
-                    text = " ".join(word['word'] for word in segment_words).strip()
-                    full_text = f"{anim_tag}{text}"
-                    event = pysubs2.SSAEvent(start=start_time, end=end_time, text=full_text)
-                    subs.events.append(event)
-                    current_pos += max_words
-                
-                subs.save(ass_path)
-            except Exception as e:
-                logging.error(f"Failed to create subtitles for {scenario_name}: {e}", exc_info=True)
-                raise e
+        with self.lock:
+            self.renders_in_flight -= 1
+            if success: self.completed_renders += 1
+            else: self.render_has_errors = True
+        if success: logging.info(f"Video for {scenario_name} is ready.")
+        self._check_task_completion()
+
+    def _check_task_completion(self):
+        """Завершує завдання, коли всі воркери ресурсів і всі запущені монтажі закінчили роботу."""
+        with self.lock:
+            if self.is_task_finished or self.asset_phase_tasks_remaining > 0 or self.renders_in_flight > 0: return
+            self.is_task_finished = True
+            success = (not self.asset_phase_has_errors and not self.render_has_errors and not self.is_killed.is_set()
+                       and self.completed_renders == len(self.scenario_paths))
 
-    def run_video_assembly_pipeline(self):
-        """Запускає монтаж тимчасових відео, а потім фіналізацію."""
-        try:
-            self.check_killed()
-            self._run_parallel_stage(SilentMontageWorker, "--- Step: Creating silent videos ---")
-            self.check_killed()
-            self._run_parallel_stage(FinalizeVideoWorker, "--- Step: Finalizing videos ---")
-            
+        if success:
             logging.info(f"Task #{self.task_id} finished successfully.")
-            self.finished.emit(True, self.task_id)
+        else:
+            logging.error(f"Task #{self.task_id} failed: {self.completed_renders}/{len(self.scenario_paths)} videos were created.")
+        self.finished.emit(success, self.task_id)
 
-        except Exception as e:
-            logging.error(f"Video assembly pipeline failed for task #{self.task_id}: {e}", exc_info=True)
-            self.finished.emit(False, self.task_id)
+    def generate_audio_and_subtitles(self):
+        """
+        Генерує аудіо для всіх сценаріїв усіх мов одночасно і передає кожен готовий
+        аудіофайл на транскрипцію, не чекаючи решти. Субтитри сценарію зберігаються,
+        щойно повертається його транскрипція, тож озвучка і Whisper працюють внахлест.
+        """
+        logging.info("--- Sub-step: Audio generation and transcription (streaming) ---")
 
-    def _run_parallel_stage(self, worker_class, log_message):
-        """Допоміжний метод для запуску багатьох воркерів паралельно."""
-        logging.info(log_message)
-        max_threads = self.settings.get('ffmpeg', {}).get('max_concurrent', 3)
-        pool = QThreadPool()
-        pool.setMaxThreadCount(max_threads)
-        completion_event = threading.Event()
-        active_workers = len(self.scenario_paths)
-        lock = threading.Lock()
-        has_errors = threading.Event()
-
-        if active_workers == 0:
-            logging.warning(f"No scenarios to process for stage: {log_message}.")
-            return
+        whisper_cfg = self.settings.get('transcription', {})
+        with use_transcription_engine(whisper_cfg.get('model', 'base'), whisper_cfg.get('device'), resource_limiter.limits['transcription']) as engine:
+            is_align_mode = whisper_cfg.get('mode', 'align') == 'align'
 
-        def on_finished(success, result):
-            nonlocal active_workers
-            if not success: has_errors.set()
-            with lock:
-                active_workers -= 1
-                if active_workers == 0: completion_event.set()
+            lock = threading.Lock()
+            transcriptions = {}
+            subtitle_inputs = {}
+            failed_audio = []
+            audio_in_progress = len(self.scenario_paths)
+
+            def on_audio_finished(args, success, result):
+                nonlocal audio_in_progress
+                task_row, lang_idx, lang_config, settings, path = args
+                scenario_name = os.path.basename(path)
+                future, failed = None, not success
+                # Лічильник зменшується за будь-якого результату, інакше цикл очікування нижче не завершиться
+                try:
+                    if success and not self.is_killed.is_set():
+                        text = None
+                        if is_align_mode:
+                            # Текст озвучки відомий - достатньо вирівняти його за часом
+                            with open(os.path.join(path, 'scenario.txt'), 'r', encoding='utf-8') as f: text = f.read()
+                        audio_path = os.path.join(path, 'audio.mp3')
+                        audio_checksum = StageManifest.file_checksum(audio_path)
+                        inputs_hash = StageManifest.hash_inputs(
+                            audio=audio_checksum, text=text, model=whisper_cfg.get('model', 'base'),
+                            subtitle=self.settings.get('ffmpeg', {}).get('subtitle', {}))
+                        if StageManifest(path).is_complete('subtitles', inputs_hash):
+                            logging.info(f"Subtitles for {scenario_name} are already created, skipping.")
+                            # Монтаж плануємо до зменшення лічильника, щоб завдання не завершилось раніше
+                            self.on_scenario_asset_ready(path, "subtitles")
+                            return
+                        subtitle_inputs[path] = inputs_hash
+                        # Змінився лише стиль субтитрів - слова беремо з кешу, .ass перебудовується без Whisper
+                        transcript_key = asset_cache.key('transcript', audio=audio_checksum, text=text, model=whisper_cfg.get('model', 'base'))
+                        cached_words = asset_cache.get_text('transcript', transcript_key)
+                        if cached_words is not None:
+                            logging.info(f"Using cached transcript for {scenario_name}.")
+                            future = concurrent.futures.Future()
+                            future.set_result(json.loads(cached_words))
+                        else:
+                            self.status_update.emit(task_row, lang_idx, f"✒️ Транскрипція для {scenario_name}...")
+                            logging.info(f"Starting {'alignment' if is_align_mode else 'transcription'} for {scenario_name}...")
+                            future = engine.submit(audio_path, text)
+                            future.add_done_callback(partial(cache_transcript, transcript_key))
+                except Exception as e:
+                    logging.error(f"Failed to start transcription for {scenario_name}: {e}", exc_info=True)
+                    failed = True
+                finally:
+                    with lock:
+                        audio_in_progress -= 1
+                        if future is not None: transcriptions[future] = args
+                        elif failed: failed_audio.append(scenario_name)
+
+            for args in self.scenario_paths:
+                worker = AudioGenerationWorker(*args)
+                worker.is_killed = self.is_killed
+                worker.signals.status_update.connect(self.status_update)
+                worker.signals.finished.connect(partial(on_audio_finished, args), Qt.DirectConnection)
+                self.threadpool.start(worker)
 
-        for args in self.scenario_paths:
-            worker = worker_class(*args)
-            worker.signals.status_update.connect(self.status_update)
-            worker.signals.finished.connect(on_finished, Qt.DirectConnection)
-            pool.start(worker)
-        
-        while not completion_event.wait(0.1): self.check_killed()
-        
-        if has_errors.is_set():
-            raise RuntimeError(f"One or more tasks failed during stage: {log_message}")
+            handled = set()
+            try:
+                while True:
+                    self.check_killed()
+                    with lock:
+                        pending = set(transcriptions) - handled
+                        is_audio_done = audio_in_progress == 0
+                    if not pending:
+                        if is_audio_done: break
+                        time.sleep(0.2)
+                        continue
+
+                    done, _ = concurrent.futures.wait(pending, timeout=0.2, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        handled.add(future)
+                        task_row, lang_idx, lang_config, settings, path = transcriptions[future]
+                        scenario_name = os.path.basename(path)
+                        try:
+                            all_words = future.result()
+                            ass_path = os.path.join(path, 'subtitles.ass')
+                            compile_style(self.settings.get('ffmpeg', {}).get('subtitle', {})).save(all_words, ass_path)
+                            StageManifest(path).complete('subtitles', subtitle_inputs[path], [ass_path])
+                        except Exception as e:
+                            logging.error(f"Failed to create subtitles for {scenario_name}: {e}", exc_info=True)
+                            raise e
+                        logging.info(f"Subtitles for {scenario_name} are ready.")
+                        self.on_scenario_asset_ready(path, "subtitles")
+            finally:
+                with lock:
+                    for future in set(transcriptions) - handled: future.cancel()
+
+            if failed_audio:
+                raise RuntimeError(f"Audio generation or transcription failed for: {', '.join(failed_audio)}")
 
     def get_all_scenario_paths(self):
         paths = []
@@ -1024,80 +2330,115 @@ class MainTaskWorker(QObject):
         return paths
 
 class AudioGenerationWorker(BaseWorker):
-    """Відповідає за генерацію одного аудіофайлу для одного сценарію."""
+    """
+    Відповідає за генерацію одного аудіофайлу для одного сценарію.
+    Задачі ElevenLabsBot після створення передаються в elevenlabs_poller, і воркер
+    завершується (сигнал finished) вже з його колбеку, не займаючи потік пулу.
+    """
     def __init__(self, task_row, lang_idx, lang_config, settings, scenario_path):
         super().__init__(settings=settings)
         self.task_row, self.lang_idx, self.lang_config, self.settings, self.scenario_path = task_row, lang_idx, lang_config, settings, scenario_path
+        # Об'єкт має пережити run(): для ElevenLabs finished надсилається пізніше
+        self.setAutoDelete(False)
 
     @Slot()
     def run(self):
         success = False
+        is_handed_off = False
         scenario_name = os.path.basename(self.scenario_path)
         try:
             with open(os.path.join(self.scenario_path, 'scenario.txt'), 'r', encoding='utf-8') as f:
                 text = f.read()
-            audio_path = os.path.join(self.scenario_path, 'audio.mp3')
             service = self.lang_config['voice_service']
-            audio_data = None
-            
-            logging.info(f"Starting audio generation for {scenario_name} using {service}")
+            self.manifest = StageManifest(self.scenario_path)
+            self.audio_inputs = StageManifest.hash_inputs(text=text, service=service, voice_template=self.lang_config['voice_template'])
+            if self.manifest.is_complete('audio', self.audio_inputs):
+                logging.info(f"Audio for {scenario_name} is already generated, skipping.")
+                success = True
+                return
             
-            if service == 'ElevenLabsBot':
-                client = ElevenLabsBotClient(self.settings['api']['elevenlabs']['api_key'])
-                
-                # --- Створення задачі ---
-                self.check_killed()
-                self.signals.status_update.emit(self.task_row, self.lang_idx, f"🎤 ElevenLabs: створюю задачу для {scenario_name}")
-                task_info, _ = client.create_task(text, self.lang_config['voice_template'])
-                task_id = task_info['task_id']
-                logging.info(f"ElevenLabs task created for {scenario_name}: ID {task_id}.")
-                
-                # --- Очікування обробки ---
-                is_ready_for_download = False
-                while not is_ready_for_download:
-                    self.check_killed()
-                    status_info, _ = client.get_task_status(task_id)
-                    status = status_info.get('status', 'unknown')
-                    status_label = status_info.get('status_label', status)
-                    self.signals.status_update.emit(self.task_row, self.lang_idx, f"🎤 ElevenLabs ({scenario_name}): {status_label}")
-                    logging.info(f"ElevenLabs task {task_id} status: {status_label}")
-                    
-                    if status == 'error': raise ConnectionError(f"ElevenLabsBot task {task_id} failed: {status_info.get('detail', 'API error')}")
-                    if status in ['ending', 'ending_processed']:
-                        is_ready_for_download = True
-                    else:
-                        time.sleep(10) # Продовжуємо чекати, поки задача обробляється
-                
-                # --- Завантаження результату ---
-                while audio_data is None:
-                    self.check_killed()
-                    self.signals.status_update.emit(self.task_row, self.lang_idx, f"🎤 ElevenLabs: завантаження аудіо для {scenario_name}")
-                    data, _ = client.get_result(task_id)
-                    if data == "pending":
-                        self.signals.status_update.emit(self.task_row, self.lang_idx, f"🎤 ElevenLabs: результат ще не готовий...")
-                        time.sleep(10)
-                    else:
-                        audio_data = data
-
-            elif service == 'Voicemaker':
-                client = VoicemakerClient(self.settings['api']['voicemaker']['api_key'])
-                self.check_killed()
-                self.signals.status_update.emit(self.task_row, self.lang_idx, f"🎤 Voicemaker: генерую аудіо для {scenario_name}")
-                audio_data, _ = client.generate_audio(text, self.lang_config['voice_template'])
+            self.cache_key = asset_cache.key('tts', service=service, text=text, voice_template=self.lang_config['voice_template'])
+            self.audio_path = os.path.join(self.scenario_path, 'audio.mp3')
+            checksum = None
+            if asset_cache.get_file('tts', self.cache_key, self.audio_path):
+                logging.info(f"Audio for {scenario_name} taken from cache.")
+            else:
+                logging.info(f"Starting audio generation for {scenario_name} using {service}")
+                if service == 'ElevenLabsBot':
+                    self.start_elevenlabs_task(text)
+                    is_handed_off = True
+                    return
+
+                elif service == 'Voicemaker':
+                    with resource_limiter.slot('tts', self.is_killed):
+                        client = VoicemakerClient.shared(self.settings['api']['voicemaker']['api_key'])
+                        self.check_killed()
+                        self.signals.status_update.emit(self.task_row, self.lang_idx, f"🎤 Voicemaker: генерую аудіо для {scenario_name}")
+                        checksum, error = client.generate_audio(text, self.lang_config['voice_template'], self.audio_path, cancel_event=self.is_killed)
+                        if error: raise ConnectionError(error)
+                asset_cache.put_file('tts', self.cache_key, self.audio_path)
             
-            if audio_data:
-                self.signals.status_update.emit(self.task_row, self.lang_idx, f"🎤 Аудіо для {scenario_name} збережено!")
-                with open(audio_path, 'wb') as f: f.write(audio_data)
-                success = True
+            success = self.save_audio(checksum)
         except InterruptedError:
              logging.warning(f"AudioGenerationWorker for {scenario_name} was cancelled.")
         except Exception as e:
             logging.error(f"AudioGenerationWorker error for {scenario_name}: {e}", exc_info=True)
+        finally:
+            if not is_handed_off: self.signals.finished.emit(success, None)
+
+    def save_audio(self, checksum=None):
+        """Фіксує вже записаний audio.mp3 у маніфесті; checksum - sha256, порахована під час завантаження."""
+        if not os.path.isfile(self.audio_path) or not os.path.getsize(self.audio_path): return False
+        self.signals.status_update.emit(self.task_row, self.lang_idx, f"🎤 Аудіо для {os.path.basename(self.scenario_path)} збережено!")
+        self.manifest.complete('audio', self.audio_inputs, [self.audio_path], checksums={self.audio_path: checksum})
+        return True
+
+    def start_elevenlabs_task(self, text):
+        """Створює задачу ElevenLabsBot і передає очікування результату в elevenlabs_poller."""
+        scenario_name = os.path.basename(self.scenario_path)
+        client = ElevenLabsBotClient.shared(self.settings['api']['elevenlabs']['api_key'])
+        # Слот 'tts' тримається до отримання аудіо і звільняється в on_elevenlabs_finished
+        resource_limiter.acquire('tts', self.is_killed)
+        try:
+            self.check_killed()
+            self.signals.status_update.emit(self.task_row, self.lang_idx, f"🎤 ElevenLabs: створюю задачу для {scenario_name}")
+            task_info, error = client.create_task(text, self.lang_config['voice_template'], cancel_event=self.is_killed)
+            if error: raise ConnectionError(error)
+            task_id = task_info['task_id']
+            logging.info(f"ElevenLabs task created for {scenario_name}: ID {task_id}.")
+        except BaseException:
+            resource_limiter.release('tts')
+            raise
+        future = elevenlabs_poller.watch(client, task_id, self.audio_path, self.is_killed, on_status=partial(self.on_elevenlabs_status, task_id))
+        future.add_done_callback(self.on_elevenlabs_finished)
+
+    def on_elevenlabs_status(self, task_id, status, status_label):
+        self.signals.status_update.emit(self.task_row, self.lang_idx, f"🎤 ElevenLabs ({os.path.basename(self.scenario_path)}): {status_label}")
+        logging.info(f"ElevenLabs task {task_id} status: {status_label}")
+
+    def on_elevenlabs_finished(self, future):
+        resource_limiter.release('tts')
+        success = False
+        scenario_name = os.path.basename(self.scenario_path)
+        try:
+            checksum = future.result()
+            asset_cache.put_file('tts', self.cache_key, self.audio_path)
+            success = self.save_audio(checksum)
+        except InterruptedError:
+            logging.warning(f"AudioGenerationWorker for {scenario_name} was cancelled.")
+        except Exception as e:
+            logging.error(f"AudioGenerationWorker error for {scenario_name}: {e}", exc_info=True)
         finally:
             self.signals.finished.emit(success, None)
 
 class SilentMontageWorker(BaseWorker):
-    """Створює тимчасове 'німе' відео з картинок, переходів та аудіодоріжки."""
+    """
+    Створює відео з картинок, переходів та аудіодоріжки.
+    В однопрохідному режимі (ffmpeg.single_pass_render) субтитри впалюються тим самим
+    фільтром, і одразу виходить фінальне відео; інакше створюється тимчасове 'німе' відео
+    для FinalizeVideoWorker.
+    При ffmpeg.segmented_render кліпи рендеряться паралельними сегментами (див. render_segmented).
+    """
     def __init__(self, task_row, lang_idx, lang_config, settings, scenario_path):
         super().__init__(settings=settings)
         self.task_row, self.lang_idx, self.lang_config, self.settings, self.scenario_path = task_row, lang_idx, lang_config, settings, scenario_path
@@ -1107,96 +2448,151 @@ class SilentMontageWorker(BaseWorker):
         success = False
         scenario_name = os.path.basename(self.scenario_path)
         try:
-            self.signals.status_update.emit(self.task_row, self.lang_idx, f"🎞️ Монтаж для {scenario_name}...")
-            logging.info(f"Starting silent montage for {scenario_name}...")
+            self.check_killed()
+            cfg = self.settings['ffmpeg']
+            single_pass = cfg.get('single_pass_render', True)
+            ass_path = os.path.join(self.scenario_path, 'subtitles.ass')
+
+            if single_pass:
+                self.signals.status_update.emit(self.task_row, self.lang_idx, f"🎞️ Монтаж з субтитрами для {scenario_name}...")
+                logging.info(f"Starting single-pass montage with subtitles for {scenario_name}...")
+            else:
+                self.signals.status_update.emit(self.task_row, self.lang_idx, f"🎞️ Монтаж для {scenario_name}...")
+                logging.info(f"Starting silent montage for {scenario_name}...")
 
             audio_path, img_dir = os.path.join(self.scenario_path, 'audio.mp3'), os.path.join(self.scenario_path, 'images')
             if not all(os.path.exists(p) for p in [audio_path, img_dir]): raise FileNotFoundError("Assets not ready.")
+            if single_pass and not os.path.exists(ass_path): raise FileNotFoundError(f"Subtitles not found for {scenario_name}")
             images = sorted([os.path.join(img_dir, f) for f in os.listdir(img_dir) if f.lower().endswith(('.png', '.jpg', '.jpeg'))])
             if not images: raise FileNotFoundError("No images found.")
 
-            # --- Нова логіка для визначення назви файлу ---
             output_dir = os.path.dirname(self.scenario_path)
-            title_path = os.path.join(self.scenario_path, 'title.txt')
-            video_filename = f"video_{scenario_name.split('_')[-1]}.mp4" # Назва за замовчуванням
-            if os.path.exists(title_path):
-                try:
-                    with open(title_path, 'r', encoding='utf-8') as f:
-                        title = f.read().strip()
-                    if title:
-                        # Очищуємо назву від символів, неприпустимих у назвах файлів
-                        sanitized_title = re.sub(r'[\\/*?:"<>|]', "", title)
-                        video_filename = f"{sanitized_title}.mp4"
-                except Exception as e:
-                    logging.warning(f"Could not read title from {title_path}, using default name. Error: {e}")
-            
-            temp_video_path = os.path.join(output_dir, f"temp_{video_filename}")
-            # --- Кінець нової логіки ---
+            video_filename = get_video_filename(self.scenario_path)
+            if single_pass:
+                output_path = os.path.join(output_dir, video_filename)
+            else:
+                output_path = os.path.join(output_dir, f"temp_{video_filename}")
 
-            ffprobe_cmd = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', audio_path]
-            total_duration = float(subprocess.check_output(ffprobe_cmd).decode('utf-8').strip())
-            
-            cfg = self.settings['ffmpeg']
-            transition_duration, num_transitions = cfg.get('transition_duration', 1.0), max(0, len(images) - 1)
-            img_duration = (total_duration - num_transitions * transition_duration) / len(images) if len(images) > 0 else 0
-            if img_duration <= 0: img_duration, transition_duration = total_duration / len(images) if len(images) > 0 else 0, 0
-
-            cmd, f_complex = ['ffmpeg', '-y'], []
-            for i, img in enumerate(images): cmd.extend(['-loop', '1', '-t', str(img_duration + (transition_duration if i < num_transitions else 0)), '-i', img])
-            cmd.extend(['-i', audio_path])
-
-            import random
-            for i in range(len(images)):
-                stream = f"[{i}:v]scale=2160:3840,setsar=1,format=yuv420p"
-                if (cfg.get('zoom_effect', True) or cfg.get('pan_effect', True)) and img_duration > 0:
-                    fr, total_frames = 30, int(img_duration * 30)
-                    px, py = "0", "0"
-                    if cfg.get('pan_effect', True):
-                        m_type = cfg.get('pan_direction', 'random')
-                        if m_type == "random": m_type = random.choice(["horizontal", "vertical", "infinity"])
-                        amp = cfg.get('pan_amount', 0.05) * 100
-                        m_period = 20.0 * fr
-                        if m_type == "horizontal": px = f"sin(2*PI*on/{m_period})*{amp}"
-                        elif m_type == "vertical": py = f"sin(2*PI*on/{m_period})*{amp}"
-                        elif m_type == "infinity": px, py = f"sin(2*PI*on/{m_period})*{amp}", f"sin(4*PI*on/{m_period})*{amp/2}"
-                    z_expr = "1.1"
-                    if cfg.get('zoom_effect', True):
-                        z_start, z_end = cfg.get('zoom_start', 1.0), cfg.get('zoom_end', 1.2)
-                        if z_end < z_start: z_end = z_start
-                        base_z, amp_z = (z_start + z_end) / 2.0, (z_end - z_start) / 2.0
-                        z_expr = f"{base_z}+{amp_z}*cos(2*PI*on/{(10.0*fr)})"
-                    x_final, y_final = f"(iw-iw/({z_expr}))/2+{px}", f"(ih-ih/({z_expr}))/2+{py}"
-                    stream += f",zoompan=z='{z_expr}':d={total_frames}:s=1080x1920:x='{x_final}':y='{y_final}':fps={fr}"
-                else: stream += f",scale=1080:1920:force_original_aspect_ratio=decrease,pad=1080:1920:(ow-iw)/2:(oh-ih)/2"
-                f_complex.append(stream + f"[v{i}]")
-
-            last_stream = "[v0]"
-            if len(images) > 1:
-                for i in range(num_transitions):
-                    offset = (i + 1) * img_duration + i * transition_duration
-                    f_complex.append(f"{last_stream}[v{i+1}]xfade=transition=fade:duration={transition_duration}:offset={offset}[vt{i}]")
-                    last_stream = f"[vt{i}]"
-            
-            f_complex.append(f"{last_stream}format=yuv420p[outv]")
-            cmd.extend(['-filter_complex', ";".join(f_complex), '-map', '[outv]', '-map', f'{len(images)}:a'])
+            total_duration = probe_duration(audio_path)
             
-            codec_key, codec_cfg = cfg.get('selected_codec', 'CPU (libx264)'), cfg.get('codecs', {})
-            codec_config = codec_cfg.get(codec_key, {})
-            cmd.extend(['-c:v', codec_config.get('codec', 'libx264')])
-            if 'bitrate' in codec_config: cmd.extend(['-b:v', codec_config['bitrate']])
-            elif 'preset' in codec_config and 'crf' in codec_config: cmd.extend(['-preset', codec_config['preset'], '-crf', str(codec_config['crf'])])
-            cmd.extend(['-c:a', 'aac', '-b:a', '192k', '-shortest', temp_video_path])
-            
-            proc = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8')
-            if proc.returncode != 0: raise RuntimeError(f"FFmpeg failed during montage:\n{proc.stderr}")
+            img_duration, transition_duration = montage_timing(total_duration, len(images), cfg.get('transition_duration', 1.0))
+
+            # Масштабування до робочої роздільності робиться один раз на картинку, а не в кожному кадрі
+            motion = has_motion(cfg, img_duration)
+            prenormalize = cfg.get('prenormalize_images', True)
+            if prenormalize:
+                self.signals.status_update.emit(self.task_row, self.lang_idx, f"🖼️ Підготовка картинок для {scenario_name}...")
+                images = normalize_images(images, motion, self.is_killed)
+                self.check_killed()
+
+            subtitles_path = ass_path if single_pass else None
+            render_args = (images, audio_path, output_path, subtitles_path, total_duration, img_duration, transition_duration, prenormalize)
+            if cfg.get('segmented_render', False) and len(images) > 1 and img_duration - transition_duration > 0.1:
+                logging.info(f"Rendering {scenario_name} as {len(images)} parallel segments.")
+                self.render_segmented(*render_args)
+            else:
+                self.render_single(*render_args)
             success = True
+        except InterruptedError:
+            logging.warning(f"SilentMontageWorker for {scenario_name} was cancelled.")
         except Exception as e:
             logging.error(f"SilentMontageWorker error for {scenario_name}: {e}", exc_info=True)
         finally:
             self.signals.finished.emit(success, None)
 
+    def run_ffmpeg(self, cmd, stage, cores=1, memory_mb=512, duration=None, on_progress=None):
+        self.check_killed()
+        proc = ffmpeg_scheduler.run(cmd, FFmpegScheduler.PRIORITY_MONTAGE, cores, memory_mb, self.is_killed,
+                                    label=f"{stage} ({os.path.basename(self.scenario_path)})", duration=duration, on_progress=on_progress)
+        if proc.returncode != 0: raise RuntimeError(f"FFmpeg failed during {stage}:\n{proc.stderr}")
+
+    def render_single(self, images, audio_path, output_path, ass_path, total_duration, img_duration, transition_duration, prenormalize):
+        """Увесь монтаж одним процесом FFmpeg (див. build_montage_command)."""
+        cmd = build_montage_command(images, audio_path, output_path, self.settings['ffmpeg'], img_duration, transition_duration,
+                                    get_codec_args(self.settings['ffmpeg']), ass_path, prenormalize)
+        # Увесь граф в одному процесі: кодер займає кілька ядер, кожен вхід тримає кадри 4K у пам'яті
+        self.run_ffmpeg(cmd, "montage", cores=4, memory_mb=512 + 128 * len(images), duration=total_duration,
+                        on_progress=self.progress_reporter(f"🎞️ Монтаж {os.path.basename(self.scenario_path)}"))
+
+    def render_segmented(self, images, audio_path, output_path, ass_path, total_duration, img_duration, transition_duration, prenormalize):
+        """
+        Рендерить кожен кліп окремим процесом FFmpeg, паралельно на всіх ядрах. Кліп ріжеться на "тіло" -
+        готовий сегмент фінального відео - і короткі "голову" та "хвіст" (ділянки переходів, без втрат).
+        Переходи xfade перекодовуються окремо лише на своїх вікнах, після чого всі сегменти склеюються
+        concat без перекодування. Субтитри впалюються в кожен сегмент зі зсувом на його місце у відео.
+        """
+        fr = MONTAGE_FPS
+        count = len(images)
+        total_frames = int(round(total_duration * fr))
+        t_frames = int(round(transition_duration * fr))
+        # Перший кадр кожного переходу на спільній шкалі кадрів; кліп k+1 починається разом з переходом k
+        tr_starts = [int(round(((k + 1) * (img_duration + transition_duration) - transition_duration) * fr)) for k in range(count - 1)]
+        clip_starts = [0] + tr_starts
+        codec_args = get_codec_args(self.settings['ffmpeg'])
+        seg_dir = os.path.join(self.scenario_path, 'segments')
+        # Загальний прогрес - сума вже відрендерених секунд усіх кліпів, що йдуть паралельно
+        report = self.progress_reporter(f"🎞️ Сегменти {os.path.basename(self.scenario_path)}")
+        progress_lock, clip_times = threading.Lock(), {}
+        clips_duration = (total_frames + t_frames * (count - 1)) / fr
+
+        def clip_progress(k, progress):
+            with progress_lock:
+                clip_times[k] = progress['out_time']
+                done = sum(clip_times.values())
+            report({**progress, 'out_time': done, 'percent': min(100.0, done / clips_duration * 100), 'eta': None})
+        segment_path = lambda name: os.path.join(seg_dir, name)
+
+        def subtitles(start_frame):
+            # ass бере час з PTS кадру, тож сегмент тимчасово зсувається на свою позицію у фінальному відео
+            if not ass_path: return ""
+            offset = start_frame / fr
+            return f",setpts=PTS+{offset}/TB,{build_ass_filter(ass_path)},setpts=PTS-{offset}/TB"
+
+        def render_clip(k):
+            clip_start = clip_starts[k]
+            body_start = t_frames if k > 0 else 0
+            body_end = (tr_starts[k] if k < count - 1 else total_frames) - clip_start
+            clip_frames = body_end + (t_frames if k < count - 1 else 0)
+            parts = {'body': (body_start, body_end, segment_path(f"body_{k}.mp4"))}
+            if k > 0 and t_frames: parts['head'] = (0, t_frames, segment_path(f"head_{k}.mkv"))
+            if k < count - 1 and t_frames: parts['tail'] = (body_end, clip_frames, segment_path(f"tail_{k}.mkv"))
+
+            f_complex = [f"[0:v]{build_clip_filter(self.settings['ffmpeg'], img_duration, prenormalize)},fps={fr},trim=end_frame={clip_frames},setpts=PTS-STARTPTS,split={len(parts)}"
+                         + "".join(f"[s_{name}]" for name in parts)]
+            for name, (start, end, _) in parts.items():
+                chain = f"[s_{name}]trim=start_frame={start}:end_frame={end},setpts=PTS-STARTPTS"
+                if name == 'body': chain += subtitles(clip_start + start)
+                f_complex.append(f"{chain}[{name}]")
+            cmd = ['ffmpeg', '-y', '-loop', '1', '-t', str(clip_frames / fr + 1), '-i', images[k], '-filter_complex', ";".join(f_complex)]
+            for name, (_, _, path) in parts.items():
+                cmd.extend(['-map', f'[{name}]', *(codec_args if name == 'body' else ['-c:v', 'ffv1']), path])
+            self.run_ffmpeg(cmd, f"montage of clip {k + 1}", cores=2, memory_mb=512, on_progress=partial(clip_progress, k))
+
+        def render_transition(k):
+            xfade = f"xfade=transition=fade:duration={t_frames / fr}:offset=0,format=yuv420p{subtitles(tr_starts[k])}"
+            cmd = ['ffmpeg', '-y', '-i', segment_path(f"tail_{k}.mkv"), '-i', segment_path(f"head_{k + 1}.mkv"),
+                   '-filter_complex', f"[0:v][1:v]{xfade}[v]", '-map', '[v]', *codec_args, segment_path(f"transition_{k}.mp4")]
+            self.run_ffmpeg(cmd, f"transition {k + 1}", cores=1, memory_mb=256)
+
+        os.makedirs(seg_dir, exist_ok=True)
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=min(count, os.cpu_count() or 1), thread_name_prefix="segment") as executor:
+                list(executor.map(render_clip, range(count)))
+                if t_frames: list(executor.map(render_transition, range(count - 1)))
+
+            list_path = segment_path('segments.txt')
+            with open(list_path, 'w', encoding='utf-8') as f:
+                for k in range(count):
+                    f.write(f"file 'body_{k}.mp4'\n")
+                    if k < count - 1 and t_frames: f.write(f"file 'transition_{k}.mp4'\n")
+            cmd = ['ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', list_path, '-i', audio_path, '-map', '0:v', '-map', '1:a',
+                   '-c:v', 'copy', '-c:a', 'aac', '-b:a', '192k', '-shortest', output_path]
+            self.run_ffmpeg(cmd, "segment concat", cores=1, memory_mb=128)
+        finally:
+            shutil.rmtree(seg_dir, ignore_errors=True)
+
 class FinalizeVideoWorker(BaseWorker):
-    """Впаює субтитри у тимчасове відео для отримання фінального результату."""
+    """Впаює субтитри у тимчасове відео для отримання фінального результату (двопрохідний режим)."""
     def __init__(self, task_row, lang_idx, lang_config, settings, scenario_path):
         super().__init__(settings=settings)
         self.task_row, self.lang_idx, self.lang_config, self.settings, self.scenario_path = task_row, lang_idx, lang_config, settings, scenario_path
@@ -1205,42 +2601,25 @@ class FinalizeVideoWorker(BaseWorker):
     def run(self):
         success = False
         s_name = os.path.basename(self.scenario_path); out_dir = os.path.dirname(self.scenario_path)
-        
-        # --- Нова логіка для визначення назви файлу (ідентична до SilentMontageWorker) ---
-        title_path = os.path.join(self.scenario_path, 'title.txt')
-        v_filename = f"video_{s_name.split('_')[-1]}.mp4" # Назва за замовчуванням
-        if os.path.exists(title_path):
-            try:
-                with open(title_path, 'r', encoding='utf-8') as f:
-                    title = f.read().strip()
-                if title:
-                    sanitized_title = re.sub(r'[\\/*?:"<>|]', "", title)
-                    v_filename = f"{sanitized_title}.mp4"
-            except Exception as e:
-                logging.warning(f"Could not read title from {title_path}, using default name. Error: {e}")
-
+        v_filename = get_video_filename(self.scenario_path)
         final_path, temp_path, ass_path = os.path.join(out_dir, v_filename), os.path.join(out_dir, f"temp_{v_filename}"), os.path.join(self.scenario_path, 'subtitles.ass')
-        # --- Кінець нової логіки ---
         
         try:
+            self.check_killed()
             self.signals.status_update.emit(self.task_row, self.lang_idx, f"🎬 Finalizing {s_name}")
             if not all(os.path.exists(p) for p in [temp_path, ass_path]): raise FileNotFoundError(f"Missing assets for {s_name}")
 
-            safe_ass = ass_path.replace('\\', '/').replace(':', '\\:')
-            font_dir = 'C:/Windows/Fonts'.replace(':', '\\:')
-            vf_str = f"ass=filename='{safe_ass}':fontsdir='{font_dir}'"
-            cmd = ['ffmpeg', '-y', '-i', temp_path, '-vf', vf_str]
-            
-            cfg = self.settings['ffmpeg']
-            codec_key = cfg.get('selected_codec', 'CPU (libx264)'); codec_config = cfg.get('codecs', {}).get(codec_key, {})
-            cmd.extend(['-c:v', codec_config.get('codec', 'libx264')])
-            if 'bitrate' in codec_config: cmd.extend(['-b:v', codec_config['bitrate']])
-            elif 'preset' in codec_config and 'crf' in codec_config: cmd.extend(['-preset', codec_config['preset'], '-crf', str(codec_config['crf'])])
+            cmd = ['ffmpeg', '-y', '-i', temp_path, '-vf', build_ass_filter(ass_path)]
+            cmd.extend(get_codec_args(self.settings['ffmpeg']))
             cmd.extend(['-c:a', 'copy', final_path])
 
-            proc = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8')
+            proc = ffmpeg_scheduler.run(cmd, FFmpegScheduler.PRIORITY_FINALIZE, cores=2, memory_mb=384, cancel_event=self.is_killed,
+                                        label=f"finalize ({s_name})", duration=probe_duration(temp_path),
+                                        on_progress=self.progress_reporter(f"🎬 Finalizing {s_name}"))
             if proc.returncode != 0: raise RuntimeError(f"FFmpeg failed during finalization:\n{proc.stderr}")
             success = True
+        except InterruptedError:
+            logging.warning(f"FinalizeVideoWorker for {s_name} was cancelled.")
         except Exception as e:
             logging.error(f"FinalizeVideoWorker error for {s_name}: {e}", exc_info=True)
         finally:
@@ -1249,24 +2628,105 @@ class FinalizeVideoWorker(BaseWorker):
                 except OSError as e: logging.error(f"Failed to remove temp file {temp_path}: {e}")
             self.signals.finished.emit(success, None)
 
-class PreviewWorker(BaseWorker):
-    """Створює відео для попереднього перегляду на основі налаштувань."""
-    def __init__(self, command, output_path):
-        super().__init__()
-        self.command = command; self.output_path = output_path
-    
+class PreviewPipelineWorker(BaseWorker):
+    """
+    Увесь конвеєр прев'ю з налаштувань у фоновому потоці: субтитри (мітки часу з кешу або Whisper),
+    монтаж без субтитрів і окреме впалювання субтитрів. Монтаж зберігається з відбитком його вхідних
+    даних у manifest.json папки прев'ю, тож якщо змінились лише субтитри, повторюється тільки останній
+    прохід. Етапи та прогрес FFmpeg надходять через status_update (task_row і lang_idx дорівнюють -1),
+    скасування зупиняє поточний процес FFmpeg.
+    finished(success, result): result - шлях до відео, текст помилки або None при скасуванні.
+    """
+    PREVIEW_DIR = "preview"
+    # Чорнове прев'ю: третина роздільності, половина частоти кадрів і найшвидший пресет кодера
+    DRAFT_SCALE = 1 / 3
+    DRAFT_FPS = 15
+    DRAFT_CODEC = ['-c:v', 'libx264', '-preset', 'ultrafast', '-crf', '30']
+
+    def __init__(self, settings, effects, codec_args, sub_settings, transition_duration, is_draft):
+        super().__init__(settings=settings)
+        self.task_row, self.lang_idx = -1, -1
+        self.effects, self.codec_args, self.sub_settings = effects, codec_args, sub_settings
+        self.transition_duration, self.is_draft = transition_duration, is_draft
+
+    def stage(self, text):
+        self.check_killed()
+        self.signals.status_update.emit(self.task_row, self.lang_idx, text)
+
+    def run_ffmpeg(self, cmd, stage, duration, cores, memory_mb):
+        proc = ffmpeg_scheduler.run(cmd, FFmpegScheduler.PRIORITY_PREVIEW, cores, memory_mb, self.is_killed,
+                                    label=f"preview {stage}", duration=duration, on_progress=self.progress_reporter(stage, interval=0.5))
+        if proc.returncode != 0: raise RuntimeError(f"FFmpeg {stage} failed:\n{proc.stderr}")
+
     @Slot()
     def run(self):
-        success = False
+        success, result = False, None
+        audio_path, img_dir = os.path.join(self.PREVIEW_DIR, 'audio.mp3'), os.path.join(self.PREVIEW_DIR, 'images')
+        ass_path = os.path.join(self.PREVIEW_DIR, 'subtitles.ass')
+        temp_video_path, output_path = os.path.join(self.PREVIEW_DIR, 'preview_temp.mp4'), os.path.join(self.PREVIEW_DIR, 'preview_video.mp4')
         try:
-            logging.info(f"Executing FFmpeg preview command: {' '.join(self.command)}")
-            proc = subprocess.run(self.command, capture_output=True, text=True, encoding='utf-8')
-            if proc.returncode != 0: raise RuntimeError(f"FFmpeg preview failed:\n{proc.stderr}")
-            success = True
+            if not all(os.path.exists(p) for p in [audio_path, img_dir]): raise FileNotFoundError("Не знайдено файли для попереднього перегляду.")
+            images = sorted([os.path.join(img_dir, f) for f in os.listdir(img_dir) if f.lower().endswith(('.png', '.jpg', '.jpeg'))])
+            if not images: raise FileNotFoundError(f"В папці '{img_dir}' не знайдено зображень.")
+            total_duration = probe_duration(audio_path)
+            img_duration, transition_duration = montage_timing(total_duration, len(images), self.transition_duration)
+
+            # Субтитри будуються з аудіо (мітки часу кешуються), тож не чекають на відео
+            self.stage("Етап 1: Субтитри...")
+            all_words = self.preview_words(audio_path)
+            self.check_killed()
+            compile_style(self.sub_settings).save(all_words, ass_path)
+
+            # Чорновий монтаж (зменшений кадр, найшвидший пресет) зберігається окремо від повного
+            montage_stage = 'montage_draft' if self.is_draft else 'montage'
+            montage_path = os.path.join(self.PREVIEW_DIR, f"preview_silent{'_draft' if self.is_draft else ''}.mp4")
+            scale, fps = (self.DRAFT_SCALE, self.DRAFT_FPS) if self.is_draft else (1.0, MONTAGE_FPS)
+            # Відбиток лише того, що впливає на монтаж; стиль субтитрів і групування слів у нього не входять
+            montage_hash = StageManifest.hash_inputs(
+                images=[[os.path.basename(p), StageManifest.file_checksum(p)] for p in images], audio=StageManifest.file_checksum(audio_path),
+                effects=self.effects, codec=self.codec_args, transition_duration=transition_duration, scale=scale, fps=fps)
+            manifest = StageManifest(self.PREVIEW_DIR)
+            if manifest.is_complete(montage_stage, montage_hash):
+                logging.info("Preview montage inputs are unchanged, re-rendering the subtitle overlay only.")
+            else:
+                self.stage("Етап 2: Створення відео...")
+                cmd = build_montage_command(images, audio_path, temp_video_path, self.effects, img_duration, transition_duration, self.codec_args, scale=scale, fps=fps)
+                self.run_ffmpeg(cmd, "Етап 2: Створення відео", total_duration, cores=2 if self.is_draft else 4,
+                                memory_mb=(256 + 32 * len(images)) if self.is_draft else (512 + 128 * len(images)))
+                os.replace(temp_video_path, montage_path)
+                manifest.complete(montage_stage, montage_hash, [montage_path])
+
+            self.stage("Етап 3: Фіналізація...")
+            cmd = ['ffmpeg', '-y', '-i', montage_path, '-vf', build_ass_filter(os.path.abspath(ass_path))]
+            cmd.extend(self.codec_args)
+            cmd.extend(['-c:a', 'copy', output_path])
+            self.run_ffmpeg(cmd, "Етап 3: Фіналізація", total_duration, cores=2, memory_mb=384)
+            success, result = True, output_path
+        except InterruptedError:
+            logging.warning("Preview generation was cancelled.")
         except Exception as e:
-            logging.error(f"PreviewWorker error: {e}", exc_info=True)
+            logging.error(f"Preview generation failed: {e}", exc_info=True)
+            result = str(e)
         finally:
-            self.signals.finished.emit(success, self.output_path)
+            if os.path.exists(temp_video_path):
+                try: os.remove(temp_video_path)
+                except OSError: pass
+            self.signals.finished.emit(success, result)
+
+    def preview_words(self, audio_path):
+        """
+        Слова з мітками часу для аудіо прев'ю, розпізнані прямо з audio.mp3. Кешуються в asset_cache за
+        контрольною сумою аудіо і моделлю Whisper, тож зміна ефектів чи стилю лише перебудовує .ass.
+        """
+        whisper_cfg = self.settings.get('transcription', {})
+        model_name = whisper_cfg.get('model', 'base')
+        transcript_key = asset_cache.key('transcript', audio=StageManifest.file_checksum(audio_path), text=None, model=model_name)
+        cached_words = asset_cache.get_text('transcript', transcript_key)
+        if cached_words is not None: return json.loads(cached_words)
+        with whisper_models.use(model_name, whisper_cfg.get('device')) as model:
+            words = transcribe_words(model, audio_path)
+        asset_cache.put_text('transcript', transcript_key, json.dumps(words, ensure_ascii=False))
+        return words
 
 class BalanceUpdateWorker(BaseWorker):
     """Оновлює баланси всіх підключених API."""
@@ -1341,10 +2801,19 @@ class MainWindow(QMainWindow):
         self.threadpool.setMaxThreadCount(20) # Збільшимо ліміт потоків для паралельної роботи
         self.worker_threads = {}
         self.is_queue_running = False
-        self.current_queue_task_row = -1
+        self.next_queue_task_row = -1
+        self.queue_active_task_ids = set() # Завдання черги, що виконуються зараз
+        self.queue_draining = False # Після збою нові завдання не запускаються, черга чекає на вже запущені
 
         setup_file_logging()
         self.settings = self.load_settings() 
+        resource_limiter.configure(self.settings.get('resource_limits', {}))
+        whisper_models.idle_timeout = self.settings.get('transcription', {}).get('model_idle_timeout', 600)
+        asset_cache.configure(self.settings.get('cache', {}))
+        configure_image_services(self.settings.get('image_services', {}))
+        http_pool.configure(self.settings.get('http', {}))
+        retry_policy.configure(self.settings.get('retry', {}))
+        ffmpeg_scheduler.configure(self.settings.get('ffmpeg_scheduler', {}))
         self.init_ui()
         self.settings_tab.load_settings_to_ui()
 
@@ -1393,9 +2862,27 @@ class MainWindow(QMainWindow):
         
         self.task_tab.global_switch_service_btn.setEnabled(True) # Вмикаємо кнопку тут
         
-        logging.info("Starting task queue...")
-        self.current_queue_task_row = 0
-        self.start_main_task(self.current_queue_task_row)
+        logging.info(f"Starting task queue ({self.settings.get('queue_concurrency', 1)} task(s) at once)...")
+        self.next_queue_task_row = 0
+        self.queue_active_task_ids = set()
+        self.queue_draining = False
+        self.fill_queue_slots()
+
+    def fill_queue_slots(self):
+        """Запускає наступні завдання черги, доки не зайнято всі одночасні слоти."""
+        max_parallel = max(1, self.settings.get('queue_concurrency', 1))
+        while (self.is_queue_running and not self.queue_draining and len(self.queue_active_task_ids) < max_parallel
+               and self.next_queue_task_row < self.task_tab.task_tree.topLevelItemCount()):
+            task_row = self.next_queue_task_row
+            self.next_queue_task_row += 1
+            logging.info(f"Queue mode: Starting task (row {task_row}).")
+            if self.start_main_task(task_row):
+                self.queue_active_task_ids.add(self.settings['tasks'][task_row]['id'])
+
+        if self.is_queue_running and not self.queue_active_task_ids:
+            if self.queue_draining: logging.info("Queue stopped after a failed task; running tasks have finished.")
+            else: logging.info("All tasks in the queue are completed.")
+            self.stop_queue()
 
     def stop_queue(self):
         if not self.is_queue_running:
@@ -1404,17 +2891,23 @@ class MainWindow(QMainWindow):
         self.is_queue_running = False
         self.task_tab.global_switch_service_btn.setEnabled(False) # Вимикаємо кнопку
         
-        # Зупиняємо завдання, тільки якщо його індекс є дійсним
-        if self.current_queue_task_row != -1 and self.current_queue_task_row < self.task_tab.task_tree.topLevelItemCount():
-            self.stop_main_task(self.current_queue_task_row)
+        # Зупиняємо всі завдання черги, що ще виконуються
+        for task_id in list(self.queue_active_task_ids):
+            task_row = self.get_task_row(task_id)
+            if task_row != -1:
+                self.stop_main_task(task_row)
 
         self.task_tab.start_queue_btn.setText("▶ Запустити всі завдання")
         self.task_tab.start_queue_btn.clicked.disconnect()
         self.task_tab.start_queue_btn.clicked.connect(self.start_queue)
-        # Скидаємо лічильник, коли черга зупинена
-        self.current_queue_task_row = -1
+        # Скидаємо стан, коли черга зупинена
+        self.next_queue_task_row = -1
+        self.queue_active_task_ids = set()
         logging.warning("Task queue stopped.")
 
+    def get_task_row(self, task_id):
+        return next((i for i, t in enumerate(self.settings['tasks']) if t['id'] == task_id), -1)
+
     def toggle_detailed_logging(self, state):
         is_detailed = bool(state)
         self.settings['detailed_logging'] = is_detailed
@@ -1465,9 +2958,21 @@ class MainWindow(QMainWindow):
                     "max_words_per_segment": 8,
                     "marginv": 40
                 },
-                "max_concurrent": 3
+                "single_pass_render": True,
+                "prenormalize_images": True,
+                "segmented_render": False,
+                "preview_draft": True
             },
             "tasks": [],
+            "queue_concurrency": 1,
+            "resource_limits": dict(ResourceLimiter.DEFAULT_LIMITS),
+            "transcription": {"model": "base", "device": "", "model_idle_timeout": 600, "mode": "align"},
+            "retry": {"max_attempts": 6, "base_delay": 2.0, "max_delay": 60.0, "breaker_threshold": 5, "breaker_reset": 60},
+            "http": {"pool_size": 16, "connect_timeout": 10, "read_timeout": 120},
+            "ffmpeg_scheduler": {"cores": 0, "memory_reserve_mb": 1024, "encoder_sessions": 3},
+            "image_services": {name: dict(cfg) for name, cfg in DEFAULT_IMAGE_SERVICES.items()},
+            "image_hedging": {"enabled": False, "percentile": 90, "default_delay": 60},
+            "cache": {"enabled": True, "dir": "cache", "max_size_mb": 2048, "llm": True, "image": True, "tts": True, "transcript": True},
             "default_image_service": "Recraft",
             "clear_queue_on_exit": True,
             "detailed_logging": False,
@@ -1475,6 +2980,13 @@ class MainWindow(QMainWindow):
         }
 
     def save_settings(self):
+        resource_limiter.configure(self.settings.get('resource_limits', {}))
+        whisper_models.idle_timeout = self.settings.get('transcription', {}).get('model_idle_timeout', 600)
+        asset_cache.configure(self.settings.get('cache', {}))
+        configure_image_services(self.settings.get('image_services', {}))
+        http_pool.configure(self.settings.get('http', {}))
+        retry_policy.configure(self.settings.get('retry', {}))
+        ffmpeg_scheduler.configure(self.settings.get('ffmpeg_scheduler', {}))
         with open(self.settings_file, 'w', encoding='utf-8') as f:
             json.dump(self.settings, f, indent=4, ensure_ascii=False)
         logging.info("Settings saved.")
@@ -1495,6 +3007,7 @@ class MainWindow(QMainWindow):
                 thread.wait(1000)
         self.threadpool.clear()
         self.threadpool.waitForDone()
+        shutdown_transcription_engine()
         super().closeEvent(event)
 
     def cleanup_task_thread(self, task_id):
@@ -1504,22 +3017,23 @@ class MainWindow(QMainWindow):
 
     @Slot(int)
     def start_main_task(self, task_row):
+        """Запускає завдання; повертає True, якщо воно дійсно стартувало."""
         if task_row >= self.task_tab.task_tree.topLevelItemCount():
             logging.warning(f"Attempted to start task at invalid row {task_row}. Stopping queue.")
             self.stop_queue()
-            return
+            return False
 
         task_info = self.settings['tasks'][task_row]
         task_id = task_info['id']
         if task_id in self.worker_threads and self.worker_threads[task_id][0].isRunning():
             logging.warning(f"Task #{task_id} is already running.")
-            return
+            return False
             
         lang_ids = task_info['languages']
         lang_configs = [self.settings['languages'][lid] for lid in lang_ids if lid in self.settings['languages']]
         if not lang_configs:
             logging.error(f"No valid languages for task '{task_info['work_dir']}'. Aborted.")
-            return
+            return False
             
         thread = QThread()
         worker = MainTaskWorker(task_id, task_row, task_info['work_dir'], lang_configs, self.settings)
@@ -1537,6 +3051,7 @@ class MainWindow(QMainWindow):
         self.worker_threads[task_id] = (thread, worker)
         thread.start()
         self.task_tab.set_task_running_state(task_row, True)
+        return True
 
     @Slot(int)
     def stop_main_task(self, task_row):
@@ -1552,41 +3067,41 @@ class MainWindow(QMainWindow):
     # --- НОВИЙ МЕТОД ---
     @Slot()
     def on_switch_image_service(self):
-        if not self.is_queue_running or self.current_queue_task_row == -1:
+        if not self.is_queue_running or not self.queue_active_task_ids:
             logging.warning("Cannot switch service: no task is currently running.")
             return
 
-        try:
-            active_task_id = self.settings['tasks'][self.current_queue_task_row]['id']
+        running_workers = []
+        for active_task_id in sorted(self.queue_active_task_ids):
             if active_task_id not in self.worker_threads:
                 logging.warning(f"Could not find worker for active task ID #{active_task_id}.")
-                return
-            
+                continue
             thread, worker = self.worker_threads[active_task_id]
             if not thread.isRunning():
                 logging.warning(f"Cannot switch service for task #{active_task_id} because it is not running.")
-                return
+                continue
+            running_workers.append(worker)
+        if not running_workers: return
 
-            # Визначаємо новий сервіс на основі поточного в активному воркері
-            old_service = worker.current_image_service
-            new_service = 'Pollinations' if old_service == 'Recraft' else 'Recraft'
-            
-            # 1. Перемикаємо сервіс для АКТИВНОГО завдання
-            worker.switch_service() 
-            
-            # 2. Перемикаємо сервіс для ВСІХ НАСТУПНИХ завдань у черзі
-            logging.info(f"Updating remaining tasks in the queue to use {new_service}...")
-            for i in range(self.current_queue_task_row + 1, len(self.settings['tasks'])):
-                task_id = self.settings['tasks'][i]['id']
-                self.settings['tasks'][i]['image_service'] = new_service
-                logging.info(f"Task #{task_id} will now use {new_service}.")
+        # Визначаємо новий сервіс на основі першого активного завдання
+        old_service = running_workers[0].current_image_service
+        new_service = 'Pollinations' if old_service == 'Recraft' else 'Recraft'
+
+        # 1. Перемикаємо сервіс для всіх АКТИВНИХ завдань, які ще на ньому не працюють
+        for worker in running_workers:
+            if worker.current_image_service != new_service:
+                worker.switch_service()
 
-        except IndexError:
-            logging.error(f"Error switching service: invalid task row {self.current_queue_task_row}.")
+        # 2. Перемикаємо сервіс для ВСІХ НАСТУПНИХ завдань у черзі
+        logging.info(f"Updating remaining tasks in the queue to use {new_service}...")
+        for i in range(self.next_queue_task_row, len(self.settings['tasks'])):
+            task_id = self.settings['tasks'][i]['id']
+            self.settings['tasks'][i]['image_service'] = new_service
+            logging.info(f"Task #{task_id} will now use {new_service}.")
 
     @Slot(bool, object)
     def on_task_finished(self, success, task_id):
-        task_row = next((i for i, t in enumerate(self.settings['tasks']) if t['id'] == task_id), -1)
+        task_row = self.get_task_row(task_id)
         if task_row != -1:
             logging.info(f"Task #{task_id} (row {task_row}) finished with success={success}!")
             self.task_tab.set_task_running_state(task_row, False)
@@ -1597,17 +3112,14 @@ class MainWindow(QMainWindow):
             for i in range(num_langs):
                 self.task_tab.update_task_status(task_row, i, final_status)
         
-        if self.is_queue_running and success:
-            self.current_queue_task_row += 1
-            if self.current_queue_task_row < self.task_tab.task_tree.topLevelItemCount():
-                logging.info(f"Queue mode: Starting next task (row {self.current_queue_task_row}).")
-                self.start_main_task(self.current_queue_task_row)
-            else:
-                logging.info("All tasks in the queue are completed.")
-                self.stop_queue()
-        elif self.is_queue_running and not success:
-             logging.error(f"Task #{task_id} failed. Stopping queue.")
-             self.stop_queue()
+        if not self.is_queue_running or task_id not in self.queue_active_task_ids:
+            return
+        self.queue_active_task_ids.discard(task_id)
+        if not success and not self.queue_draining:
+            # Інші завдання черги не пов'язані зі збоєм: даємо їм завершитись, але нові не запускаємо
+            logging.error(f"Task #{task_id} failed. No new queue tasks will be started; waiting for {len(self.queue_active_task_ids)} running task(s).")
+            self.queue_draining = True
+        self.fill_queue_slots()
 
 
 class TaskCreationTab(QWidget):
@@ -1928,6 +3440,7 @@ class SettingsTab(QWidget):
         self.main_window = main_window
         self.settings = main_window.settings
         self.loaded_styles = {} # Сховище для завантажених стилів
+        self.preview_worker = None # PreviewPipelineWorker, що зараз виконується
         # Словник для перетворення числових значень вирівнювання в текст
         self.alignment_map = { 
             '1': "Bottom Left", '2': "Bottom Center", '3': "Bottom Right",
@@ -1942,6 +3455,7 @@ class SettingsTab(QWidget):
         self.tabs.addTab(self.create_api_tab(), "API")
         self.tabs.addTab(self.create_lang_tab(), "Налаштування мов")
         self.tabs.addTab(self.create_ffmpeg_tab(), "Налаштування монтажу")
+        self.tabs.addTab(self.create_performance_tab(), "Продуктивність")
         save_btn = QPushButton("Зберегти всі налаштування")
         save_btn.clicked.connect(self.save_all_settings)
         layout.addWidget(save_btn, alignment=Qt.AlignRight)
@@ -2203,8 +3717,15 @@ class SettingsTab(QWidget):
         general_layout = QFormLayout(general_group)
         self.transition_duration = QDoubleSpinBox(); self.transition_duration.setRange(0.0, 5.0); self.transition_duration.setSingleStep(0.1)
         general_layout.addRow("Тривалість переходу (сек):", self.transition_duration)
-        self.max_concurrent_ffmpeg = QSpinBox(); self.max_concurrent_ffmpeg.setRange(1, 10)
-        general_layout.addRow("Макс. одночасних процесів монтажу:", self.max_concurrent_ffmpeg)
+        self.single_pass_checkbox = QCheckBox("Монтаж і субтитри за один прохід (без проміжного відео)")
+        self.single_pass_checkbox.setToolTip("Якщо вимкнено, використовується старий двоетапний режим: німе відео, потім впалювання субтитрів")
+        general_layout.addRow(self.single_pass_checkbox)
+        self.prenormalize_checkbox = QCheckBox("Попередньо масштабувати картинки до роздільності монтажу")
+        self.prenormalize_checkbox.setToolTip("Кожна картинка один раз перетворюється до 2160x3840 (або 1080x1920 без ефектів руху) і кешується, тож FFmpeg не масштабує її в кожному кадрі")
+        general_layout.addRow(self.prenormalize_checkbox)
+        self.segmented_render_checkbox = QCheckBox("Паралельний монтаж по сегментах")
+        self.segmented_render_checkbox.setToolTip("Кожен кліп рендериться окремим процесом на своєму ядрі, переходи - окремо, потім сегменти склеюються без перекодування")
+        general_layout.addRow(self.segmented_render_checkbox)
         self.clear_queue_checkbox = QCheckBox("Очищати чергу завдань при виході")
         general_layout.addRow(self.clear_queue_checkbox)
         
@@ -2213,15 +3734,142 @@ class SettingsTab(QWidget):
         general_layout.addRow(self.auto_fallback_checkbox)
         # --- КІНЕЦЬ НОВОГО ВІДЖЕТУ ---
 
+        self.preview_draft_checkbox = QCheckBox("Чорнове прев'ю (низька роздільність і частота кадрів, швидко)")
+        self.preview_draft_checkbox.setToolTip("Для швидкого підбору ефектів і стилю субтитрів: рендер у кадрі 360x640 при 15 кадр/с")
+        general_layout.addRow(self.preview_draft_checkbox)
         self.preview_btn = QPushButton("Створити попередній перегляд")
         self.preview_btn.setToolTip("Створює тестове відео з поточними налаштуваннями, використовуючи файли з папки /preview")
         self.preview_btn.clicked.connect(self.generate_preview)
-        general_layout.addRow(self.preview_btn)
+        self.preview_cancel_btn = QPushButton("Скасувати")
+        self.preview_cancel_btn.setEnabled(False)
+        self.preview_cancel_btn.clicked.connect(self.cancel_preview)
+        preview_layout = QHBoxLayout()
+        preview_layout.addWidget(self.preview_btn, 1)
+        preview_layout.addWidget(self.preview_cancel_btn)
+        general_layout.addRow(preview_layout)
         layout.addWidget(general_group)
         
         widget.setWidget(content_widget)
         return widget
 
+    def create_performance_tab(self):
+        widget = QScrollArea(); widget.setWidgetResizable(True)
+        content_widget = QWidget(); layout = QFormLayout(content_widget)
+
+        queue_group = QGroupBox("Черга завдань")
+        queue_layout = QFormLayout(queue_group)
+        self.queue_concurrency = QSpinBox(); self.queue_concurrency.setRange(1, 20)
+        self.queue_concurrency.setToolTip("Скільки завдань черги виконуються одночасно")
+        queue_layout.addRow("Одночасних завдань:", self.queue_concurrency)
+        layout.addWidget(queue_group)
+
+        limits_group = QGroupBox("Глобальні ліміти одночасних операцій (спільні для всіх завдань)")
+        limits_layout = QFormLayout(limits_group)
+        self.resource_limit_spins = {}
+        for name, label in [('llm', "Запити до LLM (OpenRouter):"), ('image', "Генерація зображень:"), ('tts', "Озвучка (TTS):"),
+                            ('transcription', "Транскрипція (Whisper):")]:
+            spin = QSpinBox(); spin.setRange(1, 64)
+            limits_layout.addRow(label, spin)
+            self.resource_limit_spins[name] = spin
+        self.resource_limit_spins['llm'].setToolTip("Скільки запитів на сценарії, промпти та назви виконуються одночасно")
+        self.resource_limit_spins['transcription'].setToolTip("Більше 1 - транскрипція в окремих процесах, кожен зі своєю моделлю в пам'яті")
+        layout.addWidget(limits_group)
+
+        image_services_group = QGroupBox("Ліміти сервісів зображень (на акаунт)")
+        image_services_layout = QFormLayout(image_services_group)
+        self.image_service_spins = {}
+        for name in DEFAULT_IMAGE_SERVICES:
+            concurrent_spin = QSpinBox(); concurrent_spin.setRange(1, 64)
+            rate_spin = QSpinBox(); rate_spin.setRange(1, 6000)
+            image_services_layout.addRow(f"{name} - одночасних запитів:", concurrent_spin)
+            image_services_layout.addRow(f"{name} - запитів за хвилину:", rate_spin)
+            self.image_service_spins[name] = {"max_concurrent": concurrent_spin, "requests_per_minute": rate_spin}
+        self.hedging_checkbox = QCheckBox("Дублювати повільні запити в інший сервіс (перемагає перша відповідь)")
+        image_services_layout.addRow(self.hedging_checkbox)
+        self.hedging_percentile = QSpinBox(); self.hedging_percentile.setRange(50, 99)
+        self.hedging_percentile.setToolTip("Дублюючий запит іде, якщо основний триває довше, ніж цей перцентиль його звичайної затримки")
+        image_services_layout.addRow("Перцентиль затримки для дублювання:", self.hedging_percentile)
+        self.hedging_default_delay = QSpinBox(); self.hedging_default_delay.setRange(1, 600)
+        self.hedging_default_delay.setToolTip("Поки замірів затримки ще замало")
+        image_services_layout.addRow("Затримка дублювання за замовчуванням (сек):", self.hedging_default_delay)
+        layout.addWidget(image_services_group)
+
+        http_group = QGroupBox("HTTP-з'єднання з API")
+        http_layout = QFormLayout(http_group)
+        self.http_pool_size = QSpinBox(); self.http_pool_size.setRange(1, 256)
+        self.http_pool_size.setToolTip("Скільки відкритих з'єднань тримати для кожного сервера API")
+        http_layout.addRow("З'єднань на хост:", self.http_pool_size)
+        self.http_connect_timeout = QSpinBox(); self.http_connect_timeout.setRange(1, 300)
+        http_layout.addRow("Тайм-аут підключення (сек):", self.http_connect_timeout)
+        self.http_read_timeout = QSpinBox(); self.http_read_timeout.setRange(5, 3600)
+        self.http_read_timeout.setToolTip("Для запитів, що не задають власний тайм-аут")
+        http_layout.addRow("Тайм-аут відповіді (сек):", self.http_read_timeout)
+        layout.addWidget(http_group)
+
+        scheduler_group = QGroupBox("Планувальник FFmpeg (спільний для всіх завдань і прев'ю)")
+        scheduler_layout = QFormLayout(scheduler_group)
+        self.scheduler_cores = QSpinBox(); self.scheduler_cores.setRange(0, 256)
+        self.scheduler_cores.setToolTip("Скільки ядер можуть одночасно займати процеси FFmpeg; 0 - всі ядра процесора")
+        scheduler_layout.addRow("Ядер для FFmpeg (0 = всі):", self.scheduler_cores)
+        self.scheduler_memory_reserve = QSpinBox(); self.scheduler_memory_reserve.setRange(0, 65536); self.scheduler_memory_reserve.setSingleStep(256)
+        self.scheduler_memory_reserve.setToolTip("Новий процес FFmpeg не запускається, якщо після нього вільної пам'яті лишиться менше")
+        scheduler_layout.addRow("Резерв пам'яті (МБ):", self.scheduler_memory_reserve)
+        self.scheduler_encoder_sessions = QSpinBox(); self.scheduler_encoder_sessions.setRange(1, 64)
+        self.scheduler_encoder_sessions.setToolTip("Ліміт одночасних сесій апаратного кодера (NVENC, QSV, AMF...)")
+        scheduler_layout.addRow("Сесій апаратного кодера:", self.scheduler_encoder_sessions)
+        layout.addWidget(scheduler_group)
+
+        retry_group = QGroupBox("Повторні запити до API")
+        retry_layout = QFormLayout(retry_group)
+        self.retry_max_attempts = QSpinBox(); self.retry_max_attempts.setRange(1, 100)
+        retry_layout.addRow("Максимум спроб:", self.retry_max_attempts)
+        self.retry_base_delay = QDoubleSpinBox(); self.retry_base_delay.setRange(0.1, 60.0); self.retry_base_delay.setSingleStep(0.5)
+        self.retry_base_delay.setToolTip("Затримка подвоюється з кожною спробою (з випадковим розкидом), якщо сервер не вказав Retry-After")
+        retry_layout.addRow("Початкова затримка (сек):", self.retry_base_delay)
+        self.retry_max_delay = QDoubleSpinBox(); self.retry_max_delay.setRange(1.0, 600.0)
+        retry_layout.addRow("Максимальна затримка (сек):", self.retry_max_delay)
+        self.breaker_threshold = QSpinBox(); self.breaker_threshold.setRange(1, 100)
+        self.breaker_threshold.setToolTip("Після стількох помилок поспіль запити до сервісу тимчасово не надсилаються")
+        retry_layout.addRow("Помилок до паузи сервісу:", self.breaker_threshold)
+        self.breaker_reset = QSpinBox(); self.breaker_reset.setRange(5, 3600)
+        retry_layout.addRow("Пауза сервісу (сек):", self.breaker_reset)
+        layout.addWidget(retry_group)
+
+        whisper_group = QGroupBox("Транскрипція (Whisper)")
+        whisper_layout = QFormLayout(whisper_group)
+        self.whisper_model_combo = QComboBox(); self.whisper_model_combo.addItems(["tiny", "base", "small", "medium", "large"])
+        whisper_layout.addRow("Модель:", self.whisper_model_combo)
+        self.whisper_device_combo = QComboBox()
+        self.whisper_device_combo.addItem("Авто", ""); self.whisper_device_combo.addItem("CPU", "cpu"); self.whisper_device_combo.addItem("CUDA (GPU)", "cuda")
+        whisper_layout.addRow("Пристрій:", self.whisper_device_combo)
+        self.whisper_mode_combo = QComboBox()
+        self.whisper_mode_combo.addItem("Вирівнювання тексту сценарію", "align"); self.whisper_mode_combo.addItem("Повне розпізнавання", "transcribe")
+        self.whisper_mode_combo.setToolTip("Вирівнювання лише розставляє мітки часу для відомого тексту scenario.txt: швидше і без помилок у словах")
+        whisper_layout.addRow("Режим субтитрів:", self.whisper_mode_combo)
+        self.whisper_idle_timeout = QSpinBox(); self.whisper_idle_timeout.setRange(30, 86400); self.whisper_idle_timeout.setSingleStep(60)
+        self.whisper_idle_timeout.setToolTip("Модель лишається завантаженою в пам'яті між транскрипціями і вивантажується після цього часу простою")
+        whisper_layout.addRow("Вивантажувати модель після простою (сек):", self.whisper_idle_timeout)
+        layout.addWidget(whisper_group)
+
+        cache_group = QGroupBox("Кеш результатів API")
+        cache_layout = QFormLayout(cache_group)
+        self.cache_enabled_checkbox = QCheckBox("Повторно використовувати результати з однаковими вхідними даними")
+        cache_layout.addRow(self.cache_enabled_checkbox)
+        self.cache_kind_checkboxes = {}
+        for kind, label in [('llm', "Тексти LLM (сценарії, промпти, назви)"), ('image', "Зображення"), ('tts', "Озвучка"),
+                            ('transcript', "Транскрипції Whisper (мітки часу слів)")]:
+            checkbox = QCheckBox(label)
+            cache_layout.addRow(checkbox)
+            self.cache_kind_checkboxes[kind] = checkbox
+        self.cache_max_size = QSpinBox(); self.cache_max_size.setRange(100, 1024 * 1024); self.cache_max_size.setSingleStep(512)
+        cache_layout.addRow("Максимальний розмір (МБ):", self.cache_max_size)
+        self.cache_dir_edit = QLineEdit()
+        cache_layout.addRow("Папка кешу:", self.cache_dir_edit)
+        layout.addWidget(cache_group)
+
+        widget.setWidget(content_widget)
+        return widget
+
     def load_styles_from_ass_file(self):
         file_path, _ = QFileDialog.getOpenFileName(self, "Вибрати .ass файл зі стилями", "", "ASS Subtitles (*.ass)")
         if not file_path:
@@ -2328,11 +3976,52 @@ class SettingsTab(QWidget):
         self.sub_animation.setCurrentText(sub_cfg.get('animation', 'Fade'))
 
         self.transition_duration.setValue(ffmpeg.get('transition_duration', 1.0))
-        self.max_concurrent_ffmpeg.setValue(ffmpeg.get('max_concurrent', 3))
+        self.single_pass_checkbox.setChecked(ffmpeg.get('single_pass_render', True))
+        self.prenormalize_checkbox.setChecked(ffmpeg.get('prenormalize_images', True))
+        self.segmented_render_checkbox.setChecked(ffmpeg.get('segmented_render', False))
+        self.preview_draft_checkbox.setChecked(ffmpeg.get('preview_draft', True))
         self.main_window.task_tab.image_service_combo.setCurrentText(self.settings.get('default_image_service', 'Recraft'))
         self.clear_queue_checkbox.setChecked(self.settings.get('clear_queue_on_exit', True))
         self.auto_fallback_checkbox.setChecked(self.settings.get('auto_fallback_image_service', True))
 
+        self.queue_concurrency.setValue(self.settings.get('queue_concurrency', 1))
+        limits = self.settings.get('resource_limits', {})
+        for name, spin in self.resource_limit_spins.items():
+            spin.setValue(limits.get(name, ResourceLimiter.DEFAULT_LIMITS[name]))
+        services_cfg = self.settings.get('image_services', {})
+        for name, spins in self.image_service_spins.items():
+            for key, spin in spins.items(): spin.setValue(services_cfg.get(name, {}).get(key, DEFAULT_IMAGE_SERVICES[name][key]))
+        http_cfg = self.settings.get('http', {})
+        self.http_pool_size.setValue(http_cfg.get('pool_size', 16))
+        self.http_connect_timeout.setValue(http_cfg.get('connect_timeout', 10))
+        self.http_read_timeout.setValue(http_cfg.get('read_timeout', 120))
+        scheduler_cfg = self.settings.get('ffmpeg_scheduler', {})
+        self.scheduler_cores.setValue(scheduler_cfg.get('cores', 0))
+        self.scheduler_memory_reserve.setValue(scheduler_cfg.get('memory_reserve_mb', 1024))
+        self.scheduler_encoder_sessions.setValue(scheduler_cfg.get('encoder_sessions', 3))
+        hedging_cfg = self.settings.get('image_hedging', {})
+        self.hedging_checkbox.setChecked(hedging_cfg.get('enabled', False))
+        self.hedging_percentile.setValue(hedging_cfg.get('percentile', 90))
+        self.hedging_default_delay.setValue(hedging_cfg.get('default_delay', 60))
+        retry_cfg = self.settings.get('retry', {})
+        self.retry_max_attempts.setValue(retry_cfg.get('max_attempts', 6))
+        self.retry_base_delay.setValue(retry_cfg.get('base_delay', 2.0))
+        self.retry_max_delay.setValue(retry_cfg.get('max_delay', 60.0))
+        self.breaker_threshold.setValue(retry_cfg.get('breaker_threshold', 5))
+        self.breaker_reset.setValue(retry_cfg.get('breaker_reset', 60))
+        whisper_cfg = self.settings.get('transcription', {})
+        self.whisper_model_combo.setCurrentText(whisper_cfg.get('model', 'base'))
+        device_index = self.whisper_device_combo.findData(whisper_cfg.get('device', ''))
+        if device_index != -1: self.whisper_device_combo.setCurrentIndex(device_index)
+        mode_index = self.whisper_mode_combo.findData(whisper_cfg.get('mode', 'align'))
+        if mode_index != -1: self.whisper_mode_combo.setCurrentIndex(mode_index)
+        self.whisper_idle_timeout.setValue(whisper_cfg.get('model_idle_timeout', 600))
+        cache_cfg = self.settings.get('cache', {})
+        self.cache_enabled_checkbox.setChecked(cache_cfg.get('enabled', True))
+        for kind, checkbox in self.cache_kind_checkboxes.items(): checkbox.setChecked(cache_cfg.get(kind, True))
+        self.cache_max_size.setValue(cache_cfg.get('max_size_mb', 2048))
+        self.cache_dir_edit.setText(cache_cfg.get('dir', 'cache'))
+
     def save_all_settings(self):
         self.settings['api']['openrouter']['api_key'] = self.or_api_key.text()
         self.settings['api']['recraft'] = {'api_key': self.recraft_api_key.text(), 'model': self.recraft_model_combo.currentText(),'style': self.recraft_style_combo.currentText(), 'size': self.recraft_size_combo.currentText(),'negative_prompt': self.recraft_negative_prompt.text()}
@@ -2356,31 +4045,36 @@ class SettingsTab(QWidget):
         self.settings['ffmpeg']['pan_amount'] = self.pan_amount.value()
         
         # Оновлений блок збереження налаштувань субтитрів
-        self.settings['ffmpeg']['subtitle'] = {
-            "fontname": self.sub_fontname_combo.currentText(),
-            "fontsize": self.sub_fontsize.value(),
-            "primary_color": self.sub_primary_color.text(),
-            "secondary_color": self.sub_secondary_color.text(),
-            "outline_color": self.sub_outline_color.text(),
-            "shadow_color": self.sub_shadow_color.text(),
-            "bold": self.sub_bold.isChecked(),
-            "italic": self.sub_italic.isChecked(),
-            "outline": self.sub_outline.value(),
-            "shadow": self.sub_shadow.value(),
-            "alignment": self.sub_alignment.currentData(),
-            "marginl": self.sub_marginl.value(),
-            "marginr": self.sub_marginr.value(),
-            "marginv": self.sub_marginv.value(),
-            "max_words_per_segment": self.sub_max_words.value(),
-            "animation": self.sub_animation.currentText()
-        }
+        self.settings['ffmpeg']['subtitle'] = self.subtitle_settings_from_ui()
         
         self.settings['ffmpeg']['transition_duration'] = self.transition_duration.value()
-        self.settings['ffmpeg']['max_concurrent'] = self.max_concurrent_ffmpeg.value()
+        self.settings['ffmpeg']['single_pass_render'] = self.single_pass_checkbox.isChecked()
+        self.settings['ffmpeg']['prenormalize_images'] = self.prenormalize_checkbox.isChecked()
+        self.settings['ffmpeg']['segmented_render'] = self.segmented_render_checkbox.isChecked()
+        self.settings['ffmpeg']['preview_draft'] = self.preview_draft_checkbox.isChecked()
         self.settings['default_image_service'] = self.main_window.task_tab.image_service_combo.currentText()
         self.settings['clear_queue_on_exit'] = self.clear_queue_checkbox.isChecked()
         self.settings['detailed_logging'] = self.main_window.log_tab.detailed_log_checkbox.isChecked()
         self.settings['auto_fallback_image_service'] = self.auto_fallback_checkbox.isChecked()
+        self.settings['queue_concurrency'] = self.queue_concurrency.value()
+        self.settings['resource_limits'] = {name: spin.value() for name, spin in self.resource_limit_spins.items()}
+        self.settings['image_hedging'] = {"enabled": self.hedging_checkbox.isChecked(), "percentile": self.hedging_percentile.value(), "default_delay": self.hedging_default_delay.value()}
+        self.settings['retry'] = {
+            "max_attempts": self.retry_max_attempts.value(), "base_delay": self.retry_base_delay.value(), "max_delay": self.retry_max_delay.value(),
+            "breaker_threshold": self.breaker_threshold.value(), "breaker_reset": self.breaker_reset.value()
+        }
+        self.settings['http'] = {"pool_size": self.http_pool_size.value(), "connect_timeout": self.http_connect_timeout.value(), "read_timeout": self.http_read_timeout.value()}
+        self.settings['ffmpeg_scheduler'] = {"cores": self.scheduler_cores.value(), "memory_reserve_mb": self.scheduler_memory_reserve.value(), "encoder_sessions": self.scheduler_encoder_sessions.value()}
+        self.settings['image_services'] = {name: {key: spin.value() for key, spin in spins.items()} for name, spins in self.image_service_spins.items()}
+        if 'transcription' not in self.settings: self.settings['transcription'] = {}
+        self.settings['transcription']['model'] = self.whisper_model_combo.currentText()
+        self.settings['transcription']['device'] = self.whisper_device_combo.currentData()
+        self.settings['transcription']['mode'] = self.whisper_mode_combo.currentData()
+        self.settings['transcription']['model_idle_timeout'] = self.whisper_idle_timeout.value()
+        self.settings['cache'] = {
+            "enabled": self.cache_enabled_checkbox.isChecked(), "dir": self.cache_dir_edit.text() or "cache",
+            "max_size_mb": self.cache_max_size.value(), **{kind: cb.isChecked() for kind, cb in self.cache_kind_checkboxes.items()}
+        }
 
         self.settings_saved.emit()
         QMessageBox.information(self, "Успіх", "Налаштування збережено.")
@@ -2490,153 +4184,69 @@ class SettingsTab(QWidget):
         self.vm_voice_combo.clear()
         if voice_code in VOICEMAKER_VOICES:
             for voice in VOICEMAKER_VOICES[voice_code]: self.vm_voice_combo.addItem(voice['VoiceId'], voice['VoiceId'])
-    def generate_preview(self):
-        self.preview_btn.setEnabled(False); self.preview_btn.setText("Підготовка..."); QApplication.processEvents()
-        preview_dir, audio_path, img_dir, ass_path, temp_video_path, output_path = "preview", "preview/audio.mp3", "preview/images", "preview/subtitles.ass", "preview/preview_temp.mp4", "preview/preview_video.mp4"
-        
-        def restore_button():
-            self.preview_btn.setText("Створити попередній перегляд"); self.preview_btn.setEnabled(True)
-            if os.path.exists(temp_video_path):
-                try: os.remove(temp_video_path)
-                except OSError: pass
+    def preview_effects(self):
+        """Ефекти монтажу з поточних значень віджетів (у форматі settings['ffmpeg'])."""
+        return {'zoom_effect': self.zoom_effect.isChecked(), 'pan_effect': self.pan_effect.isChecked(), 'pan_direction': self.pan_direction.currentText(),
+                'pan_amount': self.pan_amount.value(), 'zoom_start': self.zoom_start.value(), 'zoom_end': self.zoom_end.value()}
+
+    def preview_codec_args(self):
+        selected_codec_key = self.codec_combo.currentText(); codec_widgets = self.codec_widgets.get(selected_codec_key, {})
+        if 'bitrate' in codec_widgets: return ['-c:v', selected_codec_key.split(' ')[1].strip('()'), '-b:v', codec_widgets['bitrate'].text()]
+        if 'preset' in codec_widgets: return ['-c:v', selected_codec_key.split(' ')[1].strip('()'), '-preset', codec_widgets['preset'].currentText(), '-crf', str(codec_widgets['crf'].value())]
+        return []
+
+    def subtitle_settings_from_ui(self):
+        """Налаштування субтитрів з поточних значень віджетів (формат settings['ffmpeg']['subtitle'])."""
+        return {
+            "fontname": self.sub_fontname_combo.currentText(),
+            "fontsize": self.sub_fontsize.value(),
+            "primary_color": self.sub_primary_color.text(),
+            "secondary_color": self.sub_secondary_color.text(),
+            "outline_color": self.sub_outline_color.text(),
+            "shadow_color": self.sub_shadow_color.text(),
+            "bold": self.sub_bold.isChecked(),
+            "italic": self.sub_italic.isChecked(),
+            "outline": self.sub_outline.value(),
+            "shadow": self.sub_shadow.value(),
+            "alignment": self.sub_alignment.currentData(),
+            "marginl": self.sub_marginl.value(),
+            "marginr": self.sub_marginr.value(),
+            "marginv": self.sub_marginv.value(),
+            "max_words_per_segment": self.sub_max_words.value(),
+            "animation": self.sub_animation.currentText()
+        }
 
-        if not all(os.path.exists(p) for p in [audio_path, img_dir]):
-            QMessageBox.warning(self, "Помилка", f"Не знайдено файли для попереднього перегляду."); restore_button(); return
-        
-        images = sorted([os.path.join(img_dir, f) for f in os.listdir(img_dir) if f.lower().endswith(('.png', '.jpg', '.jpeg'))])
-        if not images: QMessageBox.warning(self, "Помилка", f"В папці '{img_dir}' не знайдено зображень."); restore_button(); return
-        
-        try:
-            self.preview_btn.setText("Етап 1: Створення відео..."); QApplication.processEvents()
-            ffprobe_cmd = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', audio_path]
-            total_duration = float(subprocess.check_output(ffprobe_cmd).decode('utf-8').strip())
-            transition_duration = self.transition_duration.value(); num_transitions = max(0, len(images) - 1)
-            img_duration = (total_duration - num_transitions * transition_duration) / len(images) if len(images) > 0 else 0
-            if img_duration <= 0: img_duration = total_duration / len(images) if len(images) > 0 else 0; transition_duration = 0
-            
-            cmd1, filter_complex = ['ffmpeg', '-y'], []
-            for i, img_path in enumerate(images): cmd1.extend(['-loop', '1', '-t', str(img_duration + transition_duration if i < len(images) - 1 else img_duration), '-i', img_path])
-            cmd1.extend(['-i', audio_path])
-            
-            import random
-            for i in range(len(images)):
-                stream = f"[{i}:v]scale=2160:3840,setsar=1,format=yuv420p"
-                use_zoom, use_pan = self.zoom_effect.isChecked(), self.pan_effect.isChecked()
-                if (use_zoom or use_pan) and img_duration > 0:
-                    fr, total_frames = 30, int(img_duration * 30)
-                    px, py = "0", "0"
-                    if use_pan:
-                        m_type, amp = self.pan_direction.currentText(), self.pan_amount.value() * 100
-                        if m_type == "random": m_type = random.choice(["horizontal", "vertical", "infinity"])
-                        m_period = 20.0 * fr
-                        if m_type == "horizontal": px = f"sin(2*PI*on/{m_period})*{amp}"
-                        elif m_type == "vertical": py = f"sin(2*PI*on/{m_period})*{amp}"
-                        elif m_type == "infinity": px, py = f"sin(2*PI*on/{m_period})*{amp}", f"sin(4*PI*on/{m_period})*{amp/2}"
-                    z_expr = "1.1"
-                    if use_zoom:
-                        z_start, z_end = self.zoom_start.value(), self.zoom_end.value()
-                        if z_end < z_start: z_end = z_start
-                        base_z, amp_z = (z_start + z_end) / 2.0, (z_end - z_start) / 2.0
-                        z_expr = f"{base_z}+{amp_z}*cos(2*PI*on/{(10.0*fr)})"
-                    x_final, y_final = f"(iw-iw/({z_expr}))/2+{px}", f"(ih-ih/({z_expr}))/2+{py}"
-                    stream += f",zoompan=z='{z_expr}':d={total_frames}:s=1080x1920:x='{x_final}':y='{y_final}':fps={fr}"
-                else: stream += ",scale=1080:1920:force_original_aspect_ratio=decrease,pad=1080:1920:(ow-iw)/2:(oh-ih)/2"
-                filter_complex.append(stream + f"[v{i}]")
-
-            last_stream = "[v0]"
-            if len(images) > 1:
-                for i in range(len(images) - 1):
-                    offset = (i + 1) * img_duration + i * transition_duration
-                    filter_complex.append(f"{last_stream}[v{i+1}]xfade=transition=fade:duration={transition_duration}:offset={offset}[vt{i}]")
-                    last_stream = f"[vt{i}]"
-            
-            filter_complex.append(f"{last_stream}format=yuv420p[outv]")
-            cmd1.extend(['-filter_complex', ";".join(filter_complex), '-map', '[outv]', '-map', f'{len(images)}:a'])
-            selected_codec_key = self.codec_combo.currentText(); codec_widgets = self.codec_widgets.get(selected_codec_key, {})
-            if 'bitrate' in codec_widgets: cmd1.extend(['-c:v', selected_codec_key.split(' ')[1].strip('()'), '-b:v', codec_widgets['bitrate'].text()])
-            elif 'preset' in codec_widgets: cmd1.extend(['-c:v', selected_codec_key.split(' ')[1].strip('()'), '-preset', codec_widgets['preset'].currentText(), '-crf', str(codec_widgets['crf'].value())])
-            cmd1.extend(['-c:a', 'aac', '-b:a', '192k', '-shortest', temp_video_path])
-            
-            process1 = subprocess.run(cmd1, capture_output=True, text=True, encoding='utf-8')
-            if process1.returncode != 0: raise RuntimeError(f"FFmpeg Stage 1 failed:\n{process1.stderr}")
+    def generate_preview(self):
+        """Запускає PreviewPipelineWorker зі знімком поточних значень віджетів; вікно лишається активним."""
+        if self.preview_worker is not None: return
+        is_draft = self.preview_draft_checkbox.isChecked()
+        codec_args = PreviewPipelineWorker.DRAFT_CODEC if is_draft else self.preview_codec_args()
+        worker = PreviewPipelineWorker(self.settings, self.preview_effects(), codec_args, self.subtitle_settings_from_ui(), self.transition_duration.value(), is_draft)
+        worker.signals.status_update.connect(self.on_preview_status)
+        worker.signals.finished.connect(self.on_preview_finished)
+        self.preview_worker = worker
+        self.preview_btn.setEnabled(False); self.preview_btn.setText("Підготовка...")
+        self.preview_cancel_btn.setEnabled(True)
+        self.main_window.threadpool.start(worker)
 
-            self.preview_btn.setText("Етап 2: Транскрипція..."); QApplication.processEvents()
-            model = whisper.load_model("base")
-            result = model.transcribe(temp_video_path, verbose=False, word_timestamps=True)
-            
-            subs = pysubs2.SSAFile()
-            style = subs.styles["Default"].copy()
-            
-            # Використовуємо значення прямо з віджетів UI
-            style.fontname = self.sub_fontname_combo.currentText()
-            style.fontsize = float(self.sub_fontsize.value())
+    def cancel_preview(self):
+        if self.preview_worker is None: return
+        self.preview_worker.kill()
+        self.preview_cancel_btn.setEnabled(False); self.preview_btn.setText("Скасування...")
 
-            def _ass_to_pysubs2_color(ass_color):
-                try:
-                    if not ass_color.startswith('&H'): return pysubs2.Color(255, 255, 255)
-                    hex_color = ass_color.lstrip('&H').rstrip('&')
-                    if len(hex_color) == 8: aa, bb, gg, rr = int(hex_color[0:2], 16), int(hex_color[2:4], 16), int(hex_color[4:6], 16), int(hex_color[6:8], 16); return pysubs2.Color(r=rr, g=gg, b=bb, a=aa)
-                    else: bb, gg, rr = int(hex_color[0:2], 16), int(hex_color[2:4], 16), int(hex_color[4:6], 16); return pysubs2.Color(r=rr, g=gg, b=bb)
-                except Exception: return pysubs2.Color(255, 255, 255)
-            
-            style.primarycolor = _ass_to_pysubs2_color(self.sub_primary_color.text())
-            style.secondarycolor = _ass_to_pysubs2_color(self.sub_secondary_color.text())
-            style.outlinecolor = _ass_to_pysubs2_color(self.sub_outline_color.text())
-            style.backcolor = _ass_to_pysubs2_color(self.sub_shadow_color.text())
-            style.bold = self.sub_bold.isChecked()
-            style.italic = self.sub_italic.isChecked()
-            style.outline = self.sub_outline.value()
-            style.shadow = self.sub_shadow.value()
-
-            alignment_map_pysubs2 = {'1': 1, '2': 2, '3': 3, '4': 5, '5': 6, '6': 7, '7': 9, '8': 10, '9': 11}
-            style.alignment = alignment_map_pysubs2.get(self.sub_alignment.currentData(), 2)
-
-            style.marginl = self.sub_marginl.value()
-            style.marginr = self.sub_marginr.value()
-            style.marginv = self.sub_marginv.value()
-            subs.styles["Default"] = style
-
-            all_words = [word for s in result['segments'] if 'words' in s for word in s['words']]
-            animation, max_words = self.sub_animation.currentText(), self.sub_max_words.value()
-            anim_tag = ""
-            if animation == "Fade": anim_tag = "{\\fad(250,250)}"
-            elif animation == "Karaoke": anim_tag = "{\\fad(150,150)}"
-            
-            current_pos = 0
-            while current_pos < len(all_words):
-                segment_words = all_words[current_pos : current_pos + max_words]
-                if not segment_words: break
-                start_time, end_time = segment_words[0]['start'] * 1000, segment_words[-1]['end'] * 1000
-                text = " ".join(word['word'] for word in segment_words).strip()
-                event = pysubs2.SSAEvent(start=start_time, end=end_time, text=f"{anim_tag}{text}")
-                subs.events.append(event)
-                current_pos += max_words
-            subs.save(ass_path)
-            
-            self.preview_btn.setText("Етап 3: Фіналізація..."); QApplication.processEvents()
-            safe_ass_path = os.path.abspath(ass_path).replace('\\', '/').replace(':', '\\:')
-            font_dir = 'C:/Windows/Fonts'.replace(':', '\\:')
-            vf_string = f"ass=filename='{safe_ass_path}':fontsdir='{font_dir}'"
-            cmd2 = ['ffmpeg', '-y', '-i', temp_video_path, '-vf', vf_string]
-            if 'bitrate' in codec_widgets: cmd2.extend(['-c:v', selected_codec_key.split(' ')[1].strip('()'), '-b:v', codec_widgets['bitrate'].text()])
-            elif 'preset' in codec_widgets: cmd2.extend(['-c:v', selected_codec_key.split(' ')[1].strip('()'), '-preset', codec_widgets['preset'].currentText(), '-crf', str(codec_widgets['crf'].value())])
-            cmd2.extend(['-c:a', 'copy', output_path])
-            
-            QApplication.setOverrideCursor(Qt.WaitCursor)
-            worker = PreviewWorker(cmd2, output_path)
-            worker.signals.finished.connect(self.on_preview_finished)
-            worker.signals.finished.connect(lambda success, path: os.path.exists(temp_video_path) and os.remove(temp_video_path))
-            self.main_window.threadpool.start(worker)
+    @Slot(int, int, str)
+    def on_preview_status(self, task_row, lang_idx, text):
+        if self.preview_worker is not None: self.preview_btn.setText(text)
 
-        except Exception as e:
-            QMessageBox.critical(self, "Помилка створення прев'ю", f"Не вдалося згенерувати відео.\nДеталі: {e}"); logging.error(f"Preview generation failed: {e}", exc_info=True); restore_button()
-    @Slot(bool, str)
-    def on_preview_finished(self, success, output_path):
-        QApplication.restoreOverrideCursor(); self.preview_btn.setText("Створити попередній перегляд"); self.preview_btn.setEnabled(True)
+    @Slot(bool, object)
+    def on_preview_finished(self, success, result):
+        self.preview_worker = None
+        self.preview_btn.setText("Створити попередній перегляд"); self.preview_btn.setEnabled(True)
+        self.preview_cancel_btn.setEnabled(False)
         if success:
-            QMessageBox.information(self, "Успіх", f"Відео для попереднього перегляду успішно створено. Файл: {output_path}")
-            QDesktopServices.openUrl(QUrl.fromLocalFile(os.path.abspath(output_path)))
-        else: QMessageBox.critical(self, "Помилка", "Не вдалося створити відео. Перевірте лог.")
+            QMessageBox.information(self, "Успіх", f"Відео для попереднього перегляду успішно створено. Файл: {result}")
+            QDesktopServices.openUrl(QUrl.fromLocalFile(os.path.abspath(result)))
+        elif result: QMessageBox.critical(self, "Помилка створення прев'ю", f"Не вдалося згенерувати відео.\nДеталі: {result}")
 class LogTab(QWidget):
     def __init__(self):
         super().__init__()
@@ -0,0 +1,136 @@
+import json
+import sys
+import threading
+import time
+
+import pysubs2
+
+# #############################################################################
+# # СТИЛЬ СУБТИТРІВ
+# #############################################################################
+
+# Вирівнювання з налаштувань (цифрова клавіатура) у нумерацію, яку очікує pysubs2
+ALIGNMENT_MAP = {
+    '1': 1, '2': 2, '3': 3,       # Bottom
+    '4': 5, '5': 6, '6': 7,       # Middle (pysubs2 uses different numbers)
+    '7': 9, '8': 10, '9': 11      # Top
+}
+# Теги анімації, що додаються на початок кожної репліки
+ANIMATION_TAGS = {"Fade": "{\\fad(250,250)}", "Karaoke": "{\\fad(150,150)}"}
+
+# Стиль subtitles_overlay_app у форматі settings['ffmpeg']['subtitle']
+OVERLAY_SUBTITLE_SETTINGS = {
+    "fontname": "Arial", "fontsize": 24, "primary_color": "&H00FFFFFF", "secondary_color": "&H000000FF",
+    "outline_color": "&H00000000", "shadow_color": "&H80000000", "bold": True, "italic": False,
+    "outline": 1.5, "shadow": 0.5, "alignment": "2", "marginl": 10, "marginr": 10, "marginv": 15,
+    "max_words_per_segment": 7, "animation": "None"
+}
+
+def parse_ass_color(ass_color):
+    """Колір ASS (&HAABBGGRR або &HBBGGRR) у pysubs2.Color; некоректне значення дає білий."""
+    try:
+        if not ass_color.startswith('&H'): return pysubs2.Color(255, 255, 255)
+        hex_color = ass_color[2:].rstrip('&')
+        if len(hex_color) == 8:
+            aa, bb, gg, rr = int(hex_color[0:2], 16), int(hex_color[2:4], 16), int(hex_color[4:6], 16), int(hex_color[6:8], 16)
+            return pysubs2.Color(r=rr, g=gg, b=bb, a=aa)
+        bb, gg, rr = int(hex_color[0:2], 16), int(hex_color[2:4], 16), int(hex_color[4:6], 16)
+        return pysubs2.Color(r=rr, g=gg, b=bb)
+    except Exception:
+        return pysubs2.Color(255, 255, 255)
+
+class CompiledSubtitleStyle:
+    """
+    Налаштування субтитрів, розібрані один раз: готовий pysubs2.SSAStyle, кількість слів
+    у репліці і тег анімації. Один екземпляр обслуговує будь-яку кількість файлів.
+    """
+    def __init__(self, sub_settings):
+        style = pysubs2.SSAStyle()
+        style.fontname = sub_settings.get('fontname', 'Arial')
+        style.fontsize = float(sub_settings.get('fontsize', 60))
+        style.primarycolor = parse_ass_color(sub_settings.get('primary_color', '&H00FFFFFF'))
+        style.secondarycolor = parse_ass_color(sub_settings.get('secondary_color', '&H000000FF'))
+        style.outlinecolor = parse_ass_color(sub_settings.get('outline_color', '&H00000000'))
+        style.backcolor = parse_ass_color(sub_settings.get('shadow_color', '&H96000000'))
+        style.bold = sub_settings.get('bold', True)
+        style.italic = sub_settings.get('italic', False)
+        style.outline = float(sub_settings.get('outline', 3.0))
+        style.shadow = float(sub_settings.get('shadow', 3.0))
+        style.alignment = ALIGNMENT_MAP.get(sub_settings.get('alignment', '2'), 2)
+        style.marginl = int(sub_settings.get('marginl', 20))
+        style.marginr = int(sub_settings.get('marginr', 20))
+        style.marginv = int(sub_settings.get('marginv', 60))
+        self.style = style
+        self.max_words = max(1, int(sub_settings.get('max_words_per_segment', 8)))
+        self.anim_tag = ANIMATION_TAGS.get(sub_settings.get('animation', 'None'), "")
+
+    def events(self, words):
+        """Групує слова (word/start/end, як у transcription.extract_words) в репліки за один прохід."""
+        anim_tag, max_words = self.anim_tag, self.max_words
+        return [
+            pysubs2.SSAEvent(start=words[i]['start'] * 1000, end=words[min(i + max_words, len(words)) - 1]['end'] * 1000,
+                             text=anim_tag + " ".join(w['word'] for w in words[i:i + max_words]).strip())
+            for i in range(0, len(words), max_words)
+        ]
+
+    def build(self, words):
+        """Повертає pysubs2.SSAFile з цим стилем як Default і репліками зі слів."""
+        subs = pysubs2.SSAFile()
+        subs.styles["Default"] = self.style.copy()
+        subs.events = self.events(words)
+        return subs
+
+    def save(self, words, ass_path):
+        self.build(words).save(ass_path)
+
+_compiled_lock = threading.Lock()
+_compiled_styles = {}
+
+def compile_style(sub_settings):
+    """
+    Повертає CompiledSubtitleStyle для налаштувань (формат settings['ffmpeg']['subtitle']).
+    Результат кешується за вмістом налаштувань, тож усі сценарії завдання ділять один стиль.
+    """
+    key = json.dumps(sub_settings, sort_keys=True, ensure_ascii=False)
+    with _compiled_lock:
+        compiled = _compiled_styles.get(key)
+        if compiled is None:
+            if len(_compiled_styles) >= 32: _compiled_styles.clear()
+            compiled = _compiled_styles[key] = CompiledSubtitleStyle(sub_settings)
+        return compiled
+
+# #############################################################################
+# # БЕНЧМАРК
+# #############################################################################
+
+def synthetic_words(count, word_duration=0.3, gap=0.05):
+    """Штучний потік слів з мітками часу для вимірювання швидкості побудови субтитрів."""
+    vocabulary = ["субтитри", "швидко", "short", "відео", "кадр", "голос", "історія", "слово"]
+    step = word_duration + gap
+    return [{'word': f" {vocabulary[i % len(vocabulary)]}", 'start': i * step, 'end': i * step + word_duration, 'probability': 1.0}
+            for i in range(count)]
+
+def benchmark(word_counts=(1000, 10000, 100000), repeats=5):
+    """Час компіляції стилю, побудови реплік і серіалізації в ASS для кожного розміру потоку слів."""
+    sub_settings = dict(OVERLAY_SUBTITLE_SETTINGS, animation="Fade")
+    start = time.perf_counter()
+    for _ in range(repeats): CompiledSubtitleStyle(sub_settings)
+    print(f"compile: {(time.perf_counter() - start) / repeats * 1000:.3f} ms")
+
+    compiled = compile_style(sub_settings)
+    for count in word_counts:
+        words = synthetic_words(count)
+        build_time = serialize_time = 0.0
+        for _ in range(repeats):
+            start = time.perf_counter()
+            subs = compiled.build(words)
+            build_time += time.perf_counter() - start
+            start = time.perf_counter()
+            subs.to_string("ass")
+            serialize_time += time.perf_counter() - start
+        build_time, serialize_time = build_time / repeats, serialize_time / repeats
+        print(f"{count:>7} words: build {build_time * 1000:8.2f} ms ({count / build_time:,.0f} words/s), "
+              f"to_string {serialize_time * 1000:8.2f} ms, {len(subs.events)} events")
+
+if __name__ == "__main__":
+    benchmark(tuple(int(arg) for arg in sys.argv[1:]) or (1000, 10000, 100000))
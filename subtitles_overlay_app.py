@@ -1,10 +1,10 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
-import whisper
-import pysubs2
 import os
 import subprocess # Додаємо бібліотеку для запуску зовнішніх команд (FFmpeg)
 import sys
+from subtitle_builder import OVERLAY_SUBTITLE_SETTINGS, compile_style
+from transcription import whisper_models, extract_words
 
 # --- Основна логіка ---
 def create_ass_subtitles(video_path, max_words_per_segment, model_name="base"):
@@ -15,48 +15,19 @@ def create_ass_subtitles(video_path, max_words_per_segment, model_name="base"):
     try:
         status_label.config(text="Статус: Завантаження моделі Whisper...")
         root.update_idletasks()
-        model = whisper.load_model(model_name) 
-
-        status_label.config(text="Статус: Транскрипція аудіо (це може зайняти багато часу)...")
-        root.update_idletasks()
-        
-        result = model.transcribe(video_path, word_timestamps=True)
+        # Модель береться зі спільного кешу і не завантажується заново для кожного файлу
+        with whisper_models.use(model_name) as model:
+            status_label.config(text="Статус: Транскрипція аудіо (це може зайняти багато часу)...")
+            root.update_idletasks()
+            
+            result = model.transcribe(video_path, word_timestamps=True)
 
         status_label.config(text="Статус: Створення .ASS файлу...")
         root.update_idletasks()
         
-        subs = pysubs2.SSAFile()
-        default_style = pysubs2.SSAStyle(
-            fontname='Arial', fontsize=24, primarycolor=pysubs2.Color(255, 255, 255),
-            outlinecolor=pysubs2.Color(0, 0, 0), backcolor=pysubs2.Color(0, 0, 0, 128),
-            bold=True, borderstyle=1, outline=1.5, shadow=0.5,
-            alignment=pysubs2.Alignment.BOTTOM_CENTER, marginv=15
-        )
-        subs.styles['Default'] = default_style
-
-        segments = result['segments']
-        all_words = []
-        for s in segments:
-            if 'words' in s:
-                all_words.extend(s['words'])
-
-        current_pos = 0
-        while current_pos < len(all_words):
-            segment_words = all_words[current_pos : current_pos + max_words_per_segment]
-            
-            if not segment_words: break
-
-            start_time = segment_words[0]['start'] * 1000
-            end_time = segment_words[-1]['end'] * 1000
-            text = " ".join(word['word'] for word in segment_words)
-            
-            event = pysubs2.SSAEvent(start=start_time, end=end_time, text=text.strip())
-            subs.events.append(event)
-            
-            current_pos += max_words_per_segment
-
         output_path = os.path.splitext(video_path)[0] + ".ass"
-        subs.save(output_path)
+        sub_settings = dict(OVERLAY_SUBTITLE_SETTINGS, max_words_per_segment=max_words_per_segment)
+        compile_style(sub_settings).save(extract_words(result), output_path)
         return output_path
     except Exception as e:
         messagebox.showerror("Помилка при створенні .ass", str(e))
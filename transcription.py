@@ -0,0 +1,283 @@
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+import whisper
+from whisper.audio import N_FRAMES, N_SAMPLES, SAMPLE_RATE
+from whisper.timing import find_alignment, merge_punctuations
+from whisper.tokenizer import get_tokenizer
+
+# #############################################################################
+# # КЕШ МОДЕЛЕЙ WHISPER
+# #############################################################################
+
+class WhisperModelCache:
+    """
+    Реєстр моделей Whisper на весь процес за ключем (назва моделі, пристрій).
+    Модель завантажується один раз при першому зверненні, лишається "теплою"
+    між транскрипціями і вивантажується після idle_timeout секунд простою.
+    """
+    def __init__(self, idle_timeout=600):
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.eviction_timer = None
+
+    @contextmanager
+    def use(self, model_name="base", device=None):
+        """
+        Видає модель для ексклюзивного використання в поточному потоці.
+        Whisper під час transcribe встановлює хуки на модулі моделі, тому одну
+        модель не можна використовувати з кількох потоків одночасно.
+        """
+        key = (model_name, device or None)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = {'model': None, 'use_lock': threading.Lock(), 'users': 0, 'last_used': time.monotonic()}
+                self.entries[key] = entry
+            entry['users'] += 1
+
+        try:
+            with entry['use_lock']:
+                if entry['model'] is None:
+                    logging.info(f"Loading Whisper model '{model_name}' (device: {device or 'auto'})...")
+                    load_start = time.monotonic()
+                    entry['model'] = whisper.load_model(model_name, device=device or None)
+                    logging.info(f"Whisper model '{model_name}' loaded in {time.monotonic() - load_start:.1f}s.")
+                yield entry['model']
+        finally:
+            with self.lock:
+                entry['users'] -= 1
+                entry['last_used'] = time.monotonic()
+            self._schedule_eviction()
+
+    def _schedule_eviction(self):
+        with self.lock:
+            if self.eviction_timer is not None: return
+            self.eviction_timer = threading.Timer(self.idle_timeout, self._evict_idle)
+            self.eviction_timer.daemon = True
+            self.eviction_timer.start()
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        with self.lock:
+            self.eviction_timer = None
+            for key, entry in list(self.entries.items()):
+                if entry['users'] == 0 and now - entry['last_used'] >= self.idle_timeout:
+                    del self.entries[key]
+                    logging.info(f"Whisper model '{key[0]}' unloaded after {self.idle_timeout}s of inactivity.")
+            has_loaded_models = bool(self.entries)
+        if has_loaded_models:
+            self._schedule_eviction()
+
+    def clear(self):
+        """Вивантажує всі моделі, які зараз не використовуються."""
+        with self.lock:
+            for key, entry in list(self.entries.items()):
+                if entry['users'] == 0:
+                    del self.entries[key]
+
+whisper_models = WhisperModelCache()
+
+def extract_words(result):
+    """Повертає плоский список слів (word/start/end/probability) з результату model.transcribe."""
+    return [
+        {'word': str(w['word']), 'start': float(w['start']), 'end': float(w['end']), 'probability': float(w.get('probability', 0.0))}
+        for segment in result['segments'] if 'words' in segment for w in segment['words']
+    ]
+
+# #############################################################################
+# # ВИРІВНЮВАННЯ ВІДОМОГО ТЕКСТУ
+# #############################################################################
+
+# Тривалість кадру енергетичного аналізу, секунди
+ENERGY_FRAME = 0.02
+# Максимальна довжина вікна для DTW-вирівнювання (трохи менше 30 с вікна Whisper)
+ALIGNMENT_WINDOW = 28.0
+
+def align_words_by_energy(audio, text, offset=0.0):
+    """
+    Дешеве вирівнювання без моделі: слова розподіляються по озвучених (гучних)
+    кадрах аудіо пропорційно своїй довжині. Паузи між фразами пропускаються.
+    """
+    words = text.split()
+    frame = int(SAMPLE_RATE * ENERGY_FRAME)
+    frame_count = len(audio) // frame
+    if not words or frame_count == 0: return []
+
+    rms = np.sqrt(np.mean(audio[:frame_count * frame].reshape(frame_count, frame) ** 2, axis=1))
+    voiced = rms > max(float(np.percentile(rms, 95)) * 0.1, 1e-4)
+    if not voiced.any(): voiced[:] = True
+    voiced_times = np.flatnonzero(voiced) * ENERGY_FRAME
+
+    weights = np.array([len(w) + 1 for w in words], dtype=float)
+    bounds = np.concatenate(([0.0], np.cumsum(weights) / weights.sum())) * len(voiced_times)
+    last = len(voiced_times) - 1
+    result = []
+    for i, word in enumerate(words):
+        first_frame = min(int(bounds[i]), last)
+        last_frame = max(first_frame, min(int(np.ceil(bounds[i + 1])) - 1, last))
+        result.append({'word': f" {word}", 'start': offset + float(voiced_times[first_frame]),
+                       'end': offset + float(voiced_times[last_frame]) + ENERGY_FRAME, 'probability': 1.0})
+    return result
+
+def _align_window(model, tokenizer, audio, text, offset):
+    """DTW-вирівнювання тексту в межах одного вікна (до 30 с) за cross-attention Whisper."""
+    text_tokens = tokenizer.encode(" " + text.strip())
+    if not text_tokens: return []
+    if len(text_tokens) > model.dims.n_text_ctx - 8:
+        logging.warning("Alignment window text is too long for Whisper, using energy-based alignment.")
+        return align_words_by_energy(audio, text, offset)
+
+    mel = whisper.log_mel_spectrogram(audio, model.dims.n_mels, padding=N_SAMPLES)
+    num_frames = min(mel.shape[-1] - N_FRAMES, N_FRAMES)
+    mel_segment = whisper.pad_or_trim(mel, N_FRAMES).to(model.device)
+    alignment = find_alignment(model, tokenizer, text_tokens, mel_segment, num_frames)
+    merge_punctuations(alignment, "\"'“¿([{-", "\"'.。,，!！?？:：”)]}、")
+    return [
+        {'word': t.word, 'start': offset + float(t.start), 'end': offset + float(t.end), 'probability': float(t.probability)}
+        for t in alignment if t.word
+    ]
+
+def _detect_language(model, audio):
+    if not model.is_multilingual: return "en"
+    mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), model.dims.n_mels).to(model.device)
+    _, probs = model.detect_language(mel)
+    return max(probs, key=probs.get)
+
+def align_words(model, audio, text):
+    """
+    Обчислює пословні мітки часу для відомого тексту (без розпізнавання мови).
+    Аудіо довше за вікно Whisper розбивається на вікна по паузах, межі яких
+    оцінюються енергетичним вирівнюванням, і кожне вікно вирівнюється окремо.
+    Результат має ту саму структуру, що й extract_words.
+    """
+    rough_words = align_words_by_energy(audio, text)
+    if not rough_words: return []
+    tokenizer = get_tokenizer(model.is_multilingual, num_languages=model.num_languages, language=_detect_language(model, audio), task="transcribe")
+    duration = len(audio) / SAMPLE_RATE
+
+    words = []
+    window_start, first_word = 0.0, 0
+    while first_word < len(rough_words):
+        last_word = first_word
+        while last_word + 1 < len(rough_words) and rough_words[last_word + 1]['end'] - window_start <= ALIGNMENT_WINDOW:
+            last_word += 1
+        if last_word + 1 < len(rough_words):
+            # Ріжемо посередині паузи між останнім словом вікна і наступним
+            window_end = (rough_words[last_word]['end'] + rough_words[last_word + 1]['start']) / 2
+        else:
+            window_end = duration
+        window_end = min(window_end, window_start + N_SAMPLES / SAMPLE_RATE)
+
+        window_text = "".join(w['word'] for w in rough_words[first_word:last_word + 1])
+        window_audio = audio[int(window_start * SAMPLE_RATE):int(window_end * SAMPLE_RATE)]
+        try:
+            window_words = _align_window(model, tokenizer, window_audio, window_text, window_start)
+        except Exception as e:
+            logging.warning(f"Whisper alignment failed ({e}), using energy-based alignment for this window.")
+            window_words = []
+        words.extend(window_words or rough_words[first_word:last_word + 1])
+
+        window_start, first_word = window_end, last_word + 1
+    return words
+
+def transcribe_words(model, audio_path, text=None):
+    """
+    Повертає слова з мітками часу для аудіофайлу: вирівнюванням відомого тексту,
+    якщо його передано, або відкритою транскрипцією Whisper.
+    """
+    if text is None:
+        return extract_words(model.transcribe(audio_path, verbose=False, word_timestamps=True))
+    return align_words(model, whisper.load_audio(audio_path), text)
+
+# #############################################################################
+# # ПАРАЛЕЛЬНА ТРАНСКРИПЦІЯ
+# #############################################################################
+
+# Модель, завантажена в процесі-воркері пулу (одна на процес, живе весь час роботи пулу)
+_pool_worker_model = None
+
+def _init_pool_worker(model_name, device):
+    global _pool_worker_model
+    _pool_worker_model = whisper.load_model(model_name, device=device or None)
+
+def _transcribe_in_pool_worker(audio_path, text):
+    return transcribe_words(_pool_worker_model, audio_path, text)
+
+class TranscriptionEngine:
+    """
+    Транскрибує аудіофайли з пословними мітками часу.
+    При workers > 1 використовує пул процесів, у кожному з яких своя прогріта модель,
+    тож транскрипція масштабується на ядра процесора, а не впирається в GIL.
+    При workers <= 1 працює в поточному процесі через спільний кеш whisper_models.
+    """
+    def __init__(self, model_name="base", device=None, workers=1):
+        self.model_name = model_name
+        self.device = device or None
+        self.workers = max(1, int(workers))
+        self.users = 0 # Завдання, що зараз тримають рушій (див. use_transcription_engine)
+        if self.workers > 1:
+            # 'spawn' - безпечний старт процесів з torch на всіх платформах
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_pool_worker, initargs=(self.model_name, self.device))
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="transcription")
+
+    def submit(self, audio_path, text=None):
+        """
+        Ставить файл у чергу транскрипції; повертає Future зі списком слів.
+        Якщо передано text, слова не розпізнаються, а лише вирівнюються за часом.
+        """
+        if self.workers > 1:
+            return self.executor.submit(_transcribe_in_pool_worker, audio_path, text)
+        return self.executor.submit(self._transcribe_local, audio_path, text)
+
+    def _transcribe_local(self, audio_path, text):
+        with whisper_models.use(self.model_name, self.device) as model:
+            return transcribe_words(model, audio_path, text)
+
+    def shutdown(self, wait=False):
+        self.executor.shutdown(wait=wait, cancel_futures=True)
+
+_engine_lock = threading.Lock()
+_engine = None
+
+@contextmanager
+def use_transcription_engine(model_name="base", device=None, workers=1):
+    """
+    Видає спільний для процесу рушій транскрипції на час роботи завдання.
+    Якщо налаштування змінились, нові завдання отримують новий рушій, а старий
+    закривається лише після того, як його відпустить останнє завдання, що ним користується.
+    """
+    global _engine
+    with _engine_lock:
+        config = (model_name, device or None, max(1, int(workers)))
+        if _engine is not None and (_engine.model_name, _engine.device, _engine.workers) != config:
+            if _engine.users == 0: _engine.executor.shutdown(wait=False)
+            _engine = None
+        if _engine is None:
+            logging.info(f"Starting transcription engine: model '{model_name}', {config[2]} worker(s).")
+            _engine = TranscriptionEngine(*config)
+        engine = _engine
+        engine.users += 1
+    try:
+        yield engine
+    finally:
+        with _engine_lock:
+            engine.users -= 1
+            if engine is not _engine and engine.users == 0:
+                engine.executor.shutdown(wait=False)
+
+def shutdown_transcription_engine():
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.shutdown()
+            _engine = None